@@ -0,0 +1,34 @@
+"""Add digest_watermarks
+
+Revision ID: 0a6e4c9d2b71
+Revises: f3b8c1d05e62
+Create Date: 2026-10-17 19:58:41.093126
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0a6e4c9d2b71'
+down_revision: Union[str, None] = 'f3b8c1d05e62'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'digest_watermarks',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('last_created_at', sa.DateTime(), nullable=False),
+        sa.Column('last_announcement_id', sa.Integer(), nullable=False),
+        sa.Column('sent_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+        sa.PrimaryKeyConstraint('user_id'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('digest_watermarks')
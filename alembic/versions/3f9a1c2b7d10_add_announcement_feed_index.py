@@ -0,0 +1,30 @@
+"""Add composite index for the announcement feed
+
+Revision ID: 3f9a1c2b7d10
+Revises: cd4ec8f89189
+Create Date: 2026-10-17 09:12:44.318204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f9a1c2b7d10'
+down_revision: Union[str, None] = 'cd4ec8f89189'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        'ix_announcements_class_id_created_at_id',
+        'announcements',
+        ['class_id', 'created_at', 'id'],
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_announcements_class_id_created_at_id', table_name='announcements')
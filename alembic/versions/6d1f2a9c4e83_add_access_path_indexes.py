@@ -0,0 +1,43 @@
+"""Add indexes for the announcement and dashboard access paths
+
+Revision ID: 6d1f2a9c4e83
+Revises: e5a90b3c7d21
+Create Date: 2026-10-17 14:05:12.640391
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6d1f2a9c4e83'
+down_revision: Union[str, None] = 'e5a90b3c7d21'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# (index name, table, columns)
+INDEXES = [
+    ('ix_students_class_id', 'students', ['class_id']),
+    ('ix_parent_student_student_id_parent_id', 'parent_student', ['student_id', 'parent_id']),
+    ('ix_teacher_class_class_id_teacher_id', 'teacher_class', ['class_id', 'teacher_id']),
+    ('ix_class_representative_class_id', 'class_representative', ['class_id']),
+    ('ix_announcement_recipients_user_id_announcement_id', 'announcement_recipients', ['user_id', 'announcement_id']),
+    ('ix_announcements_creator_id_created_at_id', 'announcements', ['creator_id', 'created_at', 'id']),
+    ('ix_classes_school_id', 'classes', ['school_id']),
+]
+
+
+def upgrade() -> None:
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction; it does not block writes
+    # on PostgreSQL. On other dialects the flag is ignored.
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, _columns in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,39 @@
+"""Add user_inbox table
+
+Revision ID: 8b2e4d6f1a37
+Revises: 3f9a1c2b7d10
+Create Date: 2026-10-17 10:03:27.581946
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8b2e4d6f1a37'
+down_revision: Union[str, None] = '3f9a1c2b7d10'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'user_inbox',
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id'), primary_key=True),
+        sa.Column('announcement_id', sa.Integer(), sa.ForeignKey('announcements.id'), primary_key=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('read_at', sa.DateTime(), nullable=True),
+    )
+    op.create_index(
+        'ix_user_inbox_user_id_created_at_announcement_id',
+        'user_inbox',
+        ['user_id', 'created_at', 'announcement_id'],
+    )
+    # Existing announcements are copied in with: python -m app.utils.backfill_inbox
+
+
+def downgrade() -> None:
+    op.drop_index('ix_user_inbox_user_id_created_at_announcement_id', table_name='user_inbox')
+    op.drop_table('user_inbox')
@@ -0,0 +1,28 @@
+"""Add external_id to students
+
+Revision ID: a7c3e5f91b24
+Revises: 6d1f2a9c4e83
+Create Date: 2026-10-17 15:22:08.903127
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7c3e5f91b24'
+down_revision: Union[str, None] = '6d1f2a9c4e83'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('students', sa.Column('external_id', sa.String(), nullable=True))
+    op.create_index(op.f('ix_students_external_id'), 'students', ['external_id'], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_students_external_id'), table_name='students')
+    op.drop_column('students', 'external_id')
@@ -0,0 +1,42 @@
+"""Scope student external_id to its school
+
+Revision ID: b6d2f8e4a913
+Revises: 0a6e4c9d2b71
+Create Date: 2026-10-17 21:04:52.361870
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b6d2f8e4a913'
+down_revision: Union[str, None] = '0a6e4c9d2b71'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Batch mode, so SQLite can add the foreign key too (it recreates the table)
+    with op.batch_alter_table('students') as batch_op:
+        batch_op.add_column(sa.Column('school_id', sa.Integer(), nullable=True))
+        batch_op.create_foreign_key('fk_students_school_id_schools', 'schools', ['school_id'], ['id'])
+    # Existing identifiers were issued by the school of the student's class
+    op.execute(
+        "UPDATE students SET school_id = (SELECT classes.school_id FROM classes WHERE classes.id = students.class_id) "
+        "WHERE external_id IS NOT NULL"
+    )
+    op.drop_index('ix_students_external_id', table_name='students')
+    op.create_index(
+        'ix_students_school_id_external_id', 'students', ['school_id', 'external_id'], unique=True
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_students_school_id_external_id', table_name='students')
+    op.create_index('ix_students_external_id', 'students', ['external_id'], unique=True)
+    with op.batch_alter_table('students') as batch_op:
+        batch_op.drop_constraint('fk_students_school_id_schools', type_='foreignkey')
+        batch_op.drop_column('school_id')
@@ -0,0 +1,26 @@
+"""Add language to users
+
+Revision ID: c41d7e9a2f58
+Revises: 8b2e4d6f1a37
+Create Date: 2026-10-17 11:26:05.902417
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c41d7e9a2f58'
+down_revision: Union[str, None] = '8b2e4d6f1a37'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('users', sa.Column('language', sa.String(), nullable=True, server_default='en'))
+
+
+def downgrade() -> None:
+    op.drop_column('users', 'language')
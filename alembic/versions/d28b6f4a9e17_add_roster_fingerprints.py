@@ -0,0 +1,33 @@
+"""Add roster_fingerprints
+
+Revision ID: d28b6f4a9e17
+Revises: a7c3e5f91b24
+Create Date: 2026-10-17 16:10:37.215548
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd28b6f4a9e17'
+down_revision: Union[str, None] = 'a7c3e5f91b24'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'roster_fingerprints',
+        sa.Column('source', sa.String(), nullable=False),
+        sa.Column('record_key', sa.String(), nullable=False),
+        sa.Column('fingerprint', sa.String(), nullable=False),
+        sa.Column('synced_at', sa.DateTime(), server_default=sa.func.now(), nullable=False),
+        sa.PrimaryKeyConstraint('source', 'record_key'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('roster_fingerprints')
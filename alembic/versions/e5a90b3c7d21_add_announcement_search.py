@@ -0,0 +1,68 @@
+"""Add full-text search over announcements
+
+Revision ID: e5a90b3c7d21
+Revises: c41d7e9a2f58
+Create Date: 2026-10-17 12:41:53.114870
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5a90b3c7d21'
+down_revision: Union[str, None] = 'c41d7e9a2f58'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+SEARCH_CONFIGS = {'en': 'english', 'de': 'german', 'fr': 'french'}
+
+
+def upgrade() -> None:
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        # Generated columns keep the vectors up to date on every write
+        for lang, config in SEARCH_CONFIGS.items():
+            op.execute(
+                f"ALTER TABLE announcements ADD COLUMN search_{lang} tsvector "
+                f"GENERATED ALWAYS AS (to_tsvector('{config}', coalesce(title, '') || ' ' || coalesce(content_{lang}, ''))) STORED"
+            )
+            op.create_index(f'ix_announcements_search_{lang}', 'announcements', [f'search_{lang}'], postgresql_using='gin')
+    elif dialect == 'sqlite':
+        op.execute(
+            "CREATE VIRTUAL TABLE announcements_fts USING fts5("
+            "title, content_en, content_de, content_fr, "
+            "content='announcements', content_rowid='id', tokenize='unicode61 remove_diacritics 2')"
+        )
+        op.execute(
+            "CREATE TRIGGER announcements_fts_ai AFTER INSERT ON announcements BEGIN "
+            "INSERT INTO announcements_fts(rowid, title, content_en, content_de, content_fr) "
+            "VALUES (new.id, new.title, new.content_en, new.content_de, new.content_fr); END"
+        )
+        op.execute(
+            "CREATE TRIGGER announcements_fts_ad AFTER DELETE ON announcements BEGIN "
+            "INSERT INTO announcements_fts(announcements_fts, rowid, title, content_en, content_de, content_fr) "
+            "VALUES ('delete', old.id, old.title, old.content_en, old.content_de, old.content_fr); END"
+        )
+        op.execute(
+            "CREATE TRIGGER announcements_fts_au AFTER UPDATE ON announcements BEGIN "
+            "INSERT INTO announcements_fts(announcements_fts, rowid, title, content_en, content_de, content_fr) "
+            "VALUES ('delete', old.id, old.title, old.content_en, old.content_de, old.content_fr); "
+            "INSERT INTO announcements_fts(rowid, title, content_en, content_de, content_fr) "
+            "VALUES (new.id, new.title, new.content_en, new.content_de, new.content_fr); END"
+        )
+        op.execute("INSERT INTO announcements_fts(announcements_fts) VALUES ('rebuild')")
+
+
+def downgrade() -> None:
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        for lang in SEARCH_CONFIGS:
+            op.drop_index(f'ix_announcements_search_{lang}', table_name='announcements')
+            op.drop_column('announcements', f'search_{lang}')
+    elif dialect == 'sqlite':
+        for trigger in ('announcements_fts_ai', 'announcements_fts_ad', 'announcements_fts_au'):
+            op.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        op.execute("DROP TABLE IF EXISTS announcements_fts")
@@ -0,0 +1,62 @@
+"""Add the school to student and parent roster fingerprint keys
+
+Revision ID: e7a3c9b5d284
+Revises: b6d2f8e4a913
+Create Date: 2026-10-17 21:37:15.804219
+
+"""
+import json
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e7a3c9b5d284'
+down_revision: Union[str, None] = 'b6d2f8e4a913'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _rewrite_keys(rewrite) -> None:
+    """
+    Replace every student and parent record key with rewrite(kind, parts); keys it
+    returns None for are dropped (the next sync re-applies those records).
+    """
+    connection = op.get_bind()
+    rows = connection.execute(sa.text("SELECT source, record_key FROM roster_fingerprints")).all()
+    for source, key in rows:
+        kind, *parts = json.loads(key)
+        if kind not in ("student", "parent"):
+            continue
+        new_key = rewrite(kind, parts)
+        params = {"source": source, "key": key, "new_key": new_key}
+        if new_key is None:
+            connection.execute(
+                sa.text("DELETE FROM roster_fingerprints WHERE source = :source AND record_key = :key"), params
+            )
+        else:
+            connection.execute(
+                sa.text("UPDATE roster_fingerprints SET record_key = :new_key WHERE source = :source AND record_key = :key"),
+                params
+            )
+
+
+def upgrade() -> None:
+    # Refs were globally unique until now, so each one names a single student
+    connection = op.get_bind()
+    schools = dict(connection.execute(sa.text(
+        "SELECT students.external_id, schools.name FROM students "
+        "JOIN schools ON schools.id = students.school_id WHERE students.external_id IS NOT NULL"
+    )).all())
+
+    def rewrite(kind, parts):
+        school = schools.get(parts[0])
+        return None if school is None else json.dumps([kind, school, *parts])
+
+    _rewrite_keys(rewrite)
+
+
+def downgrade() -> None:
+    _rewrite_keys(lambda kind, parts: json.dumps([kind, *parts[1:]]))
@@ -1,6 +1,12 @@
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
 from dotenv import load_dotenv
+from app.utils.pool_stats import PoolStats, timed_pool_class, instrument_engine
+from app.utils.request_metrics import instrument_queries
+from app.utils.query_budget import instrument_query_shapes
+from app.utils.slow_queries import instrument_slow_queries
 import os
 
 # Load environment variables from .env
@@ -13,15 +19,74 @@ DATABASE_URL = os.getenv("DATABASE_URL")
 if not DATABASE_URL:
     raise ValueError("DATABASE_URL is not set in the environment variables.")
 
+IS_SQLITE = "sqlite" in DATABASE_URL
+
+# Connection pool configuration (ignored for SQLite, which uses SQLAlchemy's defaults)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+
+# Pool statistics, exposed on /internal/db-pool
+sync_pool_stats = PoolStats("sync")
+async_pool_stats = PoolStats("async")
+
+
+def pool_options(pool_base, stats: PoolStats) -> dict:
+    if IS_SQLITE:
+        return {}
+    return {
+        "poolclass": timed_pool_class(pool_base, stats),
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+
+
 # Create the SQLAlchemy engine
 engine = create_engine(
     DATABASE_URL,
-    connect_args={"check_same_thread": False} if "sqlite" in DATABASE_URL else {}
+    connect_args={"check_same_thread": False} if IS_SQLITE else {},
+    **pool_options(QueuePool, sync_pool_stats)
 )
+instrument_engine(engine, sync_pool_stats)
+instrument_queries(engine)
+instrument_query_shapes(engine)
+instrument_slow_queries(engine)
 
 # Create a configured "SessionLocal" class
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+
+# Derive the async driver URL from DATABASE_URL (asyncpg for Postgres, aiosqlite for SQLite)
+def to_async_database_url(url: str) -> str:
+    scheme, sep, rest = url.partition("://")
+    backend = scheme.split("+")[0]
+    if backend in ("postgresql", "postgres"):
+        return f"postgresql+asyncpg{sep}{rest}"
+    if backend == "sqlite":
+        return f"sqlite+aiosqlite{sep}{rest}"
+    raise ValueError(f"No async driver configured for database URL scheme '{scheme}'.")
+
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or to_async_database_url(DATABASE_URL)
+
+# Create the async SQLAlchemy engine, used by the hot async endpoints
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    **pool_options(AsyncAdaptedQueuePool, async_pool_stats)
+)
+instrument_engine(async_engine.sync_engine, async_pool_stats)
+instrument_queries(async_engine.sync_engine)
+instrument_query_shapes(async_engine.sync_engine)
+instrument_slow_queries(async_engine.sync_engine)
+
+# Objects stay usable after commit; async sessions cannot lazy-refresh them
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
 # Create a Base class for your ORM models
 Base = declarative_base()
 
@@ -32,3 +97,15 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+# Dependency to get an async database session
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+# Run a sync ORM helper on its own async session, so independent helpers can run concurrently
+async def run_in_async_session(fn, *args, **kwargs):
+    async with AsyncSessionLocal() as db:
+        return await db.run_sync(fn, *args, **kwargs)
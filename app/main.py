@@ -3,17 +3,20 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from app.database import Base, engine
 from app.models import User, School, Class, Student, ParentStudent, ClassRepresentative, Announcement, teacher_class
-from app.routers import auth, announcements, classes, schools, users, dashboards
+from app.routers import auth, announcements, classes, schools, users, dashboards, internal, roster
+from app.utils.passwords import shutdown_password_pool
+from app.utils.announcement_search import ensure_search_index
+from app.utils.request_metrics import MetricsMiddleware
+from app.utils.query_budget import QUERY_DETECTOR, QueryDetectorMiddleware
+from app.utils.logging_setup import CorrelationIdMiddleware, configure_logging, shutdown_logging
+from app.utils.notifications import notification_router
 import os
 import logging
 
 
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(levelname)s:%(name)s:%(message)s"
-)
+# Configure logging (JSON lines written by a background thread)
+configure_logging()
 logger = logging.getLogger(__name__)
 
 
@@ -23,7 +26,7 @@ app = FastAPI()
 # Resolve the static directory path
 static_directory = os.path.abspath(os.path.join(os.path.dirname(__file__), "static"))
 if not os.path.exists(static_directory):
-    print(f"Warning: Static directory {static_directory} does not exist.")
+    logger.warning("Static directory %s does not exist.", static_directory)
 app.mount("/static", StaticFiles(directory=static_directory), name="static")
 
 # Add CORS middleware
@@ -36,12 +39,29 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Development/test only: report statements repeated within a request (N+1 queries)
+if QUERY_DETECTOR != "off":
+    app.add_middleware(QueryDetectorMiddleware)
+
+# Per-route latency and SQL metrics, served on /metrics
+app.add_middleware(MetricsMiddleware)
+
+# Correlation id for every log line of a request; added last so it wraps everything
+app.add_middleware(CorrelationIdMiddleware)
+
 # Create database tables
 try:
     Base.metadata.create_all(bind=engine)
-    print("Database tables created successfully.")
-except Exception as e:
-    print(f"Error creating database tables: {e}")
+    logger.info("Database tables created successfully.")
+except Exception:
+    logger.exception("Error creating database tables")
+
+# Create the SQLite full-text search table (not expressible in the ORM models; on
+# PostgreSQL the search columns come from the migrations)
+try:
+    ensure_search_index(engine)
+except Exception:
+    logger.exception("Error creating announcement search index")
 
 # Include routers
 app.include_router(auth.router, tags=["Authentication"])
@@ -50,3 +70,12 @@ app.include_router(classes.router, tags=["Classes"])
 app.include_router(schools.router, tags=["Schools"])
 app.include_router(users.router, tags=["Users"])
 app.include_router(dashboards.router, tags=["Dashboards"])
+app.include_router(internal.router, tags=["Internal"])
+app.include_router(roster.router, tags=["Roster"])
+
+
+@app.on_event("shutdown")
+def shutdown_workers():
+    shutdown_password_pool()
+    notification_router.shutdown()
+    shutdown_logging()
@@ -9,7 +9,8 @@ from sqlalchemy import (
     Boolean,
     DateTime,
     func,
-    Table
+    Table,
+    Index
 )
 from sqlalchemy.orm import relationship
 from sqlalchemy.ext.associationproxy import association_proxy
@@ -29,7 +30,9 @@ announcement_recipients = Table(
     'announcement_recipients',
     Base.metadata,
     Column('announcement_id', Integer, ForeignKey('announcements.id'), primary_key=True),
-    Column('user_id', Integer, ForeignKey('users.id'), primary_key=True)
+    Column('user_id', Integer, ForeignKey('users.id'), primary_key=True),
+    # The primary key leads with announcement_id; recipient lookups go by user
+    Index('ix_announcement_recipients_user_id_announcement_id', 'user_id', 'announcement_id')
 )
 
 # Association table for Teacher and Class (many-to-many)
@@ -37,7 +40,8 @@ teacher_class = Table(
     'teacher_class',
     Base.metadata,
     Column('teacher_id', Integer, ForeignKey('users.id'), primary_key=True),
-    Column('class_id', Integer, ForeignKey('classes.id'), primary_key=True)
+    Column('class_id', Integer, ForeignKey('classes.id'), primary_key=True),
+    Index('ix_teacher_class_class_id_teacher_id', 'class_id', 'teacher_id')
 )
 
 # -----------------------------
@@ -71,6 +75,10 @@ class Class(Base):
     class_reps = relationship("ClassRepresentative", back_populates="class_")
     announcements = relationship("Announcement", back_populates="class_")
 
+    __table_args__ = (
+        Index('ix_classes_school_id', 'school_id'),
+    )
+
 
 class User(Base):
     __tablename__ = "users"
@@ -80,6 +88,7 @@ class User(Base):
     email = Column(String, unique=True, index=True, nullable=False)
     password = Column(String, nullable=False)
     role = Column(String, nullable=False)  # 'admin', 'teacher', 'parent'
+    language = Column(String, nullable=True, default="en")  # 'en', 'de', 'fr'
 
     # Relationship to ParentStudent and children (students)
     children = relationship("ParentStudent", back_populates="parent")
@@ -104,6 +113,8 @@ class Student(Base):
     __tablename__ = "students"
 
     id = Column(Integer, primary_key=True, index=True)
+    external_id = Column(String, nullable=True)  # The school's own student identifier (roster imports)
+    school_id = Column(Integer, ForeignKey("schools.id"), nullable=True)  # The school that issued external_id
     first_name = Column(String, nullable=False)
     last_name = Column(String, nullable=False)
     class_id = Column(Integer, ForeignKey("classes.id"), nullable=False)
@@ -111,6 +122,12 @@ class Student(Base):
     class_ = relationship("Class", back_populates="students")
     parents = relationship("ParentStudent", back_populates="student")
 
+    __table_args__ = (
+        Index('ix_students_class_id', 'class_id'),
+        # Student identifiers are only unique within the school that issued them
+        Index('ix_students_school_id_external_id', 'school_id', 'external_id', unique=True),
+    )
+
 
 class ParentStudent(Base):
     __tablename__ = "parent_student"
@@ -123,6 +140,11 @@ class ParentStudent(Base):
     parent = relationship("User", back_populates="children")
     student = relationship("Student", back_populates="parents")
 
+    __table_args__ = (
+        # The primary key leads with parent_id; class audiences join from the student side
+        Index('ix_parent_student_student_id_parent_id', 'student_id', 'parent_id'),
+    )
+
 
 class ClassRepresentative(Base):
     __tablename__ = "class_representative"
@@ -133,6 +155,10 @@ class ClassRepresentative(Base):
     parent = relationship("User", back_populates="represented_classes")
     class_ = relationship("Class", back_populates="class_reps")
 
+    __table_args__ = (
+        Index('ix_class_representative_class_id', 'class_id'),
+    )
+
 
 class Announcement(Base):
     __tablename__ = 'announcements'
@@ -160,6 +186,29 @@ class Announcement(Base):
         back_populates='announcements'
     )
 
+    __table_args__ = (
+        # Backs the keyset-paginated feed: class filter + (created_at, id) ordering
+        Index('ix_announcements_class_id_created_at_id', 'class_id', 'created_at', 'id'),
+        # "My announcements": creator filter with the same ordering
+        Index('ix_announcements_creator_id_created_at_id', 'creator_id', 'created_at', 'id'),
+    )
+
+
+class UserInbox(Base):
+    """
+    Materialized per-user announcement feed, filled when an announcement is created.
+    """
+    __tablename__ = "user_inbox"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    announcement_id = Column(Integer, ForeignKey("announcements.id"), primary_key=True)
+    created_at = Column(DateTime, nullable=False)  # Copied from the announcement for index-ordered reads
+    read_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index('ix_user_inbox_user_id_created_at_announcement_id', 'user_id', 'created_at', 'announcement_id'),
+    )
+
 
 class UserProfile(Base):
     __tablename__ = "user_profiles"
@@ -188,3 +237,54 @@ class PasswordReset(Base):
     expires_at = Column(DateTime, nullable=False)
 
     user = relationship("User")
+
+
+class RosterFingerprint(Base):
+    """
+    Hash of each record last seen from a roster sync source, so a re-sent roster
+    only applies the records that changed.
+    """
+    __tablename__ = "roster_fingerprints"
+
+    source = Column(String, primary_key=True)  # Name of the sync source, e.g. one school's roster feed
+    record_key = Column(String, primary_key=True)  # JSON list identifying the record, e.g. ["student", "S-1001"]
+    fingerprint = Column(String, nullable=False)  # sha256 of the record's values
+    synced_at = Column(DateTime, nullable=False, server_default=func.now())
+
+
+class EmailOutbox(Base):
+    """
+    Outgoing email, written in the same transaction as the change that triggers it and
+    sent later by the outbox worker (app/utils/email_outbox.py).
+    """
+    __tablename__ = "email_outbox"
+
+    id = Column(Integer, primary_key=True)
+    to_email = Column(String, nullable=False)
+    subject = Column(String, nullable=False)
+    body = Column(Text, nullable=False)
+    kind = Column(String, nullable=True)  # What triggered it, e.g. "password_reset"
+    status = Column(String, nullable=False, default="pending", server_default="pending")  # pending, sent or dead
+    attempts = Column(Integer, nullable=False, default=0, server_default="0")
+    next_attempt_at = Column(DateTime, nullable=False, server_default=func.now())
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime, nullable=False, server_default=func.now())
+    sent_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        # The worker's claim query: due pending messages in id order
+        Index('ix_email_outbox_status_next_attempt_at_id', 'status', 'next_attempt_at', 'id'),
+    )
+
+
+class DigestWatermark(Base):
+    """
+    Position of the last inbox row included in a user's digest email, so a digest run
+    only picks up what was delivered since and re-runs send nothing twice.
+    """
+    __tablename__ = "digest_watermarks"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    last_created_at = Column(DateTime, nullable=False)  # (created_at, announcement_id) of the last
+    last_announcement_id = Column(Integer, nullable=False)  # user_inbox row in the previous digest
+    sent_at = Column(DateTime, nullable=False)
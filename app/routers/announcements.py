@@ -1,30 +1,52 @@
 # app/routers/announcements.py
 
-from fastapi.logger import logger
-from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from sqlalchemy import distinct, func, insert, select
 from sqlalchemy.orm import Session, joinedload
-from typing import List
-from app.database import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional, Dict, Any, Tuple
+from datetime import datetime
+from app.database import get_async_db
 from app.models import (
     Announcement,
-    User,
     Class,
     teacher_class,
     ClassRepresentative,
     ParentStudent,
     Student,
+    announcement_recipients,
 )
-from app.schemas.announcements import AnnouncementCreate, AnnouncementResponse, AnnouncementOut
+from app.schemas.announcements import (
+    AnnouncementCreate,
+    AnnouncementBatchCreate,
+    AnnouncementResponse,
+    AnnouncementOut,
+)
+from app.utils.principal_cache import Principal
 from app.routers.auth import get_current_user
+from app.utils.announcement_utils import (
+    cached_announcement_feed,
+    fetch_recipient_ids,
+    serialize_announcements,
+    MAX_PAGE_SIZE,
+)
+from app.utils.announcement_search import search_announcements
+from app.utils.inbox_utils import fan_out_announcements
+from app.utils.broadcaster import publish_new_announcements
+from app.utils.notifications import notification_router
+from app.utils.announcement_cache import mark_classes_changed, mark_users_changed
+from app.utils.query_budget import query_budget
+import logging
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
 
 
 @router.post("/announcements/create", response_model=AnnouncementResponse)
-def create_announcement(
+async def create_announcement(
     announcement: AnnouncementCreate,
-    user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Create a new announcement.
@@ -32,159 +54,306 @@ def create_announcement(
     - Teachers: Can assign to any user or specific recipients.
     - Class Representatives: Can assign to class representatives within their school.
     """
+    created = await db.run_sync(create_announcement_records, [announcement], user)
+    await db.commit()
+
+    # Push to open dashboard streams
+    await db.run_sync(publish_new_announcements, [new_announcement.id for new_announcement, _ in created])
+    # Email/SMS per the recipients' preferences, in the background
+    notification_router.submit([new_announcement.id for new_announcement, _ in created])
+
+    new_announcement, recipient_ids = created[0]
+    return announcement_response(new_announcement, recipient_ids)
+
+
+@router.post("/announcements/batch", response_model=List[AnnouncementResponse])
+async def create_announcements_batch(
+    batch: AnnouncementBatchCreate,
+    user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Create several announcements in one transaction, e.g. the same notice for several classes.
+    - The same rules as /announcements/create apply to every item.
+    - If any item is rejected, none of them are created.
+    """
+    created = await db.run_sync(create_announcement_records, batch.announcements, user)
+    await db.commit()
+
+    # Push to open dashboard streams
+    await db.run_sync(publish_new_announcements, [new_announcement.id for new_announcement, _ in created])
+    # Email/SMS per the recipients' preferences, in the background
+    notification_router.submit([new_announcement.id for new_announcement, _ in created])
+
+    return [announcement_response(new_announcement, recipient_ids) for new_announcement, recipient_ids in created]
+
+
+def announcement_response(new_announcement: Announcement, recipient_ids: List[int]) -> Dict[str, Any]:
+    return {
+        "id": new_announcement.id,
+        "title": new_announcement.title,
+        "content_en": new_announcement.content_en,
+        "content_de": new_announcement.content_de,
+        "content_fr": new_announcement.content_fr,
+        "original_language": new_announcement.original_language,
+        "target_audience": new_announcement.target_audience,
+        "class_id": new_announcement.class_id,
+        "creator_id": new_announcement.creator_id,
+        "recipients": recipient_ids,
+    }
+
+
+# Helper function to validate and stage new announcements (flushed, not committed)
+def create_announcement_records(
+    db: Session,
+    announcements: List[AnnouncementCreate],
+    user: Principal
+) -> List[Tuple[Announcement, List[int]]]:
     # Validate user role
     if user.role not in ["teacher", "class_representative", "admin"]:
         raise HTTPException(status_code=403, detail="Not authorized to post announcements")
 
     # Get classes the user is assigned to
     if user.role == "teacher":
-        valid_class_ids = [
+        valid_class_ids = {
             tc.class_id for tc in db.query(teacher_class).filter(teacher_class.c.teacher_id == user.id).all()
-        ]
+        }
     elif user.role == "class_representative":
-        valid_class_ids = [
+        valid_class_ids = {
             cr.class_id for cr in db.query(ClassRepresentative).filter(ClassRepresentative.parent_id == user.id).all()
-        ]
+        }
     else:
-        valid_class_ids = []
-
-    # Check if the user is allowed to post in the class
-    if announcement.class_id not in valid_class_ids and user.role != "admin":
-        raise HTTPException(status_code=403, detail="You are not assigned to this class")
+        valid_class_ids = set()
 
-    # Initialize recipients list
-    recipients = []
+    staged = []
+    for announcement in announcements:
+        # Check if the user is allowed to post in the class
+        if announcement.class_id not in valid_class_ids and user.role != "admin":
+            raise HTTPException(status_code=403, detail="You are not assigned to this class")
 
-    # Validate recipients if provided
-    if announcement.recipients:
-        if announcement.target_audience == "class_reps":
-            # Get class reps in the same school
-            allowed_recipients = get_class_reps_in_school(user, db)
-            if not set(announcement.recipients).issubset(set(allowed_recipients)):
+        # Validate recipients if provided: every submitted id must be in the allowed set
+        recipient_ids = sorted(set(announcement.recipients))
+        if recipient_ids:
+            if announcement.target_audience == "class_reps":
+                # Class reps in the same school
+                allowed_count = count_class_reps_in_school(user, recipient_ids, db)
+            else:
+                # For other audiences, recipients must be parents in the class
+                allowed_count = count_allowed_parents(announcement.class_id, recipient_ids, db)
+            if allowed_count != len(recipient_ids):
                 raise HTTPException(status_code=403, detail="Invalid recipients selected")
-            # Fetch User instances for recipients
-            recipients = db.query(User).filter(User.id.in_(announcement.recipients)).all()
-        else:
-            # For other audiences, validate recipients as parents in the class
-            allowed_parents = get_allowed_parents(announcement.class_id, db)
-            if not set(announcement.recipients).issubset(set(allowed_parents)):
-                raise HTTPException(status_code=403, detail="Invalid recipients selected")
-            # Fetch User instances for recipients
-            recipients = db.query(User).filter(User.id.in_(announcement.recipients)).all()
-
-    # Create announcement
-    new_announcement = Announcement(
-        title=announcement.title,
-        content_en=announcement.content_en,
-        content_de=announcement.content_de,
-        content_fr=announcement.content_fr,
-        original_language=announcement.original_language,
-        creator_id=user.id,
-        class_id=announcement.class_id,
-        target_audience=announcement.target_audience,
-        recipients=recipients,  # Assign list of User instances
+
+        new_announcement = Announcement(
+            title=announcement.title,
+            content_en=announcement.content_en,
+            content_de=announcement.content_de,
+            content_fr=announcement.content_fr,
+            original_language=announcement.original_language,
+            creator_id=user.id,
+            class_id=announcement.class_id,
+            target_audience=announcement.target_audience,
+        )
+        staged.append((new_announcement, recipient_ids))
+
+    db.add_all([new_announcement for new_announcement, _ in staged])
+    db.flush()
+
+    # One multi-row INSERT for all recipient rows
+    recipient_rows = [
+        {"announcement_id": new_announcement.id, "user_id": recipient_id}
+        for new_announcement, recipient_ids in staged
+        for recipient_id in recipient_ids
+    ]
+    if recipient_rows:
+        db.execute(insert(announcement_recipients).values(recipient_rows))
+
+    # Deliver to the audience's inboxes in the same transaction
+    fan_out_announcements(db, [new_announcement.id for new_announcement, _ in staged])
+
+    # Invalidate cached feeds once committed
+    mark_classes_changed(db, {new_announcement.class_id for new_announcement, _ in staged})
+    mark_users_changed(db, {user.id} | {recipient_id for _, recipient_ids in staged for recipient_id in recipient_ids})
+    return staged
+
+
+# Helper function to count how many of the given users are parents in a class
+def count_allowed_parents(class_id: int, user_ids: List[int], db: Session) -> int:
+    return db.execute(
+        select(func.count(distinct(ParentStudent.parent_id)))
+        .join(Student, Student.id == ParentStudent.student_id)
+        .where(Student.class_id == class_id, ParentStudent.parent_id.in_(user_ids))
+    ).scalar()
+
+
+# Helper function to count how many of the given users are other class reps in the user's schools
+def count_class_reps_in_school(user: Principal, user_ids: List[int], db: Session) -> int:
+    # Schools of the classes the user represents
+    school_ids = (
+        select(Class.school_id)
+        .join(ClassRepresentative, ClassRepresentative.class_id == Class.id)
+        .where(ClassRepresentative.parent_id == user.id)
     )
-    db.add(new_announcement)
-    db.commit()
-    db.refresh(new_announcement)
-    return new_announcement
+    return db.execute(
+        select(func.count(distinct(ClassRepresentative.parent_id)))
+        .join(Class, Class.id == ClassRepresentative.class_id)
+        .where(
+            Class.school_id.in_(school_ids),
+            ClassRepresentative.parent_id.in_(user_ids),
+            ClassRepresentative.parent_id != user.id,
+        )
+    ).scalar()
 
 
-# Helper function to get allowed parents in a class
-def get_allowed_parents(class_id: int, db: Session) -> List[int]:
-    parent_ids = db.query(ParentStudent.parent_id).join(Student).filter(Student.class_id == class_id).all()
-    # Flatten the list of tuples
-    return [pid[0] for pid in parent_ids]
+# Helper function to get the class IDs a user may read announcements from (None: all classes)
+def get_accessible_class_ids(db: Session, user: Principal) -> Optional[List[int]]:
+    if user.role == "admin":
+        return None
+    if user.role == "teacher":
+        rows = db.query(teacher_class.c.class_id).filter(teacher_class.c.teacher_id == user.id).all()
+    elif user.role == "class_representative":
+        rows = db.query(ClassRepresentative.class_id).filter(ClassRepresentative.parent_id == user.id).all()
+    elif user.role == "parent":
+        rows = (
+            db.query(Student.class_id)
+            .join(ParentStudent, ParentStudent.student_id == Student.id)
+            .filter(ParentStudent.parent_id == user.id)
+            .distinct()
+            .all()
+        )
+    else:
+        rows = []
+    return [row[0] for row in rows]
 
 
-# Helper function to get class reps in the same school
-def get_class_reps_in_school(user: User, db: Session) -> List[int]:
-    # Get class IDs where the user is a class rep
-    class_ids = [
-        cr.class_id for cr in db.query(ClassRepresentative).filter(ClassRepresentative.parent_id == user.id).all()
-    ]
-    if not class_ids:
+# Helper function to run a class-scoped search on a sync session
+def run_announcement_search(
+    db: Session,
+    user: Principal,
+    query: str,
+    class_ids: Optional[List[int]],
+    language: Optional[str],
+    limit: int,
+    offset: int
+) -> List[Dict[str, Any]]:
+    allowed_class_ids = get_accessible_class_ids(db, user)
+    if allowed_class_ids is None:
+        scope = class_ids
+    elif class_ids:
+        scope = [class_id for class_id in class_ids if class_id in set(allowed_class_ids)]
+    else:
+        scope = allowed_class_ids
+    if scope is not None and not scope:
         return []
 
-    # Get the school IDs associated with these classes
-    school_ids = [
-        c.school_id for c in db.query(Class).filter(Class.id.in_(class_ids)).all()
-    ]
+    rows = search_announcements(
+        db,
+        query,
+        class_ids=scope,
+        # Parents only find what was delivered to them
+        inbox_user_id=user.id if user.role == "parent" else None,
+        language=language,
+        limit=limit,
+        offset=offset
+    )
+    recipient_map = fetch_recipient_ids(db, [row[0].id for row in rows])
+    return serialize_announcements(rows, recipient_map)
 
-    # Get all class reps in these schools
-    class_rep_ids = [
-        cr.parent_id for cr in db.query(ClassRepresentative)
-        .join(Class, Class.id == ClassRepresentative.class_id)
-        .filter(Class.school_id.in_(school_ids))
-        .all()
-    ]
 
-    # Remove duplicates and exclude the current user
-    class_rep_ids = list(set(class_rep_ids))
-    if user.id in class_rep_ids:
-        class_rep_ids.remove(user.id)
+@router.get("/announcements/search", response_model=Dict[str, Any])
+async def search_announcements_endpoint(
+    q: str = Query(..., min_length=1, max_length=200, description="Search terms"),
+    class_ids: Optional[List[int]] = Query(None, description="Restrict to these class IDs"),
+    language: Optional[str] = Query(None, pattern="^(en|de|fr)$", description="Restrict matching to one language"),
+    limit: int = Query(20, ge=1, le=MAX_PAGE_SIZE, description="Page size"),
+    offset: int = Query(0, ge=0, description="Number of results to skip"),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_user),
+):
+    """
+    Full-text search over announcement titles and contents, best match first.
+    - Results are limited to the classes the user can access.
+    - `next_offset` is null on the last page.
+    """
+    q = q.strip()
+    if not q:
+        raise HTTPException(status_code=400, detail="Search terms are required")
 
-    return class_rep_ids
+    results = await db.run_sync(
+        run_announcement_search, current_user, q, class_ids, language, limit + 1, offset
+    )
+    next_offset = offset + limit if len(results) > limit else None
+    return {"results": results[:limit], "next_offset": next_offset}
 
 
 @router.get("/announcements", response_model=List[AnnouncementOut])
-def get_announcements(
+@query_budget(4)
+async def get_announcements(
+    response: Response,
     class_ids: List[int] = Query(..., description="List of class IDs"),
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    cursor: Optional[str] = Query(None, description="Cursor returned in the X-Next-Cursor header of the previous page"),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Page size"),
+    since: Optional[datetime] = Query(None, description="Only return announcements created after this time"),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_user),
 ):
     """
-    Retrieve announcements for specified class IDs.
+    Retrieve one page of announcements for specified class IDs, newest first.
+    The cursor for the next page is returned in the `X-Next-Cursor` header.
     """
+    # Log input parameters
+    logger.debug("Received request to fetch announcements for class IDs: %s by user: %s", class_ids, current_user.id)
+
+    if not class_ids:
+        logger.warning("class_ids parameter is missing")
+        raise HTTPException(status_code=400, detail="class_ids parameter is required")
+
     try:
-        # Log input parameters
-        logger.info(f"Received request to fetch announcements for class IDs: {class_ids} by user: {current_user.id}")
-
-        if not class_ids:
-            logger.warning("class_ids parameter is missing")
-            raise HTTPException(status_code=400, detail="class_ids parameter is required")
-
-        # Fetch announcements with related class and creator
-        announcements = (
-            db.query(Announcement)
-            .options(joinedload(Announcement.class_), joinedload(Announcement.creator))
-            .filter(Announcement.class_id.in_(class_ids))
-            .all()
+        # Fetch one page of serialized announcements with related class, school and creator
+        announcements, next_cursor = await db.run_sync(
+            cached_announcement_feed,
+            limit=limit,
+            class_ids=class_ids,
+            cursor=cursor,
+            since=since
         )
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
 
-        logger.info(f"Fetched {len(announcements)} announcements from the database.")
+    try:
+        logger.debug("Fetched %s announcements from the database.", len(announcements))
+
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
 
         if not announcements:
-            logger.info("No announcements found for the given class IDs.")
+            logger.debug("No announcements found for the given class IDs.")
             return []
 
         # Serialize announcements
         serialized_announcements = []
         for announcement in announcements:
             content = (
-                announcement.content_de
-                or announcement.content_en
-                or announcement.content_fr
+                announcement["content_de"]
+                or announcement["content_en"]
+                or announcement["content_fr"]
                 or "No content available."
             )
 
-            creator_name = announcement.creator.username if announcement.creator else "Unknown Creator"
-
             serialized_announcement = AnnouncementOut(
-                id=announcement.id,
-                title=announcement.title,
+                id=announcement["id"],
+                title=announcement["title"],
                 content=content,
-                class_id=announcement.class_id,
-                class_name=announcement.class_.name if announcement.class_ else "Unknown Class",
-                school_name=announcement.class_.school.name if announcement.class_ and announcement.class_.school else "Unknown School",
-                date_submitted=announcement.created_at,
-                creator_name=creator_name,
+                class_id=announcement["class_id"],
+                class_name=announcement["class_name"] or "Unknown Class",
+                school_name=announcement["school_name"] or "Unknown School",
+                date_submitted=announcement["date_submitted"],
+                creator_name=announcement["creator_name"] or "Unknown Creator",
             )
             serialized_announcements.append(serialized_announcement)
 
-        logger.info(f"Serialized announcements: {serialized_announcements}")
+        logger.debug("Serialized announcements: %s", serialized_announcements)
         return serialized_announcements
 
-    except Exception as e:
-        logger.error(f"Error occurred in /announcements endpoint: {e}", exc_info=True)
+    except Exception:
+        logger.exception("Error occurred in /announcements endpoint")
         raise HTTPException(status_code=500, detail="Failed to fetch announcements")
@@ -2,22 +2,23 @@
 
 from fastapi import APIRouter, Depends, HTTPException, status
 import logging
-from sqlalchemy import and_
+from sqlalchemy import and_, select
 from sqlalchemy.orm import Session, joinedload
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import IntegrityError
 from typing import List, Optional
-from pydantic import BaseModel
-from passlib.context import CryptContext
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from jose import jwt, JWTError
 from datetime import datetime, timedelta
 import os
 from dotenv import load_dotenv
 import secrets
-from app.utils.utils import send_email
+from app.utils.email_outbox import enqueue_email
+from app.utils.principal_cache import Principal, principal_cache
+from app.utils.passwords import hash_password_async, verify_and_update_password
 
-from app.database import get_db
-from app.models import User, UserProfile, Class, Student, ParentStudent, ClassRepresentative
+from app.database import get_db, get_async_db
+from app.models import PasswordReset, User, UserProfile, Class, Student, ParentStudent, ClassRepresentative
 from app.schemas.users import (
     UserCreate,
     UserResponse,
@@ -29,7 +30,6 @@ from app.schemas.users import (
 
 router = APIRouter()
 
-logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
 # Load environment variables from .env
@@ -40,28 +40,9 @@ SECRET_KEY = os.getenv("SECRET_KEY", "fallback_key")  # Replace 'fallback_key' w
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES"))
 ALGORITHM = "HS256"
 
-# Password hashing utility
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
 # OAuth2 scheme setup
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/token")
 
-# Password Reset Token Model (For demonstration; use DB in production)
-class PasswordResetToken(BaseModel):
-    token: str
-    expires_at: datetime
-
-# In-memory store for reset tokens (Replace with persistent storage in production)
-reset_tokens = {}  # key: user_id, value: PasswordResetToken
-
-# Function to hash passwords
-def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
-
-# Function to verify passwords
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
-
 # Function to create JWT access tokens
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
@@ -73,19 +54,26 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 # Function to authenticate user credentials
-def authenticate_user(username: str, password: str, db: Session) -> Optional[User]:
-    user = db.query(User).filter(User.username == username).first()
-    print(f"Query result for username '{username}': {user}")
+async def authenticate_user(username: str, password: str, db: AsyncSession) -> Optional[User]:
+    result = await db.execute(select(User).where(User.username == username))
+    user = result.scalars().first()
 
     if not user:
         return None
-    if not verify_password(password, user.password):
+    is_valid, new_hash = await verify_and_update_password(password, user.password)
+    if not is_valid:
         return None
+
+    # Transparently upgrade hashes made with a different cost factor
+    if new_hash:
+        user.password = new_hash
+        await db.commit()
+        logger.info("Rehashed password for user ID %s with the configured bcrypt cost.", user.id)
     return user
 
 # Role-based access control decorator (supports multiple roles)
 def role_required(allowed_roles: List[str]):
-    def decorator(user: User = Depends(get_current_user)):
+    def decorator(user: Principal = Depends(get_current_user)):
         if user.role not in allowed_roles:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
@@ -95,7 +83,7 @@ def role_required(allowed_roles: List[str]):
     return decorator
 
 # Dependency to get the current authenticated user
-def get_current_user(db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)) -> User:
+async def get_current_user(db: AsyncSession = Depends(get_async_db), token: str = Depends(oauth2_scheme)) -> Principal:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials.",
@@ -114,44 +102,48 @@ def get_current_user(db: Session = Depends(get_db), token: str = Depends(oauth2_
             raise credentials_exception
         token_data = {"user_id": user_id, "role": role}
     except (JWTError, ValueError) as e:
-        logger.error(f"Error decoding JWT: {e}")
+        logger.error("Error decoding JWT: %s", e)
         raise credentials_exception
     
-    user = db.query(User).filter(User.id == user_id).first()
-    if user is None:
-        logger.error(f"User with ID {user_id} not found")
+    principal = principal_cache.get(user_id)
+    if principal is not None:
+        return principal
+
+    result = await db.execute(
+        select(User.id, User.role, User.username, User.language).where(User.id == user_id)
+    )
+    row = result.first()
+    if row is None:
+        logger.error("User with ID %s not found", user_id)
         raise credentials_exception
-    return user
 
+    principal = Principal(id=row.id, role=row.role, username=row.username, language=row.language)
+    principal_cache.set(principal)
+    return principal
 
-logger = logging.getLogger(__name__)
-logger.setLevel(logging.DEBUG)
-console_handler = logging.StreamHandler()
-console_handler.setLevel(logging.DEBUG)
-logger.addHandler(console_handler)
 
 
 @router.post("/auth/register", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
-def register_user(user_data: UserCreate, db: Session = Depends(get_db)):
+async def register_user(user_data: UserCreate, db: AsyncSession = Depends(get_async_db)):
     """
     Register a new user.
     """
     # Check for existing user
-    existing_user = (
-        db.query(User)
-        .filter((User.username == user_data.username) | (User.email == user_data.email))
-        .first()
+    result = await db.execute(
+        select(User).where((User.username == user_data.username) | (User.email == user_data.email))
     )
+    existing_user = result.scalars().first()
     if existing_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="A user with this username or email already exists."
         )
 
+    # Hash the user's password in the bcrypt process pool (outside the try: a saturated
+    # hashing pool must surface as 503)
+    hashed_password = await hash_password_async(user_data.password)
+
     try:
-        # Hash the user's password
-        hashed_password = hash_password(user_data.password)
-        
         # Create the new user without optional fields
         new_user = User(
             username=user_data.username,
@@ -162,39 +154,32 @@ def register_user(user_data: UserCreate, db: Session = Depends(get_db)):
         db.add(new_user)
         
         # Flush to assign an ID to new_user
-        db.flush()
+        await db.flush()
         
         # Commit the new user to the database
-        db.commit()
-        db.refresh(new_user)
+        await db.commit()
+        await db.refresh(new_user)
 
     except IntegrityError as e:
-        db.rollback()
-        logger.exception(f"Integrity error for user: {user_data.username} - {e}")
+        await db.rollback()
+        logger.exception("Integrity error for user: %s", user_data.username)
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Integrity error occurred during registration. Possibly a duplicate entry."
         ) from e
     except Exception as e:
-        db.rollback()
-        logger.exception(f"Unexpected error during registration for user: {user_data.username} - {e}")
+        await db.rollback()
+        logger.exception("Unexpected error during registration for user: %s", user_data.username)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="An unexpected error occurred during registration."
         ) from e
 
-    # Fetch the user for the response
-    db_user = (
-        db.query(User)
-        .filter(User.id == new_user.id)
-        .first()
-    )
-
-    return UserResponse.from_orm(db_user)
+    return UserResponse.from_orm(new_user)
 
 
 @router.post("/auth/reset-password", response_model=dict, status_code=status.HTTP_200_OK)
-def reset_password(email: str, token: str, new_password: str, db: Session = Depends(get_db)):
+async def reset_password(email: str, token: str, new_password: str, db: AsyncSession = Depends(get_async_db)):
     """
     Reset a user's password.
     - **email**: User's email address.
@@ -202,31 +187,33 @@ def reset_password(email: str, token: str, new_password: str, db: Session = Depe
     - **new_password**: New password to set.
     """
     # Fetch the user by email
-    user = db.query(User).filter(User.email == email).first()
+    result = await db.execute(select(User).where(User.email == email))
+    user = result.scalars().first()
     if not user:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found.")
     
     # Validate the reset token
-    reset_token = reset_tokens.get(user.id)
-    if not reset_token or reset_token.token != token:
+    result = await db.execute(select(PasswordReset).where(PasswordReset.user_id == user.id))
+    reset_token = result.scalars().first()
+    if not reset_token or not secrets.compare_digest(reset_token.token, token):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Invalid or expired reset token."
         )
     
     if datetime.utcnow() > reset_token.expires_at:
-        del reset_tokens[user.id]
+        await db.delete(reset_token)
+        await db.commit()
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Reset token has expired."
         )
 
-    # Update the user's password
-    user.password = hash_password(new_password)
-    db.commit()
-
-    # Remove the token after successful reset
-    del reset_tokens[user.id]
+    # Update the user's password and remove the token in one transaction
+    user.password = await hash_password_async(new_password)
+    await db.delete(reset_token)
+    await db.commit()
+    principal_cache.invalidate(user.id)
 
     return {"message": "Password updated successfully."}
 
@@ -234,14 +221,15 @@ def reset_password(email: str, token: str, new_password: str, db: Session = Depe
 
 # Endpoint for user login and token generation
 @router.post("/token", response_model=dict)
-def login_for_access_token(
+async def login_for_access_token(
     form_data: OAuth2PasswordRequestForm = Depends(), 
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Authenticate user and return a JWT access token.
+    Password verification runs in the bcrypt process pool; returns 503 when it is saturated.
     """
-    user = authenticate_user(form_data.username, form_data.password, db)
+    user = await authenticate_user(form_data.username, form_data.password, db)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -249,9 +237,6 @@ def login_for_access_token(
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    # Fetch first_name from the user's profile
-    first_name = user.profile.first_name if user.profile else "User"
-    
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
         data={"sub": str(user.id), "role": user.role},
@@ -271,7 +256,8 @@ def generate_reset_token() -> str:
 @router.post("/auth/request-password-reset", response_model=dict, status_code=status.HTTP_200_OK)
 def request_password_reset(email: str, db: Session = Depends(get_db)):
     """
-    Request a password reset. Sends a reset token to the user's email.
+    Request a password reset. The token and the email carrying it are committed
+    together; the email is sent by the outbox worker (app.utils.email_outbox).
     """
     user = db.query(User).filter(User.email == email).first()
     if not user:
@@ -280,18 +266,19 @@ def request_password_reset(email: str, db: Session = Depends(get_db)):
     # Generate a secure reset token
     token = generate_reset_token()
     expires_at = datetime.utcnow() + timedelta(hours=1)  # Token valid for 1 hour
-    reset_tokens[user.id] = PasswordResetToken(token=token, expires_at=expires_at)
+    # A new request replaces the user's previous token
+    db.query(PasswordReset).filter(PasswordReset.user_id == user.id).delete(synchronize_session=False)
+    db.add(PasswordReset(user_id=user.id, token=token, expires_at=expires_at))
 
-    # Send the reset token via email
+    # Queue the reset token email
     reset_link = f"https://yourdomain.com/reset-password?email={email}&token={token}"
-    try:
-        send_email(
-            to_email=user.email,
-            subject="Password Reset Request",
-            body=f"Hi {user.username},\n\nClick the link below to reset your password:\n{reset_link}\n\nThis link will expire in 1 hour.\n\nIf you did not request a password reset, please ignore this email."
-        )
-    except Exception as e:
-        # In production, handle email sending errors appropriately
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to send reset email.")
+    enqueue_email(
+        db,
+        to_email=user.email,
+        subject="Password Reset Request",
+        body=f"Hi {user.username},\n\nClick the link below to reset your password:\n{reset_link}\n\nThis link will expire in 1 hour.\n\nIf you did not request a password reset, please ignore this email.",
+        kind="password_reset",
+    )
+    db.commit()
 
     return {"message": "Password reset link has been sent to your email."}
@@ -1,28 +1,34 @@
 # classes.py
 
-from fastapi import APIRouter, Depends, HTTPException, status, Body
+from fastapi import APIRouter, Depends, HTTPException, Header, status, Body
 from sqlalchemy.orm import Session, joinedload
 from sqlalchemy import and_
-from typing import List
+from typing import List, Optional
 
 from app.database import get_db
 from app.models import Class, User, teacher_class, Student, ParentStudent, ClassRepresentative, School
 from app.schemas.classes import ClassCreate, ClassResponse, ClassAssignmentRequest
 from app.schemas.users import teacher_classAssignment
+from app.utils.principal_cache import Principal
 from app.routers.auth import role_required, get_current_user
+from app.utils.announcement_cache import mark_classes_changed
+from app.utils.catalog import catalog, catalog_response, mark_catalog_changed
+from app.utils.query_budget import query_budget
 
 router = APIRouter()
 
 
 @router.get('/classes/unrestricted', response_model=List[ClassResponse])
 def get_unrestricted_classes(
+    if_none_match: Optional[str] = Header(None),
     db: Session = Depends(get_db),
-    user: User = Depends(get_current_user)
+    user: Principal = Depends(get_current_user)
 ):
     """
     Retrieve all classes without any restrictions.
     - This endpoint is intended for dropdowns or general-purpose use cases.
     - Access is limited to authenticated users.
+    - Served from the catalog snapshot; send `If-None-Match` to get a 304 when unchanged.
     """
     if not user:
         raise HTTPException(
@@ -30,27 +36,15 @@ def get_unrestricted_classes(
             detail="Authentication required to access this resource."
         )
 
-    classes = (
-        db.query(Class)
-        .options(joinedload(Class.school))  # Include related school data
-        .all()
-    )
-
-    return [
-        {
-            "id": cls.id,
-            "class_name": cls.name,
-            "school_id": cls.school_id,
-            "school_name": cls.school.name,
-        }
-        for cls in classes
-    ]
+    snapshot = catalog.get(db)
+    return catalog_response(snapshot.classes_json, snapshot.classes_etag, if_none_match)
 
 
 @router.get('/classes/all', response_model=List[ClassResponse])
+@query_budget(2)
 def get_all_classes(
     db: Session = Depends(get_db),
-    user: User = Depends(get_current_user)
+    user: Principal = Depends(get_current_user)
 ):
     """
     Retrieve classes based on the user's role.
@@ -114,7 +108,7 @@ def get_all_classes(
 
 
 @router.post("/classes/create", response_model=ClassResponse, dependencies=[Depends(role_required("admin"))])
-def create_class(class_data: ClassCreate, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def create_class(class_data: ClassCreate, db: Session = Depends(get_db), current_user: Principal = Depends(get_current_user)):
     """
     Create a new class.
     - Admins: Can create classes in any school.
@@ -127,6 +121,7 @@ def create_class(class_data: ClassCreate, db: Session = Depends(get_db), current
     # Create the new class
     new_class = Class(name=class_data.name, school_id=class_data.school_id)
     db.add(new_class)
+    mark_catalog_changed(db)
     db.commit()
     db.refresh(new_class)
     
@@ -139,7 +134,7 @@ def create_class(class_data: ClassCreate, db: Session = Depends(get_db), current
 
 
 @router.get("/classes/{class_id}", response_model=ClassResponse, dependencies=[Depends(role_required(["admin", "teacher"]))])
-def get_class(class_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def get_class(class_id: int, db: Session = Depends(get_db), current_user: Principal = Depends(get_current_user)):
     """
     Retrieve detailed information about a specific class.
     - Admins: Can access any class.
@@ -174,7 +169,7 @@ def get_class(class_id: int, db: Session = Depends(get_db), current_user: User =
 
 
 @router.put("/classes/{class_id}/update", response_model=ClassResponse, dependencies=[Depends(role_required(["admin", "teacher"]))])
-def update_class(class_id: int, class_data: ClassCreate, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def update_class(class_id: int, class_data: ClassCreate, db: Session = Depends(get_db), current_user: Principal = Depends(get_current_user)):
     """
     Update an existing class.
     - Admins: Can update any class.
@@ -200,6 +195,8 @@ def update_class(class_id: int, class_data: ClassCreate, db: Session = Depends(g
     # Update class details
     class_instance.name = class_data.name
     class_instance.school_id = class_data.school_id
+    mark_classes_changed(db, [class_id])
+    mark_catalog_changed(db)
     db.commit()
     db.refresh(class_instance)
     
@@ -212,7 +209,7 @@ def update_class(class_id: int, class_data: ClassCreate, db: Session = Depends(g
 
 
 @router.delete("/classes/{class_id}", dependencies=[Depends(role_required(["admin", "teacher"]))])
-def delete_class(class_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def delete_class(class_id: int, db: Session = Depends(get_db), current_user: Principal = Depends(get_current_user)):
     """
     Delete a class.
     - Admins: Can delete any class.
@@ -233,6 +230,8 @@ def delete_class(class_id: int, db: Session = Depends(get_db), current_user: Use
     
     # Delete the class
     db.delete(class_instance)
+    mark_classes_changed(db, [class_id])
+    mark_catalog_changed(db)
     db.commit()
     
     return {"message": "Class deleted successfully"}
@@ -242,7 +241,7 @@ def delete_class(class_id: int, db: Session = Depends(get_db), current_user: Use
 def assign_class_to_user(
     request: ClassAssignmentRequest,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     class_id = request.class_id
     
@@ -301,7 +300,7 @@ def assign_class_to_user(
 @router.get("/teacher-classes", response_model=List[ClassResponse])
 def get_teacher_classes(
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """
     Retrieve all classes assigned to the logged-in teacher.
@@ -331,7 +330,7 @@ def get_teacher_classes(
 def remove_class_assignment(
     class_id: int,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """
     Remove a class assignment from the current user (teacher).
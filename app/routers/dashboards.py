@@ -1,13 +1,32 @@
 # app/routers/dashboard.py
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Header, Request, status
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from sqlalchemy.orm import Session, joinedload
-from app.database import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import get_async_db, run_in_async_session
 from app.models import User, Class, Announcement, Student, ParentStudent, teacher_class, School
+from app.utils.principal_cache import Principal
 from app.routers.auth import get_current_user
-from typing import List, Dict, Any
-from app.schemas.dashboards import AnnouncementResponse
-from app.utils.announcement_utils import fetch_announcements, serialize_announcements
+from typing import List, Dict, Any, Optional
+from pydantic import TypeAdapter
+from datetime import datetime
+from app.schemas.dashboards import AnnouncementResponse, ParentDashboardResponse, TeacherDashboardResponse
+from app.utils.announcement_utils import (
+    fetch_announcements,
+    fetch_recipient_ids,
+    serialize_announcements,
+    cached_announcement_feed,
+    decode_cursor,
+    MAX_PAGE_SIZE,
+)
+from app.utils.broadcaster import broadcaster
+from app.utils.catalog import catalog
+from app.utils.responses import typed_response
+from app.utils.query_budget import query_budget
+import asyncio
+import json
+import os
 import logging
 
 
@@ -15,83 +34,117 @@ router = APIRouter()
 
 logger = logging.getLogger(__name__)
 
+# Seconds between keep-alive comments on idle announcement streams
+STREAM_HEARTBEAT_SECONDS = float(os.getenv("STREAM_HEARTBEAT_SECONDS", "15"))
+# Client reconnect delay advertised to EventSource, in milliseconds
+STREAM_RETRY_MS = int(os.getenv("STREAM_RETRY_MS", "3000"))
 
+# Built once at import, so validating a dashboard payload runs entirely in pydantic-core
+PARENT_DASHBOARD_ADAPTER = TypeAdapter(ParentDashboardResponse)
+TEACHER_DASHBOARD_ADAPTER = TypeAdapter(TeacherDashboardResponse)
 
-@router.get("/dashboard/parent", response_model=Dict[str, Any])
-def parent_dashboard(user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    logger.debug(f"User ID: {user.id}, Role: {user.role}")
 
-    if user.role != "parent":
-        logger.warning(f"User ID {user.id} attempted to access parent dashboard without proper role.")
-        raise HTTPException(status_code=403, detail="Access forbidden")
-
-    # Fetch ParentStudent relationships for this parent
-    parent_student_relationships = db.query(ParentStudent).filter(ParentStudent.parent_id == user.id).all()
-    student_ids = [ps.student_id for ps in parent_student_relationships]
-    logger.debug(f"Student IDs associated with parent {user.id}: {student_ids}")
-
-    # Fetch the associated students
-    students = db.query(Student).filter(Student.id.in_(student_ids)).all()
-    logger.debug(f"Fetched {len(students)} students for parent {user.id}")
-
-    # If no students are associated, return an empty response for announcements and students
-    if not students:
-        logger.info(f"No students associated with parent {user.id}. Returning empty announcements and students.")
-        return {
-            "announcements": [],
-            "students": []
-        }
-
-    # Fetch classes for the children
-    class_ids = {student.class_id for student in students}
-    classes = db.query(Class).filter(Class.id.in_(class_ids)).all()
-    class_map = {cls.id: cls for cls in classes}
-    logger.debug(f"Class IDs associated with parent {user.id}: {class_ids}")
-
-    # Fetch announcements for these classes and the parent as recipient
-    announcements = fetch_announcements(
-        db=db,
-        class_ids=list(class_ids),
-        recipient_id=user.id
+# Helper function to load a parent's children together with their class names
+def load_parent_students(db: Session, parent_id: int) -> List[Dict[str, Any]]:
+    rows = (
+        db.query(Student, Class.name)
+        .join(ParentStudent, ParentStudent.student_id == Student.id)
+        .outerjoin(Class, Class.id == Student.class_id)
+        .filter(ParentStudent.parent_id == parent_id)
+        .all()
     )
-    logger.debug(f"Fetched {len(announcements)} announcements for parent {user.id}")
-
-    # Serialize announcements
-    serialized_announcements = serialize_announcements(announcements)
-    logger.debug(f"Serialized announcements: {serialized_announcements}")
-
-    # Serialize students and their classes
-    response_students = [
+    return [
         {
             "id": student.id,
             "first_name": student.first_name,
             "last_name": student.last_name,
             "class": {
                 "id": student.class_id,
-                "name": class_map[student.class_id].name if student.class_id in class_map else "Unknown",
+                "name": class_name or "Unknown",
             }
         }
-        for student in students
+        for student, class_name in rows
     ]
-    logger.debug(f"Serialized students: {response_students}")
 
-    return {
+
+@router.get("/dashboard/parent", response_model=ParentDashboardResponse, response_class=ORJSONResponse)
+@query_budget(6)
+async def parent_dashboard(
+    cursor: Optional[str] = Query(None, description="Cursor returned as next_cursor by the previous page"),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Page size"),
+    since: Optional[datetime] = Query(None, description="Only return announcements created after this time"),
+    user: Principal = Depends(get_current_user)
+):
+    logger.debug("User ID: %s, Role: %s", user.id, user.role)
+
+    if user.role != "parent":
+        logger.warning("User ID %s attempted to access parent dashboard without proper role.", user.id)
+        raise HTTPException(status_code=403, detail="Access forbidden")
+
+    if cursor:
+        try:
+            decode_cursor(cursor)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    # Children and the inbox page are independent: load them concurrently on separate sessions
+    response_students, (serialized_announcements, next_cursor) = await asyncio.gather(
+        run_in_async_session(load_parent_students, user.id),
+        run_in_async_session(
+            cached_announcement_feed,
+            limit=limit,
+            inbox_user_id=user.id,
+            cursor=cursor,
+            since=since
+        ),
+    )
+    logger.debug(
+        "Fetched %s students and %s announcements for parent %s",
+        len(response_students), len(serialized_announcements), user.id
+    )
+    logger.debug("Serialized announcements: %s", serialized_announcements)
+    logger.debug("Serialized students: %s", response_students)
+
+    return typed_response(PARENT_DASHBOARD_ADAPTER, {
         "announcements": serialized_announcements,
-        "students": response_students
-    }
+        "students": response_students,
+        "next_cursor": next_cursor
+    })
 
-@router.get("/dashboard/teacher", response_model=Dict[str, Any])
-def teacher_dashboard(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+@router.get("/dashboard/teacher", response_model=TeacherDashboardResponse, response_class=ORJSONResponse)
+@query_budget(8)
+async def teacher_dashboard(
+    cursor: Optional[str] = Query(None, description="Cursor returned as next_cursor by the previous page"),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Page size"),
+    since: Optional[datetime] = Query(None, description="Only return announcements created after this time"),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_user)
 ):
-    logger.debug(f"User ID: {current_user.id}, Role: {current_user.role}")
+    logger.debug("User ID: %s, Role: %s", current_user.id, current_user.role)
 
     # Ensure the user is a teacher
     if current_user.role != "teacher":
-        logger.warning(f"User ID {current_user.id} attempted to access teacher dashboard without proper role.")
+        logger.warning("User ID %s attempted to access teacher dashboard without proper role.", current_user.id)
         raise HTTPException(status_code=403, detail="Access forbidden")
 
+    if cursor:
+        try:
+            decode_cursor(cursor)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    dashboard = await db.run_sync(build_teacher_dashboard, current_user, limit=limit, cursor=cursor, since=since)
+    return typed_response(TEACHER_DASHBOARD_ADAPTER, dashboard)
+
+
+# Helper function to assemble the teacher dashboard on a sync session
+def build_teacher_dashboard(
+    db: Session,
+    current_user: Principal,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    since: Optional[datetime] = None
+) -> Dict[str, Any]:
     # Load user profile
     user_with_profile = (
         db.query(User)
@@ -101,14 +154,14 @@ def teacher_dashboard(
     )
 
     if not user_with_profile:
-        logger.error(f"User {current_user.id} not found in the database.")
+        logger.error("User %s not found in the database.", current_user.id)
         raise HTTPException(status_code=404, detail="User not found")
 
     profile = user_with_profile.profile
     first_name = profile.first_name if profile and profile.first_name else "New"
     last_name = profile.last_name if profile and profile.last_name else "Teacher"
     teacher_name = f"{first_name} {last_name}".strip()
-    logger.debug(f"Teacher name resolved as: {teacher_name}")
+    logger.debug("Teacher name resolved as: %s", teacher_name)
 
     # Fetch classes assigned to this teacher (via teacher_id in teacher_class table)
     teacher_class_assignments = (
@@ -117,76 +170,148 @@ def teacher_dashboard(
         .all()
     )
     assigned_class_ids = [tc.class_id for tc in teacher_class_assignments]
-    logger.debug(f"Assigned class IDs for teacher {current_user.id}: {assigned_class_ids}")
+    logger.debug("Assigned class IDs for teacher %s: %s", current_user.id, assigned_class_ids)
+
+    # Class and school names come from the catalog snapshot (no query while it is fresh)
+    snapshot = catalog.get(db)
 
     # If no assigned classes, return all as available
     if not assigned_class_ids:
-        logger.info(f"No classes assigned to teacher {current_user.id}. Returning all classes as available.")
-        all_classes = db.query(Class).options(joinedload(Class.school)).all()
-        available_classes = [
-            {
-                "id": c.id,
-                "class_name": c.name,
-                "school_name": c.school.name,
-            }
-            for c in all_classes
-        ]
-
+        logger.info("No classes assigned to teacher %s. Returning all classes as available.", current_user.id)
         return {
             "announcements": [],
             "classes": [],
-            "available_classes": available_classes,
+            "available_classes": snapshot.class_summaries(),
             "name": teacher_name,
+            "next_cursor": None,
         }
 
-    # If there are assigned classes, fetch them
-    assigned_classes = (
-        db.query(Class)
-        .filter(Class.id.in_(assigned_class_ids))
-        .options(joinedload(Class.school))
-        .all()
-    )
-    logger.debug(f"Fetched {len(assigned_classes)} assigned classes for teacher {current_user.id}.")
-
-    # Fetch all classes to determine available classes
-    all_classes = db.query(Class).options(joinedload(Class.school)).all()
-    all_class_ids = {c.id for c in all_classes}
-    available_class_ids = all_class_ids - set(assigned_class_ids)
-    logger.debug(f"Available class IDs for teacher {current_user.id}: {available_class_ids}")
-
-    available_classes = [
-        {
-            "id": c.id,
-            "class_name": c.name,
-            "school_name": c.school.name,
-        }
-        for c in all_classes if c.id in available_class_ids
-    ]
+    assigned = set(assigned_class_ids)
+    response_classes = snapshot.class_summaries(assigned)
+    available_classes = snapshot.class_summaries(assigned, exclude=True)
+    logger.debug("Fetched %s assigned classes for teacher %s.", len(response_classes), current_user.id)
 
-    # Fetch announcements for the assigned classes
-    announcements = fetch_announcements(
-        db=db, 
-        class_ids=assigned_class_ids, 
-        recipient_id=current_user.id
+    # Fetch one page of announcements for the assigned classes
+    serialized_announcements, next_cursor = cached_announcement_feed(
+        db,
+        limit=limit,
+        class_ids=assigned_class_ids,
+        recipient_id=current_user.id,
+        cursor=cursor,
+        since=since
     )
-    logger.debug(f"Fetched {len(announcements)} announcements for teacher {current_user.id}.")
-    serialized_announcements = serialize_announcements(announcements)
-    logger.debug(f"Serialized announcements: {serialized_announcements}")
+    logger.debug("Fetched %s announcements for teacher %s.", len(serialized_announcements), current_user.id)
+    logger.debug("Serialized announcements: %s", serialized_announcements)
 
-    # Serialize assigned classes
-    response_classes = [
-        {
-            "id": c.id,
-            "class_name": c.name,
-            "school_name": c.school.name,
-        }
-        for c in assigned_classes
-    ]
-    logger.debug(f"Serialized assigned classes: {response_classes}")
+    logger.debug("Serialized assigned classes: %s", response_classes)
 
     return {
         "announcements": serialized_announcements,
         "classes": response_classes,
         "available_classes": available_classes,
         "name": teacher_name,
+        "next_cursor": next_cursor,
     }
+
+
+# Helper function to get the class IDs whose announcements a user streams
+def get_stream_class_ids(db: Session, user: Principal) -> List[int]:
+    if user.role == "parent":
+        rows = (
+            db.query(Student.class_id)
+            .join(ParentStudent, ParentStudent.student_id == Student.id)
+            .filter(ParentStudent.parent_id == user.id)
+            .distinct()
+            .all()
+        )
+    else:
+        rows = db.query(teacher_class.c.class_id).filter(teacher_class.c.teacher_id == user.id).all()
+    return [row[0] for row in rows]
+
+
+# Helper function to load announcements missed since the client's Last-Event-ID
+def replay_announcements(db: Session, user: Principal, class_ids: List[int], after_id: int):
+    if user.role == "parent":
+        filters = {"inbox_user_id": user.id}
+    elif class_ids:
+        filters = {"class_ids": class_ids, "recipient_id": user.id}
+    else:
+        return [], False
+
+    rows = fetch_announcements(db, after_id=after_id, limit=MAX_PAGE_SIZE + 1, **filters)
+    truncated = len(rows) > MAX_PAGE_SIZE
+    rows = rows[:MAX_PAGE_SIZE]
+    recipient_map = fetch_recipient_ids(db, [row[0].id for row in rows])
+    # Oldest first, so the client's Last-Event-ID always advances
+    return list(reversed(serialize_announcements(rows, recipient_map))), truncated
+
+
+def format_sse(event: str, data: Dict[str, Any], event_id: Optional[int] = None) -> str:
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data)}")
+    return "\n".join(lines) + "\n\n"
+
+
+async def announcement_events(request: Request, user: Principal, class_ids: List[int], last_event_id: Optional[int]):
+    subscription = broadcaster.subscribe(user.id, class_ids)
+    try:
+        yield f"retry: {STREAM_RETRY_MS}\n\n"
+        last_sent_id = last_event_id or 0
+
+        # Catch up from the database; subscribing first means nothing is missed in between
+        if last_event_id is not None:
+            missed, truncated = await run_in_async_session(replay_announcements, user, class_ids, last_event_id)
+            if truncated:
+                # Too far behind to replay: the client should reload its dashboard
+                yield format_sse("resync", {})
+            for event in missed:
+                yield format_sse("announcement", event, event["id"])
+                last_sent_id = event["id"]
+
+        while True:
+            if subscription.overflowed or await request.is_disconnected():
+                break
+            try:
+                event = await asyncio.wait_for(subscription.queue.get(), timeout=STREAM_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": heartbeat\n\n"
+                continue
+            if event["id"] <= last_sent_id:
+                continue
+            yield format_sse("announcement", event, event["id"])
+            last_sent_id = event["id"]
+    finally:
+        broadcaster.unsubscribe(subscription)
+
+
+@router.get("/dashboard/stream")
+async def dashboard_stream(
+    request: Request,
+    last_event_id: Optional[str] = Header(None, alias="Last-Event-ID"),
+    user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Server-Sent Events stream of new announcements for the caller's classes.
+    - Sends `announcement` events whose id is the announcement id.
+    - Resumes from the `Last-Event-ID` header after a reconnect.
+    - Sends a `resync` event when too much was missed to replay.
+    """
+    if user.role not in ["parent", "teacher"]:
+        raise HTTPException(status_code=403, detail="Access forbidden")
+
+    try:
+        resume_after = int(last_event_id) if last_event_id else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid Last-Event-ID")
+
+    class_ids = await db.run_sync(get_stream_class_ids, user)
+
+    return StreamingResponse(
+        announcement_events(request, user, class_ids, resume_after),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
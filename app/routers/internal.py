@@ -0,0 +1,89 @@
+# app/routers/internal.py
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, status
+from fastapi.responses import PlainTextResponse
+from sqlalchemy.orm import Session
+from typing import Optional
+from app.database import get_db, sync_pool_stats, async_pool_stats, DB_POOL_SIZE, DB_MAX_OVERFLOW, IS_SQLITE
+from app.routers.auth import role_required
+from app.utils.principal_cache import principal_cache
+from app.utils.announcement_cache import announcement_cache
+from app.utils.request_metrics import metrics_registry
+from app.utils.slow_queries import SLOW_QUERY_MS, recent_slow_queries
+from app.utils.email_outbox import outbox_stats
+from app.utils.notifications import notification_router
+import hmac
+import os
+
+router = APIRouter()
+
+# Bearer token Prometheus must send to read /metrics; unset leaves it open
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+
+@router.get("/internal/db-pool", response_model=dict, dependencies=[Depends(role_required(["admin"]))])
+def get_db_pool_stats():
+    """
+    Connection pool statistics for this worker process.
+    - Checkout wait percentiles, in-use and overflow counts, connection churn.
+    - `max_connections_per_worker` is the most connections this worker can open
+      across both engines; multiply by the number of workers to size Postgres.
+    """
+    return {
+        "max_connections_per_worker": None if IS_SQLITE else 2 * (DB_POOL_SIZE + DB_MAX_OVERFLOW),
+        "sync": sync_pool_stats.snapshot(),
+        "async": async_pool_stats.snapshot(),
+    }
+
+
+@router.get("/internal/caches", response_model=dict, dependencies=[Depends(role_required(["admin"]))])
+def get_cache_stats():
+    """
+    Hit/miss counters of the in-process caches of this worker.
+    """
+    return {
+        "principals": principal_cache.stats(),
+        "announcements": announcement_cache.stats(),
+    }
+
+
+@router.get("/internal/slow-queries", response_model=dict, dependencies=[Depends(role_required(["admin"]))])
+def get_slow_queries(limit: int = Query(100, ge=1, le=1000)):
+    """
+    Most recent entries of the slow-query log, newest first.
+    - Statements slower than SLOW_QUERY_MS, with normalized SQL, parameter types,
+      route and duration; `plan` is set for the sampled SELECTs that were EXPLAINed.
+    - The log file is per host: with several workers on one host they share it.
+    """
+    return {"threshold_ms": SLOW_QUERY_MS, "entries": recent_slow_queries(limit)}
+
+
+@router.get("/internal/email-outbox", response_model=dict, dependencies=[Depends(role_required(["admin"]))])
+def get_email_outbox_stats(db: Session = Depends(get_db)):
+    """
+    State of the email outbox.
+    - `pending` includes messages waiting for a retry; `dead` messages need review.
+    - `oldest_due_seconds` is how far the worker is behind (null when it is caught up).
+    """
+    return outbox_stats(db)
+
+
+@router.get("/internal/notifications", response_model=dict, dependencies=[Depends(role_required(["admin"]))])
+def get_notification_stats():
+    """
+    Announcement notifications of this worker, per channel (sms).
+    - `waiting` deliveries are queued for the channel's next batch.
+    - `failed` counts deliveries in batches whose send raised (see the logs).
+    """
+    return notification_router.stats()
+
+
+@router.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+def get_metrics(authorization: Optional[str] = Header(None)):
+    """
+    Request, latency and SQL metrics of this worker in Prometheus text format.
+    Requires `Authorization: Bearer <METRICS_TOKEN>` when METRICS_TOKEN is set.
+    """
+    if METRICS_TOKEN and not hmac.compare_digest(authorization or "", f"Bearer {METRICS_TOKEN}"):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid metrics token.")
+    return PlainTextResponse(metrics_registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
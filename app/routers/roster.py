@@ -0,0 +1,50 @@
+# app/routers/roster.py
+
+from fastapi import APIRouter, Depends, File, HTTPException, Query, UploadFile, status
+from sqlalchemy.orm import Session
+from typing import Any, Dict, Optional
+from app.database import get_db
+from app.routers.auth import role_required
+from app.utils.roster_import import detect_format, import_roster
+from app.utils.roster_sync import sync_roster
+
+router = APIRouter()
+
+
+@router.post("/roster/import", response_model=Dict[str, Any], dependencies=[Depends(role_required(["admin"]))])
+def import_roster_file(
+    file: UploadFile = File(..., description="CSV or NDJSON roster, one row per (student, parent) pair"),
+    format: Optional[str] = Query(None, pattern="^(csv|ndjson)$", description="Defaults to the file extension"),
+    dry_run: bool = Query(False, description="Validate and report without writing"),
+    db: Session = Depends(get_db)
+):
+    """
+    Import schools, classes, students and parent links from a roster file.
+    - Schools are matched by name, classes by school and name, students by `student_ref`.
+    - Existing students are updated, parents are linked by email.
+    - Returns counts and a per-row error report; rows with errors are skipped.
+    """
+    try:
+        return import_roster(db, file.file, fmt=format or detect_format(file.filename), dry_run=dry_run)
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Roster file must be UTF-8 encoded")
+
+
+@router.post("/roster/sync", response_model=Dict[str, Any], dependencies=[Depends(role_required(["admin"]))])
+def sync_roster_file(
+    file: UploadFile = File(..., description="The source's full roster, in the import format"),
+    source: str = Query(..., min_length=1, max_length=100, description="Name of the roster feed, e.g. the school"),
+    format: Optional[str] = Query(None, pattern="^(csv|ndjson)$", description="Defaults to the file extension"),
+    dry_run: bool = Query(False, description="Compute and report the changeset without writing"),
+    db: Session = Depends(get_db)
+):
+    """
+    Sync a full roster against the previous sync of the same source.
+    - Only added, changed and removed records are written; unchanged ones are skipped.
+    - Records missing from the roster are removed (students, parent links, teacher assignments).
+    - Returns per-kind change counts and a per-row error report.
+    """
+    try:
+        return sync_roster(db, file.file, source, fmt=format or detect_format(file.filename), dry_run=dry_run)
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Roster file must be UTF-8 encoded")
@@ -1,10 +1,12 @@
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException, status
+from typing import List, Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, status
 from sqlalchemy.orm import Session
 from app.database import get_db
 from app.models import School
 from app.schemas.schools import SchoolCreate, SchoolResponse
 from app.routers.auth import role_required
+from app.utils.announcement_cache import mark_classes_changed
+from app.utils.catalog import catalog, catalog_response, mark_catalog_changed
 
 router = APIRouter()
 
@@ -16,15 +18,17 @@ def create_school(school_data: SchoolCreate, db: Session = Depends(get_db)):
         raise HTTPException(status_code=400, detail="School already exists")
     new_school = School(name=school_data.name)
     db.add(new_school)
+    mark_catalog_changed(db)
     db.commit()
     db.refresh(new_school)
     return new_school
 
 
 @router.get("/schools/all", response_model=List[SchoolResponse])
-def get_all_schools(db: Session = Depends(get_db)):
-    schools = db.query(School).all()
-    return schools
+def get_all_schools(if_none_match: Optional[str] = Header(None), db: Session = Depends(get_db)):
+    # Served from the catalog snapshot; 304 when the client's ETag is current
+    snapshot = catalog.get(db)
+    return catalog_response(snapshot.schools_json, snapshot.schools_etag, if_none_match)
 
 
 @router.get("/schools/{school_id}", response_model=SchoolResponse, dependencies=[Depends(role_required("admin"))])
@@ -41,6 +45,9 @@ def update_school(school_id: int, school_data: SchoolCreate, db: Session = Depen
     if not school:
         raise HTTPException(status_code=404, detail="School not found")
     school.name = school_data.name
+    # Announcement feeds include the school name
+    mark_classes_changed(db, [c.id for c in school.classes])
+    mark_catalog_changed(db)
     db.commit()
     db.refresh(school)
     return school
@@ -51,6 +58,8 @@ def delete_school(school_id: int, db: Session = Depends(get_db)):
     school = db.query(School).filter(School.id == school_id).first()
     if not school:
         raise HTTPException(status_code=404, detail="School not found")
+    mark_classes_changed(db, [c.id for c in school.classes])
+    mark_catalog_changed(db)
     db.delete(school)
     db.commit()
     return {"message": "School deleted successfully"}
@@ -1,21 +1,28 @@
 from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy import exists
 from sqlalchemy.orm import Session
 from app.database import get_db
-from app.models import User, UserProfile, Student, ParentStudent, Class
+from app.models import User, UserProfile, Student, ParentStudent, Class, Announcement, DigestWatermark, PasswordReset
 from app.schemas.users import UserCreate, UserUpdate, UserResponse, StudentCreate, StudentResponse
+from app.utils.principal_cache import Principal, principal_cache
 from app.routers.auth import get_current_user, role_required
+from app.utils.inbox_utils import add_parent_to_class_inbox, remove_parent_from_class_inbox, clear_user_inbox
+from app.utils.announcement_cache import mark_classes_changed
 import json
+import logging
 from app.schemas.users import UserResponse
 from app.models import User, teacher_class, ClassRepresentative
 from app.schemas.users import UserResponse, UserProfileResponse
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter()
 
 
 from sqlalchemy.orm import joinedload
 
 @router.get("/users/{username}", response_model=UserResponse)
-def get_user(username: str, db: Session = Depends(get_db), user: User = Depends(get_current_user)):
+def get_user(username: str, db: Session = Depends(get_db), user: Principal = Depends(get_current_user)):
     # Allow access only to admin or the user themselves
     if user.username != username and user.role != "admin":
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Access forbidden")
@@ -44,7 +51,7 @@ def get_user(username: str, db: Session = Depends(get_db), user: User = Depends(
 
 
 @router.put("/users/{username}/update", response_model=UserResponse)
-def update_user(username: str, user_update: UserUpdate, db: Session = Depends(get_db), user: User = Depends(get_current_user)):
+def update_user(username: str, user_update: UserUpdate, db: Session = Depends(get_db), user: Principal = Depends(get_current_user)):
     # Allow access only to admin or the user themselves
     if user.username != username and user.role != "admin":
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Access forbidden")
@@ -94,9 +101,14 @@ def update_user(username: str, user_update: UserUpdate, db: Session = Depends(ge
                     student_id=student.id
                 )
                 db.add(parent_student)
+                add_parent_to_class_inbox(db, db_user.id, student.class_id)
                 db.commit()
 
+    # Announcement feeds show the creator's name
+    created_in = db.query(Announcement.class_id).filter(Announcement.creator_id == db_user.id).distinct().all()
+    mark_classes_changed(db, [row[0] for row in created_in])
     db.commit()
+    principal_cache.invalidate(db_user.id)
     db.refresh(db_user)
     return db_user
 
@@ -106,10 +118,10 @@ def update_user(username: str, user_update: UserUpdate, db: Session = Depends(ge
 def add_child(
     student_data: StudentCreate,
     db: Session = Depends(get_db),
-    user: User = Depends(get_current_user)
+    user: Principal = Depends(get_current_user)
 ):
-    print("Received payload:", student_data)
-    print("Current user:", user.id, user.role)
+    logger.debug("Received payload: %s", student_data)
+    logger.debug("User ID: %s, Role: %s", user.id, user.role)
 
     if user.role != "parent":
         raise HTTPException(status_code=403, detail="Only parents can add children.")
@@ -151,6 +163,9 @@ def add_child(
         student_id=new_student.id
     )
     db.add(parent_student)
+
+    # Deliver the class's existing announcements to the parent's inbox
+    add_parent_to_class_inbox(db, user.id, new_student.class_id)
     db.commit()
 
     return new_student
@@ -158,9 +173,9 @@ def add_child(
 
 
 @router.delete("/users/{username}/delete", response_model=dict)
-def delete_user(username: str, db: Session = Depends(get_db), user: User = Depends(role_required("admin"))):
-    # Fetch the user by username
-    db_user = db.query(User).filter(User.username == username).first()
+def delete_user(username: str, db: Session = Depends(get_db), user: Principal = Depends(role_required("admin"))):
+    # Fetch the user by username, with the profile deleted below
+    db_user = db.query(User).options(joinedload(User.profile)).filter(User.username == username).first()
     if not db_user:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
     
@@ -168,20 +183,26 @@ def delete_user(username: str, db: Session = Depends(get_db), user: User = Depen
     if db_user.profile:
         db.delete(db_user.profile)
 
-    # Delete associated students (via ParentStudent relationship)
-    for association in db_user.children:
-        student = association  # Directly access the student
-        db.query(ParentStudent).filter(
-            ParentStudent.parent_id == db_user.id, 
-            ParentStudent.student_id == student.id
-        ).delete()
-        # Delete the student only if no other parents are associated
-        if not db.query(ParentStudent).filter(ParentStudent.student_id == student.id).first():
-            db.delete(student)
+    # Remove the parent's links to their children, then the children no other parent is linked to
+    student_ids = [
+        student_id for (student_id,) in
+        db.query(ParentStudent.student_id).filter(ParentStudent.parent_id == db_user.id).all()
+    ]
+    if student_ids:
+        db.query(ParentStudent).filter(ParentStudent.parent_id == db_user.id).delete(synchronize_session=False)
+        still_linked = exists().where(ParentStudent.student_id == Student.id)
+        db.query(Student).filter(Student.id.in_(student_ids), ~still_linked).delete(synchronize_session=False)
+
+    # Remove the user's inbox and their digest position
+    clear_user_inbox(db, db_user.id)
+    db.query(DigestWatermark).filter(DigestWatermark.user_id == db_user.id).delete(synchronize_session=False)
+    # And a pending password reset token
+    db.query(PasswordReset).filter(PasswordReset.user_id == db_user.id).delete(synchronize_session=False)
 
     # Finally, delete the user
     db.delete(db_user)
     db.commit()
+    principal_cache.invalidate(db_user.id)
     return {"detail": f"User {username} successfully deleted"}
 
 
@@ -190,7 +211,7 @@ def delete_user(username: str, db: Session = Depends(get_db), user: User = Depen
 def delete_child(
     student_id: int,
     db: Session = Depends(get_db),
-    user: User = Depends(get_current_user)
+    user: Principal = Depends(get_current_user)
 ):
     if user.role not in ["parent", "admin"]:
         raise HTTPException(status_code=403, detail="Only parents and admins can delete children.")
@@ -214,6 +235,10 @@ def delete_child(
 
     # Optionally, delete the student record as well (if not referenced elsewhere)
     db.delete(student)
+    db.flush()
+
+    # Withdraw the class's announcements if the parent has no other child there
+    remove_parent_from_class_inbox(db, user.id, student.class_id)
 
     # Commit the changes
     db.commit()
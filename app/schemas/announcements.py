@@ -1,7 +1,7 @@
 # app/schemas/announcements.py
 
 from enum import Enum
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, ConfigDict
 from typing import Optional, List
 from datetime import datetime
 
@@ -29,6 +29,10 @@ class AnnouncementCreate(AnnouncementBase):
     pass
 
 
+class AnnouncementBatchCreate(BaseModel):
+    announcements: List[AnnouncementCreate] = Field(..., min_length=1, max_length=50)
+
+
 class AnnouncementResponse(BaseModel):
     id: int
     title: str
@@ -42,8 +46,7 @@ class AnnouncementResponse(BaseModel):
     creator_name: Optional[str] = None
     recipients: List[int]  # Reflects the list of recipient IDs
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 class AnnouncementOut(BaseModel):
@@ -56,5 +59,4 @@ class AnnouncementOut(BaseModel):
     date_submitted: datetime
     creator_name: str
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
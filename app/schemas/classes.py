@@ -1,14 +1,13 @@
 # app/schemas/classes.py
 
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 from typing import Optional
 
 class ClassBase(BaseModel):
     name: str  # Changed from 'class_name' to 'name' to match ORM model
     school_id: int
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 class ClassCreate(ClassBase):
     pass
@@ -19,8 +18,7 @@ class ClassResponse(BaseModel):
     school_id: int
     school_name: str  # Include school_name to simplify API responses
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 class ClassAssignmentRequest(BaseModel):
     class_id: int
\ No newline at end of file
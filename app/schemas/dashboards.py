@@ -1,5 +1,5 @@
 from typing import List, Optional
-from pydantic import BaseModel, ConfigDict
+from pydantic import BaseModel, ConfigDict, Field
 from datetime import datetime
 
 
@@ -20,21 +20,43 @@ class AnnouncementResponse(BaseModel):
     target_audience: str
     class_id: int
     class_name: str
+    school_name: Optional[str] = None
     creator_id: int
     creator_name: str
     date_submitted: Optional[datetime] = None
     recipients: Optional[List[int]] = None
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
+
+class DashboardClass(BaseModel):
+    id: int
+    class_name: str
+    school_name: str
+
+class StudentClass(BaseModel):
+    id: Optional[int] = None
+    name: str
+
+class DashboardStudent(BaseModel):
+    id: int
+    first_name: str
+    last_name: str
+    # "class" is a keyword, so the field is exposed through an alias
+    class_: StudentClass = Field(alias="class")
+
+    model_config = ConfigDict(populate_by_name=True)
 
 class ParentDashboardResponse(BaseModel):
-    classes: List[ClassResponse]
     announcements: List[AnnouncementResponse]
+    students: List[DashboardStudent]
+    next_cursor: Optional[str] = None
 
 class TeacherDashboardResponse(BaseModel):
-    classes: List[ClassResponse]
     announcements: List[AnnouncementResponse]
+    classes: List[DashboardClass]
+    available_classes: List[DashboardClass]
+    name: str
+    next_cursor: Optional[str] = None
 
 class AdminDashboardResponse(BaseModel):
     users: List[dict]  # Adjust based on your user schema
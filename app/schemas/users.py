@@ -1,4 +1,4 @@
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, ConfigDict
 from typing import Optional, List
 
 # ------------------------------
@@ -9,8 +9,7 @@ class StudentCreate(BaseModel):
     last_name: str
     class_id: int  # Class ID the student is enrolled in
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 class StudentResponse(BaseModel):
@@ -19,8 +18,7 @@ class StudentResponse(BaseModel):
     last_name: str
     class_id: int
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 # ------------------------------
 # User profile-related schemas
@@ -33,22 +31,18 @@ class UserProfileBase(BaseModel):
     hobbies: Optional[str] = None
     preferred_contact_method: Optional[str] = None
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 class UserProfileCreate(UserProfileBase):
     # No additional fields; inherits all optional fields from UserProfileBase
-    class Config:
-        orm_mode = True
-        from_attributes = True  # Required for `from_orm`
+    model_config = ConfigDict(from_attributes=True)
 
 
 
 class UserProfileResponse(UserProfileBase):
     # Add any related fields (e.g. school, class, etc.) if needed in future
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 # ------------------------------
 # Parent-student relationship schema
@@ -58,8 +52,7 @@ class ParentStudentResponse(BaseModel):
     student_id: int
     relationship_type: Optional[str] = None
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 # ------------------------------
 # Teacher-class assignment schema
@@ -68,8 +61,7 @@ class teacher_classAssignment(BaseModel):
     teacher_id: int
     class_id: int
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 # ------------------------------
 # User-related schemas
@@ -80,8 +72,7 @@ class UserBase(BaseModel):
     role: str  # 'admin', 'teacher', 'parent'
     language: Optional[str] = "en"
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 class UserCreate(BaseModel):
@@ -90,8 +81,7 @@ class UserCreate(BaseModel):
     password: str
     role: str  # admin, teacher, parent
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 class UserUpdate(BaseModel):
@@ -101,8 +91,7 @@ class UserUpdate(BaseModel):
     profile: Optional[UserProfileCreate] = None  # Profile is optional
     students: Optional[List[StudentCreate]] = None  # For updating parent students
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 class UserResponse(BaseModel):
@@ -111,6 +100,4 @@ class UserResponse(BaseModel):
     email: EmailStr
     role: str  # 'admin', 'teacher', 'parent'
 
-    class Config:
-        orm_mode = True
-        from_attributes = True  # Required for `from_orm`
+    model_config = ConfigDict(from_attributes=True)
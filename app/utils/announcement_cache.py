@@ -0,0 +1,229 @@
+# app/utils/announcement_cache.py
+#
+# Cache of serialized announcement feed pages, shared by /dashboard/* and /announcements.
+#
+# Keys embed version counters of what a page depends on (its classes, and the user for
+# inbox and creator feeds). Writers bump those versions after their transaction commits,
+# so stale entries are never read again and simply age out. Backends:
+# - none (the default): no caching.
+# - redis: any server speaking the Redis protocol, shared by all workers
+#   (requires the `redis` package).
+# - memory: per-process LRU, for single-process deployments only. Bumps are only seen
+#   by the process that made them, so with several workers the other processes serve
+#   stale pages for up to the TTL.
+
+from collections import OrderedDict
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from typing import Any, Callable, Dict, Iterable, List, Optional
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# "memory", "redis" or "none"
+ANNOUNCEMENT_CACHE_BACKEND = os.getenv("ANNOUNCEMENT_CACHE_BACKEND", "none")
+ANNOUNCEMENT_CACHE_URL = os.getenv("ANNOUNCEMENT_CACHE_URL", "redis://localhost:6379/0")
+ANNOUNCEMENT_CACHE_SIZE = int(os.getenv("ANNOUNCEMENT_CACHE_SIZE", "5000"))
+# Upper bound on staleness for changes the cache is not told about
+ANNOUNCEMENT_CACHE_TTL = int(os.getenv("ANNOUNCEMENT_CACHE_TTL", "300"))
+
+KEY_PREFIX = "klasstra:announcements:"
+PENDING_BUMPS = "announcement_cache_bumps"
+
+
+class MemoryBackend:
+    """
+    Per-process LRU of cache entries with a TTL. Versions are kept apart from the
+    entries and never evicted, so an entry can't become valid again after a bump.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._versions: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[1] < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def set(self, key: str, value: bytes) -> None:
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def get_versions(self, names: List[str]) -> List[int]:
+        with self._lock:
+            return [self._versions.get(name, 0) for name in names]
+
+    def bump(self, names: Iterable[str]) -> None:
+        with self._lock:
+            for name in names:
+                self._versions[name] = self._versions.get(name, 0) + 1
+
+    def size(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+
+class RedisBackend:
+    """
+    Entries with a TTL and version counters in Redis. `client` can be any object with
+    the redis-py interface used here (get, set, mget, pipeline, dbsize).
+    """
+
+    def __init__(self, url: str, ttl: int, client: Any = None):
+        if client is None:
+            try:
+                import redis
+            except ImportError:
+                raise RuntimeError("ANNOUNCEMENT_CACHE_BACKEND=redis requires the 'redis' package")
+            client = redis.Redis.from_url(url, socket_timeout=0.25, socket_connect_timeout=0.25)
+        self.client = client
+        self.ttl = ttl
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.client.get(KEY_PREFIX + key)
+
+    def set(self, key: str, value: bytes) -> None:
+        self.client.set(KEY_PREFIX + key, value, ex=self.ttl)
+
+    def get_versions(self, names: List[str]) -> List[int]:
+        if not names:
+            return []
+        values = self.client.mget([KEY_PREFIX + "v:" + name for name in names])
+        return [int(value) if value is not None else 0 for value in values]
+
+    def bump(self, names: Iterable[str]) -> None:
+        pipeline = self.client.pipeline(transaction=False)
+        for name in names:
+            pipeline.incr(KEY_PREFIX + "v:" + name)
+        pipeline.execute()
+
+    def size(self) -> Optional[int]:
+        return None
+
+
+class AnnouncementCache:
+    def __init__(self, backend: Any):
+        self.backend = backend
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    def _count(self, attribute: str) -> None:
+        with self._lock:
+            setattr(self, attribute, getattr(self, attribute) + 1)
+
+    def get_or_load(self, params: Dict[str, Any], dependencies: List[str], loader: Callable[[], Any]) -> Any:
+        """
+        Return the cached value for `params` at the current versions of `dependencies`,
+        or call `loader` and cache its (JSON-serializable) result.
+        Backend failures are logged and fall through to `loader`.
+        """
+        if self.backend is None:
+            return loader()
+        try:
+            versions = self.backend.get_versions(dependencies)
+            key = hashlib.sha1(
+                json.dumps([params, dependencies, versions], sort_keys=True, default=str).encode()
+            ).hexdigest()
+            cached = self.backend.get(key)
+        except Exception:
+            logger.warning("Announcement cache read failed", exc_info=True)
+            self._count("errors")
+            return loader()
+
+        if cached is not None:
+            self._count("hits")
+            return json.loads(cached)
+
+        self._count("misses")
+        value = loader()
+        try:
+            self.backend.set(key, json.dumps(value).encode())
+        except Exception:
+            logger.warning("Announcement cache write failed", exc_info=True)
+            self._count("errors")
+        return value
+
+    def invalidate(self, dependencies: Iterable[str]) -> None:
+        if self.backend is None:
+            return
+        try:
+            self.backend.bump(dependencies)
+        except Exception:
+            # Entries still expire after ANNOUNCEMENT_CACHE_TTL
+            logger.warning("Announcement cache invalidation failed", exc_info=True)
+            self._count("errors")
+
+    def stats(self) -> dict:
+        with self._lock:
+            data = {
+                "backend": ANNOUNCEMENT_CACHE_BACKEND,
+                "hits": self.hits,
+                "misses": self.misses,
+                "errors": self.errors,
+            }
+        data["size"] = self.backend.size() if self.backend is not None else 0
+        return data
+
+
+def class_dependency(class_id: int) -> str:
+    return f"class:{class_id}"
+
+
+def user_dependency(user_id: int) -> str:
+    return f"user:{user_id}"
+
+
+def _create_backend():
+    if ANNOUNCEMENT_CACHE_BACKEND == "memory":
+        return MemoryBackend(ANNOUNCEMENT_CACHE_SIZE, ANNOUNCEMENT_CACHE_TTL)
+    if ANNOUNCEMENT_CACHE_BACKEND == "redis":
+        return RedisBackend(ANNOUNCEMENT_CACHE_URL, ANNOUNCEMENT_CACHE_TTL)
+    if ANNOUNCEMENT_CACHE_BACKEND == "none":
+        return None
+    raise ValueError(f"Unknown ANNOUNCEMENT_CACHE_BACKEND '{ANNOUNCEMENT_CACHE_BACKEND}'")
+
+
+announcement_cache = AnnouncementCache(_create_backend())
+
+
+# Write-through invalidation: writers record what they changed on the session, and the
+# versions are bumped once the transaction has committed. Bumping before the commit would
+# let a concurrent reader cache the old rows under the new version.
+def mark_classes_changed(db: Session, class_ids: Iterable[int]) -> None:
+    db.info.setdefault(PENDING_BUMPS, set()).update(class_dependency(class_id) for class_id in class_ids)
+
+
+def mark_users_changed(db: Session, user_ids: Iterable[int]) -> None:
+    db.info.setdefault(PENDING_BUMPS, set()).update(user_dependency(user_id) for user_id in user_ids)
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_pending_bumps(session: Session) -> None:
+    pending = session.info.pop(PENDING_BUMPS, None)
+    if pending:
+        announcement_cache.invalidate(sorted(pending))
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending_bumps(session: Session) -> None:
+    session.info.pop(PENDING_BUMPS, None)
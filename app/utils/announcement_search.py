@@ -0,0 +1,126 @@
+# app/utils/announcement_search.py
+#
+# Multilingual full-text search over announcements.
+# - PostgreSQL: generated tsvector columns (search_en/de/fr) with GIN indexes,
+#   each built with the text search configuration of its language. They are created
+#   by migration e5a90b3c7d21 only.
+# - SQLite: an external-content FTS5 table kept in sync by triggers, also created at
+#   startup so databases made with create_all can search.
+
+from sqlalchemy import text, func, literal_column, and_, or_, table, column
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from app.models import Announcement, UserInbox
+from app.utils.announcement_utils import announcement_rows_query
+from typing import Any, List, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Announcement language -> PostgreSQL text search configuration
+PG_SEARCH_CONFIGS = {"en": "english", "de": "german", "fr": "french"}
+
+SQLITE_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS announcements_fts USING fts5("
+    "title, content_en, content_de, content_fr, "
+    "content='announcements', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS announcements_fts_ai AFTER INSERT ON announcements BEGIN "
+    "INSERT INTO announcements_fts(rowid, title, content_en, content_de, content_fr) "
+    "VALUES (new.id, new.title, new.content_en, new.content_de, new.content_fr); END",
+    "CREATE TRIGGER IF NOT EXISTS announcements_fts_ad AFTER DELETE ON announcements BEGIN "
+    "INSERT INTO announcements_fts(announcements_fts, rowid, title, content_en, content_de, content_fr) "
+    "VALUES ('delete', old.id, old.title, old.content_en, old.content_de, old.content_fr); END",
+    "CREATE TRIGGER IF NOT EXISTS announcements_fts_au AFTER UPDATE ON announcements BEGIN "
+    "INSERT INTO announcements_fts(announcements_fts, rowid, title, content_en, content_de, content_fr) "
+    "VALUES ('delete', old.id, old.title, old.content_en, old.content_de, old.content_fr); "
+    "INSERT INTO announcements_fts(rowid, title, content_en, content_de, content_fr) "
+    "VALUES (new.id, new.title, new.content_en, new.content_de, new.content_fr); END",
+]
+
+
+def ensure_search_index(engine: Engine) -> None:
+    """
+    Create the FTS5 table and triggers on SQLite if they do not exist yet. Safe to run
+    on every startup. Other databases are left to the migrations.
+    """
+    dialect = engine.dialect.name
+    if dialect != "sqlite":
+        if dialect != "postgresql":
+            logger.warning("Full-text search is not available for dialect '%s'", dialect)
+        return
+    with engine.begin() as connection:
+        created = connection.execute(
+            text("SELECT 1 FROM sqlite_master WHERE name = 'announcements_fts'")
+        ).first() is None
+        for ddl in SQLITE_DDL:
+            connection.execute(text(ddl))
+        if created:
+            # Index announcements that existed before the FTS table
+            connection.execute(text("INSERT INTO announcements_fts(announcements_fts) VALUES ('rebuild')"))
+
+
+def _fts5_query(query: str, language: Optional[str]) -> str:
+    # Quote every term so user input cannot break FTS5 query syntax; terms are ANDed
+    terms = ['"' + term.replace('"', '""') + '"' for term in query.split()]
+    expression = " ".join(terms)
+    if language:
+        return f"{{title content_{language}}} : ({expression})"
+    return expression
+
+
+def search_announcements(
+    db: Session,
+    query: str,
+    class_ids: Optional[List[int]] = None,
+    inbox_user_id: Optional[int] = None,
+    language: Optional[str] = None,
+    limit: int = 20,
+    offset: int = 0
+) -> List[Any]:
+    """
+    Ranked full-text search. Returns rows in the shape of `fetch_announcements`,
+    best match first.
+
+    - `language` restricts matching to one of 'en', 'de', 'fr'; all three otherwise.
+    - `class_ids` scopes results to those classes (None: no class restriction).
+    - `inbox_user_id` scopes results to the user's inbox.
+    - A query without any terms matches nothing.
+    """
+    if not query.split():
+        return []
+
+    rows_query = announcement_rows_query(db)
+    dialect = db.get_bind().dialect.name
+
+    if dialect == "postgresql":
+        languages = [language] if language else list(PG_SEARCH_CONFIGS)
+        matches, ranks = [], []
+        for lang in languages:
+            vector = literal_column(f"announcements.search_{lang}")
+            ts_query = func.websearch_to_tsquery(literal_column(f"'{PG_SEARCH_CONFIGS[lang]}'::regconfig"), query)
+            matches.append(vector.op("@@")(ts_query))
+            ranks.append(func.ts_rank(vector, ts_query))
+        rank = ranks[0] if len(ranks) == 1 else func.greatest(*ranks)
+        rows_query = rows_query.filter(or_(*matches)).order_by(rank.desc(), Announcement.id.desc())
+    elif dialect == "sqlite":
+        fts_table = table("announcements_fts", column("rowid"))
+        fts = literal_column("announcements_fts")
+        rows_query = (
+            rows_query
+            .join(fts_table, fts_table.c.rowid == Announcement.id)
+            .filter(fts.op("MATCH")(_fts5_query(query, language)))
+            # bm25: lower is better
+            .order_by(func.bm25(fts), Announcement.id.desc())
+        )
+    else:
+        raise NotImplementedError(f"Full-text search is not supported for dialect '{dialect}'")
+
+    if class_ids is not None:
+        rows_query = rows_query.filter(Announcement.class_id.in_(class_ids))
+    if inbox_user_id is not None:
+        rows_query = rows_query.join(
+            UserInbox,
+            and_(UserInbox.announcement_id == Announcement.id, UserInbox.user_id == inbox_user_id)
+        )
+
+    return rows_query.offset(offset).limit(limit).all()
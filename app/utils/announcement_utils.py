@@ -1,25 +1,105 @@
 # app/utils/announcement_utils.py
 
 from sqlalchemy.orm import Session, aliased
-from sqlalchemy import or_, func
-from app.models import Announcement, Class, User, UserProfile, announcement_recipients
-from typing import List, Optional, Dict, Any
+from sqlalchemy import or_, and_, func, select
+from app.models import (
+    Announcement,
+    Class,
+    ParentStudent,
+    School,
+    Student,
+    User,
+    UserProfile,
+    UserInbox,
+    announcement_recipients,
+)
+from app.utils.announcement_cache import announcement_cache, class_dependency, user_dependency
+from typing import List, Optional, Dict, Any, Tuple
+from datetime import datetime
+import base64
+import json
+import os
 import logging
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
-def serialize_announcements(announcements: List[Any]) -> List[Dict[str, Any]]:
+# Page size configuration for announcement feeds
+DEFAULT_PAGE_SIZE = int(os.getenv("ANNOUNCEMENT_PAGE_SIZE", "50"))
+MAX_PAGE_SIZE = int(os.getenv("ANNOUNCEMENT_MAX_PAGE_SIZE", "200"))
+
+
+def encode_cursor(created_at: datetime, announcement_id: int) -> str:
+    """
+    Encode the (created_at, id) position of an announcement into an opaque cursor.
+    """
+    raw = json.dumps([created_at.isoformat(), announcement_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """
+    Decode a cursor produced by `encode_cursor`.
+    Raises ValueError if the cursor is malformed.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, announcement_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(created_at), int(announcement_id)
+    except (TypeError, ValueError, json.JSONDecodeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+def resolve_page_size(limit: Optional[int]) -> int:
+    """
+    Clamp a requested page size to the configured bounds.
+    """
+    if not limit:
+        return DEFAULT_PAGE_SIZE
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+
+def fetch_recipient_ids(db: Session, announcement_ids: List[int]) -> Dict[int, List[int]]:
+    """
+    Fetch recipient user IDs for a batch of announcements in a single query.
+
+    Reads the association table directly so no User objects are loaded.
+    Announcements without explicit recipients are absent from the result.
+    """
+    if not announcement_ids:
+        return {}
+
+    rows = db.execute(
+        select(announcement_recipients.c.announcement_id, announcement_recipients.c.user_id)
+        .where(announcement_recipients.c.announcement_id.in_(announcement_ids))
+        .order_by(announcement_recipients.c.announcement_id, announcement_recipients.c.user_id)
+    ).all()
+
+    recipient_map: Dict[int, List[int]] = {}
+    for announcement_id, user_id in rows:
+        recipient_map.setdefault(announcement_id, []).append(user_id)
+    return recipient_map
+
+
+def serialize_announcements(
+    announcements: List[Any],
+    recipient_map: Optional[Dict[int, List[int]]] = None
+) -> List[Dict[str, Any]]:
     """
     Serialize announcements fetched from the database.
 
-    Expects tuples of:
+    Expects rows as returned by `fetch_announcements`:
     - Announcement
     - class_name
+    - school_name
     - creator_name
+
+    Recipient IDs are taken from `recipient_map` (see `fetch_recipient_ids`)
+    rather than the lazy-loaded `Announcement.recipients` relationship.
     """
+    recipient_map = recipient_map or {}
     serialized = []
-    for announcement, class_name, creator_name in announcements:
+    for announcement, class_name, school_name, creator_name in announcements:
         serialized.append({
             "id": announcement.id,
             "title": announcement.title,
@@ -30,28 +110,21 @@ def serialize_announcements(announcements: List[Any]) -> List[Dict[str, Any]]:
             "target_audience": announcement.target_audience,
             "class_id": announcement.class_id,
             "class_name": class_name,
+            "school_name": school_name,
             "creator_id": announcement.creator_id,
             "creator_name": creator_name,  # Use combined creator name
             "date_submitted": announcement.created_at.isoformat() if announcement.created_at else None,
-            "recipients": [user.id for user in announcement.recipients]  # List of recipient IDs
+            "recipients": recipient_map.get(announcement.id, [])  # List of recipient IDs
         })
     return serialized
 
-def fetch_announcements(
-    db: Session,
-    class_ids: Optional[List[int]] = None,
-    creator_id: Optional[int] = None,
-    recipient_id: Optional[int] = None,
-    target_audience: Optional[str] = None
-) -> List[Any]:
+def announcement_rows_query(db: Session):
     """
-    Fetch announcements based on provided filters.
-    Utilizes a normalized many-to-many relationship for recipients.
+    Base query producing the rows `serialize_announcements` expects:
+    (Announcement, class_name, school_name, creator_name).
     """
-    
     # Create aliases for User
     CreatorUser = aliased(User, name='creator_user')
-    RecipientUser = aliased(User, name='recipient_user')
 
     # Coalesce for creator name: use UserProfile's first and last name if available; else, use CreatorUser.username
     creator_name = func.coalesce(
@@ -59,37 +132,80 @@ def fetch_announcements(
         CreatorUser.username
     ).label("creator_name")
 
-    # Base query: Join Announcement with Class, Creator User, and UserProfile
-    query = db.query(
+    # Join Announcement with Class, School, Creator User, and UserProfile
+    return db.query(
         Announcement,
         Class.name.label("class_name"),
+        School.name.label("school_name"),
         creator_name
     ).join(
         Class, Announcement.class_id == Class.id
+    ).join(
+        School, Class.school_id == School.id
     ).join(
         CreatorUser, Announcement.creator_id == CreatorUser.id
     ).outerjoin(
         UserProfile, CreatorUser.id == UserProfile.user_id
     )
 
+
+def fetch_announcements(
+    db: Session,
+    class_ids: Optional[List[int]] = None,
+    announcement_ids: Optional[List[int]] = None,
+    after_id: Optional[int] = None,
+    creator_id: Optional[int] = None,
+    recipient_id: Optional[int] = None,
+    inbox_user_id: Optional[int] = None,
+    target_audience: Optional[str] = None,
+    cursor: Optional[str] = None,
+    since: Optional[datetime] = None,
+    limit: Optional[int] = None
+) -> List[Any]:
+    """
+    Fetch announcements based on provided filters, newest first.
+    Utilizes a normalized many-to-many relationship for recipients.
+
+    Results are ordered by (created_at, id) descending so they can be paged
+    with a keyset `cursor` (see `fetch_announcement_page`). `since` only
+    returns announcements created after the given watermark.
+
+    `inbox_user_id` reads the user's materialized `user_inbox` instead of
+    resolving visibility through the recipients join. `after_id` returns only
+    announcements with a higher id (stream resume).
+    """
+    
+    # Create alias for the recipient User
+    RecipientUser = aliased(User, name='recipient_user')
+
+    query = announcement_rows_query(db)
+
     # Apply class_ids filter
     if class_ids:
         query = query.filter(Announcement.class_id.in_(class_ids))
-        logger.debug(f"Filtering announcements for class IDs: {class_ids}")
+        logger.debug("Filtering announcements for class IDs: %s", class_ids)
+
+    # Apply announcement_ids filter
+    if announcement_ids:
+        query = query.filter(Announcement.id.in_(announcement_ids))
+
+    # Apply after_id filter
+    if after_id is not None:
+        query = query.filter(Announcement.id > after_id)
 
     # Apply creator_id filter
     if creator_id:
         query = query.filter(Announcement.creator_id == creator_id)
-        logger.debug(f"Filtering announcements by creator ID: {creator_id}")
+        logger.debug("Filtering announcements by creator ID: %s", creator_id)
 
     # Apply target_audience filter
     if target_audience:
         query = query.filter(Announcement.target_audience == target_audience)
-        logger.debug(f"Filtering announcements for target audience: {target_audience}")
+        logger.debug("Filtering announcements for target audience: %s", target_audience)
 
     # Apply recipient_id filter using the many-to-many relationship
     if recipient_id is not None:
-        logger.debug(f"Filtering announcements for recipient ID: {recipient_id}")
+        logger.debug("Filtering announcements for recipient ID: %s", recipient_id)
         # Left outer join to announcement_recipients and RecipientUser
         query = query.outerjoin(
             announcement_recipients,
@@ -107,11 +223,126 @@ def fetch_announcements(
         )
         logger.debug("Applied recipient filter using many-to-many relationship.")
 
-    # Execute the query and fetch all results
+    # Read from the user's inbox: ordering and paging use the inbox index
+    if inbox_user_id is not None:
+        query = query.join(
+            UserInbox,
+            and_(UserInbox.announcement_id == Announcement.id, UserInbox.user_id == inbox_user_id)
+        )
+        sort_created_at, sort_id = UserInbox.created_at, UserInbox.announcement_id
+        logger.debug("Reading announcements from inbox of user ID: %s", inbox_user_id)
+    else:
+        sort_created_at, sort_id = Announcement.created_at, Announcement.id
+
+    # Apply the since watermark
+    if since is not None:
+        query = query.filter(sort_created_at > since)
+        logger.debug("Filtering announcements created after: %s", since)
+
+    # Apply the keyset cursor: only rows strictly older than the cursor position
+    if cursor:
+        cursor_created_at, cursor_id = decode_cursor(cursor)
+        query = query.filter(
+            or_(
+                sort_created_at < cursor_created_at,
+                and_(sort_created_at == cursor_created_at, sort_id < cursor_id)
+            )
+        )
+
+    query = query.order_by(sort_created_at.desc(), sort_id.desc())
+    if limit is not None:
+        query = query.limit(limit)
+
+    # Execute the query and fetch the results
     try:
         announcements = query.all()
-        logger.debug(f"Number of announcements fetched: {len(announcements)}")
+        logger.debug("Number of announcements fetched: %s", len(announcements))
         return announcements
     except Exception as e:
-        logger.error(f"Error fetching announcements: {e}")
+        logger.error("Error fetching announcements: %s", e)
         raise
+
+
+def fetch_announcement_page(
+    db: Session,
+    limit: Optional[int] = None,
+    **filters: Any
+) -> Tuple[List[Any], Optional[str]]:
+    """
+    Fetch one page of announcements and the cursor for the next page.
+
+    Accepts the same filters as `fetch_announcements`. `next_cursor` is None
+    when there are no further pages.
+    """
+    page_size = resolve_page_size(limit)
+    rows = fetch_announcements(db, limit=page_size + 1, **filters)
+
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        last = rows[-1][0]
+        next_cursor = encode_cursor(last.created_at, last.id)
+    return rows, next_cursor
+
+
+def load_announcement_feed(
+    db: Session,
+    limit: Optional[int] = None,
+    **filters: Any
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    Fetch, resolve recipients for and serialize one page of announcements.
+    Returns (serialized announcements, next_cursor).
+    """
+    rows, next_cursor = fetch_announcement_page(db, limit=limit, **filters)
+    recipient_map = fetch_recipient_ids(db, [row[0].id for row in rows])
+    return serialize_announcements(rows, recipient_map), next_cursor
+
+
+def feed_dependencies(db: Session, filters: Dict[str, Any]) -> Optional[List[str]]:
+    """
+    Cache versions a feed page depends on, or None if the filters are not cacheable.
+    """
+    dependencies = []
+    if filters.get("class_ids"):
+        dependencies += [class_dependency(class_id) for class_id in sorted(set(filters["class_ids"]))]
+    if filters.get("inbox_user_id"):
+        user_id = filters["inbox_user_id"]
+        # The inbox changes with new announcements in the user's children's classes
+        class_ids = db.execute(
+            select(Student.class_id)
+            .join(ParentStudent, ParentStudent.student_id == Student.id)
+            .where(ParentStudent.parent_id == user_id)
+            .distinct()
+        ).scalars().all()
+        dependencies += [user_dependency(user_id)] + [class_dependency(class_id) for class_id in sorted(class_ids)]
+    for user_filter in ("recipient_id", "creator_id"):
+        if filters.get(user_filter):
+            dependencies.append(user_dependency(filters[user_filter]))
+    if not dependencies or filters.get("announcement_ids") or filters.get("after_id"):
+        return None
+    return dependencies
+
+
+def cached_announcement_feed(
+    db: Session,
+    limit: Optional[int] = None,
+    **filters: Any
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    `load_announcement_feed` through the announcement cache.
+    """
+    dependencies = feed_dependencies(db, filters)
+    if dependencies is None:
+        return load_announcement_feed(db, limit=limit, **filters)
+
+    params = {name: value for name, value in filters.items() if value is not None}
+    if "class_ids" in params:
+        params["class_ids"] = sorted(set(params["class_ids"]))
+    params["limit"] = resolve_page_size(limit)
+    serialized, next_cursor = announcement_cache.get_or_load(
+        params,
+        dependencies,
+        lambda: list(load_announcement_feed(db, limit=limit, **filters))
+    )
+    return serialized, next_cursor
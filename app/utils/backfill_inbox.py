@@ -0,0 +1,39 @@
+# backfill_inbox.py
+#
+# Fill user_inbox for announcements created before the inbox existed.
+# Usage: python -m app.utils.backfill_inbox [--chunk-size 1000]
+
+import argparse
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+from app.models import Announcement, UserInbox
+from app.database import engine
+from app.utils.inbox_utils import INBOX_COLUMNS, audience_select
+from app.utils.db_utils import insert_ignore
+
+
+def backfill_inbox(chunk_size: int = 1000):
+    with Session(bind=engine) as session:
+        max_id = session.execute(select(func.max(Announcement.id))).scalar() or 0
+
+    inserted = 0
+    # One short transaction per announcement-id range
+    for start in range(1, max_id + 1, chunk_size):
+        end = start + chunk_size - 1
+        with Session(bind=engine) as session:
+            stmt = insert_ignore(session, UserInbox.__table__).from_select(
+                INBOX_COLUMNS,
+                audience_select(Announcement.id.between(start, end))
+            )
+            inserted += session.execute(stmt).rowcount
+            session.commit()
+        print(f"Announcements {start}-{min(end, max_id)} of {max_id}: {inserted} inbox rows written so far.")
+
+    print("Inbox backfill complete.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill user_inbox from existing announcements.")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="Announcements per transaction")
+    args = parser.parse_args()
+    backfill_inbox(chunk_size=args.chunk_size)
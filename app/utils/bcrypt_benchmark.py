@@ -0,0 +1,54 @@
+# bcrypt_benchmark.py
+#
+# Measure bcrypt verification latency per cost factor and recommend the highest
+# BCRYPT_ROUNDS whose p95 stays under a target login latency.
+# Usage: python -m app.utils.bcrypt_benchmark --target-ms 250
+
+import argparse
+import statistics
+import time
+from passlib.hash import bcrypt
+
+
+def measure_rounds(rounds: int, samples: int):
+    hashed = bcrypt.using(rounds=rounds).hash("benchmark-password")
+    timings = []
+    for _ in range(samples):
+        start = time.perf_counter()
+        bcrypt.verify("benchmark-password", hashed)
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return {
+        "rounds": rounds,
+        "p50_ms": statistics.median(timings),
+        "p95_ms": timings[min(len(timings) - 1, int(round(0.95 * (len(timings) - 1))))],
+    }
+
+
+def pick_rounds(target_ms: float, samples: int, min_rounds: int, max_rounds: int):
+    results = []
+    recommended = None
+    for rounds in range(min_rounds, max_rounds + 1):
+        result = measure_rounds(rounds, samples)
+        results.append(result)
+        print(f"rounds={rounds:2d}  p50={result['p50_ms']:8.1f} ms  p95={result['p95_ms']:8.1f} ms")
+        if result["p95_ms"] > target_ms:
+            # Each extra round doubles the cost; no need to go further
+            break
+        recommended = rounds
+    return recommended, results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pick a bcrypt cost factor for a target p95 login latency.")
+    parser.add_argument("--target-ms", type=float, default=250.0, help="Target p95 verification latency in ms")
+    parser.add_argument("--samples", type=int, default=20, help="Verifications measured per cost factor")
+    parser.add_argument("--min-rounds", type=int, default=10)
+    parser.add_argument("--max-rounds", type=int, default=15)
+    args = parser.parse_args()
+
+    recommended, _ = pick_rounds(args.target_ms, args.samples, args.min_rounds, args.max_rounds)
+    if recommended is None:
+        print(f"Even {args.min_rounds} rounds exceed {args.target_ms} ms at p95 on this machine.")
+    else:
+        print(f"Recommended: BCRYPT_ROUNDS={recommended}")
@@ -0,0 +1,107 @@
+# app/utils/broadcaster.py
+
+import asyncio
+import os
+import threading
+import logging
+from typing import Any, Dict, Iterable, Set
+
+logger = logging.getLogger(__name__)
+
+# Events buffered per connection before the connection is dropped
+STREAM_QUEUE_SIZE = int(os.getenv("STREAM_QUEUE_SIZE", "100"))
+
+
+class Subscription:
+    """
+    One live announcement stream. Lives on the event loop that created it.
+
+    The queue is bounded: when a slow client falls `STREAM_QUEUE_SIZE` events
+    behind, the subscription is marked as overflowed and the stream ends. The
+    client then reconnects with `Last-Event-ID` and catches up from the database.
+    """
+
+    def __init__(self, user_id: int, class_ids: Iterable[int], maxsize: int = STREAM_QUEUE_SIZE):
+        self.user_id = user_id
+        self.class_ids: Set[int] = set(class_ids)
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.loop = asyncio.get_running_loop()
+        self.overflowed = False
+
+    def matches(self, event: Dict[str, Any]) -> bool:
+        """
+        Same visibility rules as the dashboards: addressed to this user, or
+        class-wide in one of the user's classes.
+        """
+        recipients = event.get("recipients") or []
+        if recipients:
+            return self.user_id in recipients
+        return event.get("class_id") in self.class_ids
+
+    def deliver(self, event: Dict[str, Any]) -> None:
+        # Runs on the subscription's event loop
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+            logger.warning("Announcement stream for user %s overflowed; closing it", self.user_id)
+
+
+class AnnouncementBroadcaster:
+    """
+    In-process pub/sub hub for newly created announcements.
+
+    `publish` may be called from any thread (sync routes run in the threadpool);
+    delivery is handed to each subscriber's event loop.
+    """
+
+    def __init__(self):
+        self._subscriptions: Set[Subscription] = set()
+        self._lock = threading.Lock()
+
+    def subscribe(self, user_id: int, class_ids: Iterable[int]) -> Subscription:
+        subscription = Subscription(user_id, class_ids)
+        with self._lock:
+            self._subscriptions.add(subscription)
+        logger.debug("User %s subscribed to announcements (%d open streams)", user_id, len(self._subscriptions))
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+    def publish(self, event: Dict[str, Any]) -> None:
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+        for subscription in subscriptions:
+            if not subscription.matches(event):
+                continue
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.deliver, event)
+            except RuntimeError:
+                # The subscriber's loop is closed; drop it
+                self.unsubscribe(subscription)
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscriptions)
+
+
+# Process-wide hub shared by create_announcement and /dashboard/stream
+broadcaster = AnnouncementBroadcaster()
+
+
+def publish_new_announcements(db, announcement_ids) -> None:
+    """
+    Serialize freshly committed announcements and push them to live streams.
+    """
+    from app.utils.announcement_utils import fetch_announcements, fetch_recipient_ids, serialize_announcements
+
+    if not broadcaster.subscriber_count or not announcement_ids:
+        return
+    rows = fetch_announcements(db, announcement_ids=list(announcement_ids))
+    recipient_map = fetch_recipient_ids(db, list(announcement_ids))
+    for event in reversed(serialize_announcements(rows, recipient_map)):
+        broadcaster.publish(event)
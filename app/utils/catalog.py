@@ -0,0 +1,149 @@
+# app/utils/catalog.py
+#
+# In-memory snapshot of the school/class catalog, with its JSON bodies and ETags
+# precomputed. Class and school writes bump the catalog version after commit and the
+# snapshot is rebuilt on the next read. Other worker processes pick the change up
+# within CATALOG_TTL seconds.
+
+from dataclasses import dataclass
+from fastapi import Response, status
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+from typing import Any, Dict, List, Optional
+from app.models import Class, School
+import hashlib
+import orjson
+import os
+import threading
+import time
+
+CATALOG_TTL = float(os.getenv("CATALOG_TTL", "60"))
+
+PENDING_CATALOG_CHANGE = "catalog_changed"
+
+
+@dataclass(frozen=True)
+class CatalogSnapshot:
+    version: int
+    built_at: float
+    classes: List[Dict[str, Any]]  # id, class_name, school_id, school_name
+    schools: List[Dict[str, Any]]  # id, name
+    classes_json: bytes
+    schools_json: bytes
+    classes_etag: str
+    schools_etag: str
+
+    def class_summaries(self, class_ids: Optional[set] = None, exclude: bool = False) -> List[Dict[str, Any]]:
+        """
+        {id, class_name, school_name} entries as used by the dashboards, optionally
+        restricted to (or, with `exclude`, excluding) `class_ids`.
+        """
+        return [
+            {"id": c["id"], "class_name": c["class_name"], "school_name": c["school_name"]}
+            for c in self.classes
+            if class_ids is None or (c["id"] in class_ids) != exclude
+        ]
+
+
+def _etag(body: bytes) -> str:
+    # Content-based, so every worker serving the same catalog returns the same tag
+    return '"' + hashlib.sha1(body).hexdigest()[:20] + '"'
+
+
+class Catalog:
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self.version = 0
+        self._snapshot: Optional[CatalogSnapshot] = None
+        self._lock = threading.Lock()
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self.version += 1
+
+    def is_fresh(self) -> bool:
+        snapshot = self._snapshot
+        return (
+            snapshot is not None
+            and snapshot.version == self.version
+            and time.monotonic() - snapshot.built_at < self.ttl
+        )
+
+    def get(self, db: Session) -> CatalogSnapshot:
+        """
+        The current snapshot; `db` is only used when it has to be rebuilt.
+        """
+        if self.is_fresh():
+            return self._snapshot
+        # The lock is not held while querying: under AsyncSession.run_sync the query
+        # yields to the event loop, and another request on the same thread would block it
+        version = self.version
+        snapshot = self._build(db, version)
+        with self._lock:
+            if self._snapshot is None or self._snapshot.version <= version:
+                self._snapshot = snapshot
+        return snapshot
+
+    @staticmethod
+    def _build(db: Session, version: int) -> CatalogSnapshot:
+        classes = [
+            {"id": class_id, "class_name": class_name, "school_id": school_id, "school_name": school_name}
+            for class_id, class_name, school_id, school_name in db.execute(
+                select(Class.id, Class.name, Class.school_id, School.name)
+                .join(School, School.id == Class.school_id)
+                .order_by(Class.id)
+            )
+        ]
+        schools = [
+            {"id": school_id, "name": name}
+            for school_id, name in db.execute(select(School.id, School.name).order_by(School.id))
+        ]
+        classes_json = orjson.dumps(classes)
+        schools_json = orjson.dumps(schools)
+        return CatalogSnapshot(
+            version=version,
+            built_at=time.monotonic(),
+            classes=classes,
+            schools=schools,
+            classes_json=classes_json,
+            schools_json=schools_json,
+            classes_etag=_etag(classes_json),
+            schools_etag=_etag(schools_json),
+        )
+
+
+catalog = Catalog(CATALOG_TTL)
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    # Weak comparison: W/"x" matches "x"
+    return "*" in candidates or etag in [tag[2:] if tag.startswith("W/") else tag for tag in candidates]
+
+
+def catalog_response(body: bytes, etag: str, if_none_match: Optional[str]) -> Response:
+    """
+    200 with the precomputed body, or 304 if the client already has this version.
+    """
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+# Writers mark the session; the version is bumped once the transaction commits
+def mark_catalog_changed(db: Session) -> None:
+    db.info[PENDING_CATALOG_CHANGE] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_catalog_change(session: Session) -> None:
+    if session.info.pop(PENDING_CATALOG_CHANGE, False):
+        catalog.invalidate()
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_catalog_change(session: Session) -> None:
+    session.info.pop(PENDING_CATALOG_CHANGE, None)
@@ -0,0 +1,235 @@
+# check_query_plans.py
+#
+# Query-plan regression check for the announcement feed, class listings and dashboards.
+# Runs each query shape, EXPLAINs every SELECT it issues and fails when a filtered
+# statement reads a table with a full scan instead of an index.
+#
+# Usage: python -m app.utils.check_query_plans [--seed] [--schools 20] ...
+#
+# With --seed a synthetic dataset is inserted first. Everything runs in one transaction
+# that is rolled back at the end, so the check is safe against any database.
+
+import argparse
+import json
+import random
+import re
+import sys
+from typing import Any, Callable, Dict, List, Tuple
+
+from sqlalchemy import event, select, text
+from sqlalchemy.orm import Session
+from app.database import Base, engine
+from app.models import (
+    ClassRepresentative,
+    ParentStudent,
+    User,
+    teacher_class,
+)
+from app.utils.announcement_utils import encode_cursor, fetch_announcements
+from app.utils.datagen import generate_dataset
+from app.utils.principal_cache import Principal
+
+# Tables that must never be read with a full scan by a filtered statement
+CHECKED_TABLES = set(Base.metadata.tables)
+
+SQLITE_SCAN = re.compile(r"^SCAN (?:TABLE )?(\w+)(?: AS (\w+))?(.*)$")
+
+
+def seed_dataset(
+    db: Session,
+    schools: int,
+    classes_per_school: int,
+    students_per_class: int,
+    announcements_per_class: int,
+    seed: int = 42
+) -> None:
+    """
+    Insert a school-shaped dataset (see `app.utils.datagen.generate_dataset`) under a
+    random prefix, so it never collides with existing rows.
+    """
+    prefix = f"plancheck{random.Random(seed).randrange(10**6)}"
+    counts = generate_dataset(
+        db,
+        schools=schools,
+        classes_per_school=classes_per_school,
+        students_per_class=students_per_class,
+        announcements_per_class=announcements_per_class,
+        seed=seed,
+        prefix=prefix,
+        password=None,
+    )
+    print(
+        f"Seeded {counts['schools']} schools, {counts['classes']} classes, {counts['students']} students, "
+        f"{counts['parents']} parents and {counts['announcements']} announcements."
+    )
+
+
+def pick_sample_users(db: Session) -> Dict[str, Principal]:
+    """
+    Pick one user per role that has data attached (classes, children, represented classes).
+    """
+    samples = {}
+    queries = {
+        "teacher": select(User.id, User.role, User.username).join(teacher_class, teacher_class.c.teacher_id == User.id),
+        "parent": select(User.id, User.role, User.username).join(ParentStudent, ParentStudent.parent_id == User.id),
+        "class_representative": select(User.id, User.role, User.username).join(
+            ClassRepresentative, ClassRepresentative.parent_id == User.id
+        ),
+    }
+    for role, query in queries.items():
+        row = db.execute(query.where(User.role == role).order_by(User.id.desc()).limit(1)).first()
+        if row is not None:
+            samples[role] = Principal(id=row.id, role=row.role, username=row.username)
+    return samples
+
+
+def query_shapes(db: Session, samples: Dict[str, Principal]) -> List[Tuple[str, Callable[[], Any]]]:
+    # Imported here: the routers pull in the whole app
+    from app.routers.classes import get_all_classes
+    from app.routers.dashboards import build_teacher_dashboard, load_parent_students
+
+    shapes = []
+    teacher = samples.get("teacher")
+    parent = samples.get("parent")
+    rep = samples.get("class_representative")
+
+    if teacher is not None:
+        class_ids = [row[0] for row in db.execute(
+            select(teacher_class.c.class_id).where(teacher_class.c.teacher_id == teacher.id)
+        )]
+        newest = fetch_announcements(db, class_ids=class_ids, limit=1)
+        shapes += [
+            ("fetch_announcements(class_ids, recipient_id)",
+             lambda: fetch_announcements(db, class_ids=class_ids, recipient_id=teacher.id, limit=50)),
+            ("fetch_announcements(creator_id)",
+             lambda: fetch_announcements(db, creator_id=teacher.id, limit=50)),
+            ("get_all_classes[teacher]", lambda: get_all_classes(db=db, user=teacher)),
+            ("build_teacher_dashboard", lambda: build_teacher_dashboard(db, teacher, limit=50)),
+        ]
+        if newest:
+            cursor = encode_cursor(newest[0][0].created_at, newest[0][0].id)
+            shapes.append((
+                "fetch_announcements(class_ids, cursor)",
+                lambda: fetch_announcements(db, class_ids=class_ids, cursor=cursor, limit=50)
+            ))
+    if parent is not None:
+        shapes += [
+            ("fetch_announcements(inbox_user_id)",
+             lambda: fetch_announcements(db, inbox_user_id=parent.id, limit=50)),
+            ("fetch_announcements(recipient_id)",
+             lambda: fetch_announcements(db, recipient_id=parent.id, limit=50)),
+            ("get_all_classes[parent]", lambda: get_all_classes(db=db, user=parent)),
+            ("load_parent_students", lambda: load_parent_students(db, parent.id)),
+        ]
+    if rep is not None:
+        shapes.append(("get_all_classes[class_representative]", lambda: get_all_classes(db=db, user=rep)))
+    return shapes
+
+
+def capture_selects(db: Session, fn: Callable[[], Any]) -> List[Tuple[str, Any]]:
+    """
+    Run `fn` and return the SELECT statements it sent, with their driver parameters.
+    """
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if not executemany and statement.lstrip().upper().startswith("SELECT"):
+            statements.append((statement, parameters))
+
+    connection = db.connection()
+    event.listen(connection, "before_cursor_execute", record)
+    try:
+        fn()
+    finally:
+        event.remove(connection, "before_cursor_execute", record)
+    return statements
+
+
+def full_scans(db: Session, statement: str, parameters: Any) -> List[str]:
+    """
+    Return the checked tables that the plan of `statement` reads with a full scan.
+    """
+    connection = db.connection()
+    dialect = connection.dialect.name
+    scans = []
+
+    if dialect == "postgresql":
+        plan = connection.exec_driver_sql("EXPLAIN (FORMAT JSON) " + statement, parameters).scalar()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        nodes = [plan[0]["Plan"]]
+        while nodes:
+            node = nodes.pop()
+            if node.get("Node Type") == "Seq Scan" and node.get("Relation Name") in CHECKED_TABLES:
+                scans.append(node["Relation Name"])
+            nodes.extend(node.get("Plans", []))
+    elif dialect == "sqlite":
+        for row in connection.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters):
+            match = SQLITE_SCAN.match(row[-1])
+            if match is None or "USING" in match.group(3):
+                continue
+            # Aliased tables show up as e.g. users_1
+            name = re.sub(r"_\d+$", "", match.group(1))
+            if name in CHECKED_TABLES:
+                scans.append(name)
+    else:
+        raise NotImplementedError(f"Query plan checks are not supported for dialect '{dialect}'")
+    return scans
+
+
+def check_query_plans(seed_data: bool, **scale) -> bool:
+    with Session(bind=engine) as db:
+        try:
+            if seed_data:
+                seed_dataset(db, **scale)
+            dialect = db.get_bind().dialect.name
+            if dialect == "postgresql":
+                # Plan as if the tables were large: a seq scan then means no usable index
+                db.execute(text("SET LOCAL enable_seqscan = off"))
+            db.execute(text("ANALYZE"))
+
+            samples = pick_sample_users(db)
+            missing = {"teacher", "parent", "class_representative"} - set(samples)
+            if missing:
+                print(f"No sample users for roles: {', '.join(sorted(missing))}. Run with --seed.")
+
+            ok = True
+            for name, fn in query_shapes(db, samples):
+                problems = []
+                for statement, parameters in capture_selects(db, fn):
+                    if " WHERE " not in statement.upper():
+                        # Unfiltered listings read the whole table by design
+                        continue
+                    scans = full_scans(db, statement, parameters)
+                    if scans:
+                        problems.append((scans, statement))
+                if problems:
+                    ok = False
+                    print(f"FAIL {name}")
+                    for scans, statement in problems:
+                        print(f"  full scan of {', '.join(sorted(set(scans)))} in:")
+                        print("    " + " ".join(statement.split()))
+                else:
+                    print(f"ok   {name}")
+            return ok
+        finally:
+            db.rollback()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check that the hot queries are served by indexes.")
+    parser.add_argument("--seed", action="store_true", help="Insert a synthetic dataset first (rolled back afterwards)")
+    parser.add_argument("--schools", type=int, default=20)
+    parser.add_argument("--classes-per-school", type=int, default=10)
+    parser.add_argument("--students-per-class", type=int, default=25)
+    parser.add_argument("--announcements-per-class", type=int, default=40)
+    args = parser.parse_args()
+
+    passed = check_query_plans(
+        args.seed,
+        schools=args.schools,
+        classes_per_school=args.classes_per_school,
+        students_per_class=args.students_per_class,
+        announcements_per_class=args.announcements_per_class,
+    )
+    sys.exit(0 if passed else 1)
@@ -0,0 +1,264 @@
+# datagen.py
+#
+# Deterministic synthetic district for benchmarks and plan checks:
+# schools -> classes -> students -> parents -> teachers -> announcements -> recipients,
+# plus class representatives, profiles and the parents' inbox rows.
+# Rows are written with multi-row INSERTs (SQLite and Postgres). The same seed and
+# cardinalities always produce the same data.
+#
+# Usage: python -m app.utils.datagen --schools 40 --classes-per-school 20 --seed 42
+# Every generated user can log in with BENCHMARK_PASSWORD.
+
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+from passlib.hash import bcrypt
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+from app.models import (
+    Announcement,
+    Class,
+    ClassRepresentative,
+    ParentStudent,
+    School,
+    Student,
+    User,
+    UserProfile,
+    announcement_recipients,
+    teacher_class,
+)
+from app.utils.inbox_utils import fan_out_announcements
+from app.utils.passwords import BCRYPT_ROUNDS
+
+BENCHMARK_PASSWORD = "benchmark-password"
+
+# Rows per INSERT batch
+CHUNK_SIZE = 5000
+# Announcement dates are spread over the `days` before this fixed point, not "now",
+# so the same seed gives byte-identical data on every run
+DATASET_END = datetime(2025, 1, 1)
+
+LANGUAGES = ["en", "de", "fr"]
+CONTACT_METHODS = ["email", "email", "sms", "app"]
+FIRST_NAMES = ["Anna", "Ben", "Clara", "David", "Elena", "Felix", "Greta", "Hugo", "Ida", "Jonas", "Lea", "Noah"]
+LAST_NAMES = ["Meier", "Muller", "Schmid", "Keller", "Weber", "Huber", "Favre", "Rochat", "Moser", "Frei"]
+
+
+def insert_rows(db: Session, model, rows: List[Dict[str, Any]], returning: bool = False) -> List[int]:
+    """
+    Insert `rows` in CHUNK_SIZE batches; with `returning`, return the new ids in row order.
+    """
+    ids = []
+    for start in range(0, len(rows), CHUNK_SIZE):
+        chunk = rows[start:start + CHUNK_SIZE]
+        if returning:
+            stmt = insert(model).returning(model.id, sort_by_parameter_order=True)
+            ids.extend(db.execute(stmt, chunk).scalars().all())
+        else:
+            db.execute(insert(model), chunk)
+    return ids
+
+
+def generate_dataset(
+    db: Session,
+    schools: int = 10,
+    classes_per_school: int = 12,
+    students_per_class: int = 22,
+    second_parent_ratio: float = 0.3,
+    classes_per_teacher: int = 2,
+    announcements_per_class: int = 40,
+    recipient_ratio: float = 0.2,
+    recipients_per_announcement: int = 3,
+    days: int = 365,
+    seed: int = 42,
+    prefix: str = "gen",
+    password: Optional[str] = BENCHMARK_PASSWORD
+) -> Dict[str, int]:
+    """
+    Insert a district-shaped dataset and return the row counts. Does not commit.
+
+    - every student has one parent, `second_parent_ratio` of them a second one;
+    - each teacher teaches `classes_per_teacher` consecutive classes, each class has a
+      class representative;
+    - `recipient_ratio` of the announcements target `recipients_per_announcement` explicit
+      parents of their class, the rest go to the whole class.
+
+    `prefix` keeps usernames, emails and school names apart from existing data. With
+    `password=None` the users get an unusable password (no bcrypt cost).
+    """
+    rng = random.Random(seed)
+    password_hash = bcrypt.using(rounds=BCRYPT_ROUNDS).hash(password) if password else "!"
+
+    def name():
+        return rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+
+    school_ids = insert_rows(db, School, [
+        {"name": f"{prefix} school {i}", "address": f"{i} School Street"} for i in range(schools)
+    ], returning=True)
+    class_ids = insert_rows(db, Class, [
+        {"name": f"Class {k // 8 + 1}{'ABCDEFGH'[k % 8]}", "school_id": school_id}
+        for school_id in school_ids
+        for k in range(classes_per_school)
+    ], returning=True)
+    class_position = {class_id: i for i, class_id in enumerate(class_ids)}
+    class_school = {class_id: school_ids[i // classes_per_school] for i, class_id in enumerate(class_ids)}
+
+    def users(role, count):
+        return insert_rows(db, User, [
+            {
+                "username": f"{prefix}_{role}_{i}",
+                "email": f"{prefix}_{role}_{i}@example.com",
+                "password": password_hash,
+                "role": role,
+                "language": rng.choice(LANGUAGES),
+            }
+            for i in range(count)
+        ], returning=True)
+
+    teacher_ids = users("teacher", max(1, -(-len(class_ids) // classes_per_teacher)))
+    parent_ids = users("parent", len(class_ids) * students_per_class)
+    rep_ids = users("class_representative", len(class_ids))
+
+    profiles = []
+    for user_id in teacher_ids + parent_ids + rep_ids:
+        first_name, last_name = name()
+        profiles.append({
+            "user_id": user_id,
+            "first_name": first_name,
+            "last_name": last_name,
+            "preferred_contact_method": rng.choice(CONTACT_METHODS),
+        })
+    insert_rows(db, UserProfile, profiles)
+
+    insert_rows(db, teacher_class, [
+        {"teacher_id": teacher_ids[i // classes_per_teacher], "class_id": class_id}
+        for i, class_id in enumerate(class_ids)
+    ])
+    insert_rows(db, ClassRepresentative, [
+        {"parent_id": rep_id, "class_id": class_id} for rep_id, class_id in zip(rep_ids, class_ids)
+    ])
+
+    student_rows = []
+    for class_id in class_ids:
+        for i in range(students_per_class):
+            first_name, last_name = name()
+            student_rows.append({
+                "external_id": f"{prefix}-S{len(student_rows) + 1:07d}",
+                "school_id": class_school[class_id],
+                "first_name": first_name,
+                "last_name": last_name,
+                "class_id": class_id,
+            })
+    student_ids = insert_rows(db, Student, student_rows, returning=True)
+
+    # Parent i is the first parent of student i; second parents come from the same school
+    class_parents: Dict[int, List[int]] = {}
+    links = {}
+    for i, student_id in enumerate(student_ids):
+        class_id = student_rows[i]["class_id"]
+        links[(parent_ids[i], student_id)] = "mother"
+        class_parents.setdefault(class_id, []).append(parent_ids[i])
+        if rng.random() < second_parent_ratio:
+            school_start = (class_position[class_id] // classes_per_school) * classes_per_school * students_per_class
+            other = parent_ids[rng.randrange(school_start, school_start + classes_per_school * students_per_class)]
+            if (other, student_id) not in links:
+                links[(other, student_id)] = "father"
+                class_parents[class_id].append(other)
+    insert_rows(db, ParentStudent, [
+        {"parent_id": parent_id, "student_id": student_id, "relationship_type": relationship}
+        for (parent_id, student_id), relationship in links.items()
+    ])
+
+    start = DATASET_END - timedelta(days=days)
+    announcement_rows = []
+    for i, class_id in enumerate(class_ids):
+        for j in range(announcements_per_class):
+            language = rng.choice(LANGUAGES)
+            # Half of the non-English announcements also carry an English translation
+            translated = language == "en" or rng.random() < 0.5
+            announcement_rows.append({
+                "title": f"Announcement {j} for class {class_id}",
+                "content_en": f"Reminder {j}: please check the class calendar." if translated else None,
+                "content_de": f"Erinnerung {j}: bitte den Klassenkalender beachten." if language == "de" else None,
+                "content_fr": f"Rappel {j}: merci de consulter le calendrier." if language == "fr" else None,
+                "original_language": language,
+                "target_audience": "parents",
+                "class_id": class_id,
+                "creator_id": teacher_ids[i // classes_per_teacher],
+                "created_at": start + timedelta(minutes=rng.randrange(days * 24 * 60)),
+            })
+    announcement_ids = insert_rows(db, Announcement, announcement_rows, returning=True)
+
+    recipient_rows = []
+    for announcement_id, row in zip(announcement_ids, announcement_rows):
+        if rng.random() < recipient_ratio:
+            candidates = sorted(set(class_parents.get(row["class_id"], [])))
+            for parent_id in rng.sample(candidates, min(recipients_per_announcement, len(candidates))):
+                recipient_rows.append({"announcement_id": announcement_id, "user_id": parent_id})
+    insert_rows(db, announcement_recipients, recipient_rows)
+
+    inbox_rows = 0
+    for start_index in range(0, len(announcement_ids), CHUNK_SIZE):
+        inbox_rows += fan_out_announcements(db, announcement_ids[start_index:start_index + CHUNK_SIZE])
+    db.flush()
+
+    return {
+        "schools": len(school_ids),
+        "classes": len(class_ids),
+        "students": len(student_ids),
+        "parents": len(parent_ids),
+        "parent_links": len(links),
+        "teachers": len(teacher_ids),
+        "class_representatives": len(rep_ids),
+        "announcements": len(announcement_ids),
+        "recipients": len(recipient_rows),
+        "inbox_rows": inbox_rows,
+    }
+
+
+def add_scale_arguments(parser: argparse.ArgumentParser) -> None:
+    """
+    Dataset cardinality options shared by the CLIs that generate data.
+    """
+    parser.add_argument("--schools", type=int, default=10)
+    parser.add_argument("--classes-per-school", type=int, default=12)
+    parser.add_argument("--students-per-class", type=int, default=22)
+    parser.add_argument("--second-parent-ratio", type=float, default=0.3)
+    parser.add_argument("--classes-per-teacher", type=int, default=2)
+    parser.add_argument("--announcements-per-class", type=int, default=40)
+    parser.add_argument("--recipient-ratio", type=float, default=0.2)
+    parser.add_argument("--seed", type=int, default=42)
+
+
+def scale_options(args: argparse.Namespace) -> Dict[str, Any]:
+    return {
+        "schools": args.schools,
+        "classes_per_school": args.classes_per_school,
+        "students_per_class": args.students_per_class,
+        "second_parent_ratio": args.second_parent_ratio,
+        "classes_per_teacher": args.classes_per_teacher,
+        "announcements_per_class": args.announcements_per_class,
+        "recipient_ratio": args.recipient_ratio,
+        "seed": args.seed,
+    }
+
+
+if __name__ == "__main__":
+    from app.database import Base, engine
+
+    parser = argparse.ArgumentParser(description="Load a synthetic district into the configured database.")
+    add_scale_arguments(parser)
+    parser.add_argument("--prefix", default="gen", help="Prefix for usernames, emails and school names")
+    parser.add_argument("--create-tables", action="store_true", help="Create missing tables first")
+    args = parser.parse_args()
+
+    if args.create_tables:
+        Base.metadata.create_all(bind=engine)
+    started = time.monotonic()
+    with Session(bind=engine) as session:
+        counts = generate_dataset(session, prefix=args.prefix, **scale_options(args))
+        session.commit()
+    print(", ".join(f"{count} {name}" for name, count in counts.items()))
+    print(f"Generated in {time.monotonic() - started:.1f}s. Users log in with password '{BENCHMARK_PASSWORD}'.")
@@ -0,0 +1,41 @@
+# app/utils/db_utils.py
+
+from sqlalchemy import Table, insert
+from sqlalchemy.orm import Session
+
+
+def insert_ignore(db: Session, table: Table):
+    """
+    Build an INSERT for `table` that skips rows conflicting with an existing key.
+
+    Uses the dialect's ON CONFLICT DO NOTHING support (PostgreSQL, SQLite).
+    """
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    else:
+        raise NotImplementedError(f"insert_ignore is not supported for dialect '{dialect}'")
+    return dialect_insert(table).on_conflict_do_nothing()
+
+
+def upsert(db: Session, table: Table, index_elements, update_columns):
+    """
+    Build an INSERT for `table` that updates `update_columns` of the existing row when
+    the key in `index_elements` already exists.
+
+    Uses the dialect's ON CONFLICT DO UPDATE support (PostgreSQL, SQLite).
+    """
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    else:
+        raise NotImplementedError(f"upsert is not supported for dialect '{dialect}'")
+    stmt = dialect_insert(table)
+    return stmt.on_conflict_do_update(
+        index_elements=index_elements,
+        set_={column: stmt.excluded[column] for column in update_columns},
+    )
@@ -0,0 +1,272 @@
+# digest.py
+#
+# Daily digest emails: one message per user listing every announcement delivered to
+# their inbox since their previous digest, instead of one email per announcement.
+#
+# This is the only email about announcements. It goes to the users who chose email as
+# their UserProfile.preferred_contact_method, to those without a profile or a choice
+# (email is the default), and to those who chose SMS but have no phone number
+# (`wants_digest`); app.utils.notifications texts the other SMS users and sends nothing
+# to those who chose "app", who read their inbox in the app.
+#
+# Users are processed in batches of DIGEST_BATCH_SIZE ids. For each batch one query
+# reads the new inbox rows of all its users, using their (created_at, announcement_id)
+# watermark from digest_watermarks and the user_inbox index. The digests are rendered in
+# the user's language and queued in the email outbox with one INSERT, and the watermarks
+# move forward in the same transaction. That makes re-runs idempotent: a committed batch
+# is never sent again, and a failed batch sends nothing.
+#
+# - Only inbox rows older than DIGEST_SETTLE_SECONDS are read, so an announcement that
+#   is still being committed can't slip behind a watermark.
+# - A user's first digest covers the last DIGEST_FIRST_LOOKBACK_HOURS, not the whole inbox.
+# - Users who got a digest in the last DIGEST_MIN_INTERVAL_HOURS are skipped, so running
+#   the job twice a day still sends one email.
+#
+# Usage: python -m app.utils.digest [--batch-size 1000] [--dry-run]
+# Run it once a day from cron; the outbox worker sends the messages.
+
+import argparse
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, func, or_, select, tuple_
+from sqlalchemy.orm import Session
+from app.models import Announcement, Class, DigestWatermark, School, User, UserInbox, UserProfile
+from app.utils.db_utils import upsert
+from app.utils.email_outbox import enqueue_emails
+
+logger = logging.getLogger(__name__)
+
+DIGEST_BATCH_SIZE = int(os.getenv("DIGEST_BATCH_SIZE", "1000"))
+DIGEST_SETTLE_SECONDS = int(os.getenv("DIGEST_SETTLE_SECONDS", "60"))
+DIGEST_FIRST_LOOKBACK_HOURS = int(os.getenv("DIGEST_FIRST_LOOKBACK_HOURS", "24"))
+DIGEST_MIN_INTERVAL_HOURS = float(os.getenv("DIGEST_MIN_INTERVAL_HOURS", "20"))
+# Announcements listed per digest; the rest are counted ("and 3 more in Klasstra")
+DIGEST_MAX_ITEMS = int(os.getenv("DIGEST_MAX_ITEMS", "50"))
+
+LANGUAGES = ("en", "de", "fr")
+
+TEXTS = {
+    "en": {
+        "subject": "Your Klasstra digest: {count} new announcement(s)",
+        "greeting": "Hello {name},",
+        "intro": "Here is what was posted for your classes since your last digest:",
+        "more": "... and {count} more in Klasstra.",
+        "translation": "(not available in English, shown in the original language)",
+    },
+    "de": {
+        "subject": "Ihre Klasstra-Übersicht: {count} neue Mitteilung(en)",
+        "greeting": "Hallo {name},",
+        "intro": "Das wurde seit Ihrer letzten Übersicht für Ihre Klassen veröffentlicht:",
+        "more": "... und {count} weitere in Klasstra.",
+        "translation": "(nicht auf Deutsch verfügbar, in der Originalsprache angezeigt)",
+    },
+    "fr": {
+        "subject": "Votre résumé Klasstra : {count} nouvelle(s) annonce(s)",
+        "greeting": "Bonjour {name},",
+        "intro": "Voici ce qui a été publié pour vos classes depuis votre dernier résumé :",
+        "more": "... et {count} autre(s) dans Klasstra.",
+        "translation": "(non disponible en français, affiché dans la langue d'origine)",
+    },
+}
+
+
+def localized_content(row: Any, language: str) -> Tuple[str, bool]:
+    """
+    The announcement text in `language`, else in its original language, else in any
+    language it has. Returns (text, is_translation_missing).
+    """
+    text = getattr(row, f"content_{language}", None)
+    if text:
+        return text, False
+    original = row.original_language if row.original_language in LANGUAGES else None
+    candidates = ([original] if original else []) + [lang for lang in LANGUAGES if lang != original]
+    for candidate in candidates:
+        text = getattr(row, f"content_{candidate}", None)
+        if text:
+            return text, True
+    return "", False
+
+
+def render_digest(user: Any, items: List[Any]) -> Dict[str, str]:
+    """
+    Subject and plain-text body of one user's digest, oldest announcement first.
+    """
+    language = user.language if user.language in TEXTS else "en"
+    texts = TEXTS[language]
+    name = user.first_name or user.username
+
+    lines = [texts["greeting"].format(name=name), "", texts["intro"], ""]
+    for item in items[:DIGEST_MAX_ITEMS]:
+        content, fallback = localized_content(item, language)
+        lines.append(f"* {item.title} ({item.class_name}, {item.school_name}, {item.created_at:%Y-%m-%d})")
+        if fallback:
+            lines.append(f"  {texts['translation']}")
+        for line in content.splitlines():
+            lines.append(f"  {line}")
+        lines.append("")
+    if len(items) > DIGEST_MAX_ITEMS:
+        lines.append(texts["more"].format(count=len(items) - DIGEST_MAX_ITEMS))
+
+    return {
+        "to_email": user.email,
+        "subject": texts["subject"].format(count=len(items)),
+        "body": "\n".join(lines).rstrip() + "\n",
+    }
+
+
+def has_phone_number():
+    return func.coalesce(UserProfile.phone_number, "") != ""
+
+
+def wants_digest():
+    """
+    SQL condition on user_profiles (outer-joined): the user gets announcements by
+    email, in the digest.
+    """
+    return or_(
+        # No profile or no choice yet: email is the default
+        UserProfile.preferred_contact_method.is_(None),
+        UserProfile.preferred_contact_method == "email",
+        # SMS without a phone number falls back to email
+        and_(UserProfile.preferred_contact_method == "sms", ~has_phone_number()),
+    )
+
+
+def fetch_digest_users(db: Session, after_id: int, batch_size: int) -> List[Any]:
+    return db.execute(
+        select(
+            User.id,
+            User.username,
+            User.email,
+            User.language,
+            UserProfile.first_name,
+            DigestWatermark.last_created_at,
+            DigestWatermark.last_announcement_id,
+            DigestWatermark.sent_at,
+        )
+        .outerjoin(UserProfile, UserProfile.user_id == User.id)
+        .outerjoin(DigestWatermark, DigestWatermark.user_id == User.id)
+        .where(wants_digest(), User.id > after_id)
+        .order_by(User.id)
+        .limit(batch_size)
+    ).all()
+
+
+def fetch_new_items(db: Session, user_ids: List[int], cutoff: datetime, first_since: datetime) -> List[Any]:
+    """
+    New inbox rows of all `user_ids` in one query, ordered by user and inbox position.
+    """
+    position = tuple_(UserInbox.created_at, UserInbox.announcement_id)
+    return db.execute(
+        select(
+            UserInbox.user_id,
+            UserInbox.created_at,
+            UserInbox.announcement_id,
+            Announcement.title,
+            Announcement.content_en,
+            Announcement.content_de,
+            Announcement.content_fr,
+            Announcement.original_language,
+            Class.name.label("class_name"),
+            School.name.label("school_name"),
+        )
+        .join(Announcement, Announcement.id == UserInbox.announcement_id)
+        .join(Class, Class.id == Announcement.class_id)
+        .join(School, School.id == Class.school_id)
+        .outerjoin(DigestWatermark, DigestWatermark.user_id == UserInbox.user_id)
+        .where(
+            UserInbox.user_id.in_(user_ids),
+            UserInbox.created_at <= cutoff,
+            or_(
+                and_(DigestWatermark.user_id.is_(None), UserInbox.created_at > first_since),
+                position > tuple_(DigestWatermark.last_created_at, DigestWatermark.last_announcement_id),
+            ),
+        )
+        .order_by(UserInbox.user_id, UserInbox.created_at, UserInbox.announcement_id)
+    ).all()
+
+
+def run_digest_batch(db: Session, users: List[Any], now: datetime, dry_run: bool = False) -> Dict[str, int]:
+    """
+    Queue the digests of one batch of users and advance their watermarks. Does not commit.
+    """
+    cutoff = now - timedelta(seconds=DIGEST_SETTLE_SECONDS)
+    recent = now - timedelta(hours=DIGEST_MIN_INTERVAL_HOURS)
+    due = [user for user in users if user.sent_at is None or user.sent_at <= recent]
+    if not due:
+        return {"users": len(users), "digests": 0, "announcements": 0}
+
+    items_by_user: Dict[int, List[Any]] = {}
+    for item in fetch_new_items(db, [user.id for user in due], cutoff, cutoff - timedelta(hours=DIGEST_FIRST_LOOKBACK_HOURS)):
+        items_by_user.setdefault(item.user_id, []).append(item)
+
+    messages = []
+    watermarks = []
+    for user in due:
+        items = items_by_user.get(user.id)
+        if not items:
+            continue
+        messages.append(render_digest(user, items))
+        watermarks.append({
+            "user_id": user.id,
+            "last_created_at": items[-1].created_at,
+            "last_announcement_id": items[-1].announcement_id,
+            "sent_at": now,
+        })
+
+    if messages and not dry_run:
+        enqueue_emails(db, messages, kind="digest")
+        db.execute(
+            upsert(db, DigestWatermark.__table__, ["user_id"], ["last_created_at", "last_announcement_id", "sent_at"]),
+            watermarks,
+        )
+    return {
+        "users": len(users),
+        "digests": len(messages),
+        "announcements": sum(len(items) for items in items_by_user.values()),
+    }
+
+
+def run_digests(db: Session, batch_size: int = DIGEST_BATCH_SIZE, dry_run: bool = False,
+                now: Optional[datetime] = None) -> Dict[str, int]:
+    """
+    Queue the digests of every user who wants them, committing after each batch of users.
+    """
+    now = now or datetime.utcnow()
+    totals = {"users": 0, "digests": 0, "announcements": 0}
+    after_id = 0
+    while True:
+        users = fetch_digest_users(db, after_id, batch_size)
+        if not users:
+            break
+        counts = run_digest_batch(db, users, now, dry_run=dry_run)
+        if dry_run:
+            db.rollback()
+        else:
+            db.commit()
+        for key in totals:
+            totals[key] += counts[key]
+        after_id = users[-1].id
+        logger.info("Digests queued up to user %s: %s", after_id, totals)
+    return totals
+
+
+if __name__ == "__main__":
+    from app.database import engine
+    from app.utils.logging_setup import configure_logging
+
+    parser = argparse.ArgumentParser(description="Queue the daily announcement digest emails.")
+    parser.add_argument("--batch-size", type=int, default=DIGEST_BATCH_SIZE, help="Users per query and transaction")
+    parser.add_argument("--dry-run", action="store_true", help="Render the digests without queueing them")
+    args = parser.parse_args()
+
+    configure_logging()
+    started = time.monotonic()
+    with Session(bind=engine) as session:
+        totals = run_digests(session, args.batch_size, args.dry_run)
+    print(f"{totals['digests']} digests ({totals['announcements']} announcements) for {totals['users']} users "
+          f"in {time.monotonic() - started:.1f}s{' (dry run)' if args.dry_run else ''}.")
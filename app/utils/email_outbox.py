@@ -0,0 +1,292 @@
+# email_outbox.py
+#
+# Transactional outbox for outgoing email. Endpoints call `enqueue_email` inside their
+# own transaction, so the message exists if and only if the triggering change was
+# committed, and the request never waits on SMTP. The worker below drains the outbox:
+#
+# - due pending messages are claimed in id order, in batches (FOR UPDATE SKIP LOCKED on
+#   Postgres, so several workers can run side by side);
+# - all messages go over one SMTP connection, kept open between batches, checked with
+#   NOOP after SMTP_IDLE_SECONDS and renewed every SMTP_MESSAGES_PER_CONNECTION messages;
+# - a failed message is retried with exponential backoff; permanent (5xx) failures and
+#   messages that failed EMAIL_MAX_ATTEMPTS times are marked "dead" and kept for review;
+# - if the server can't be reached at all, the rest of the batch is left untouched.
+#
+# Delivery is at-least-once: a worker that dies after sending but before committing the
+# batch sends those messages again.
+#
+# Usage: python -m app.utils.email_outbox [--once] [--batch-size 100] [--interval 5]
+
+import argparse
+import logging
+import os
+import random
+import signal
+import smtplib
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy import func, insert, select
+from sqlalchemy.orm import Session
+from app.models import EmailOutbox
+from app.utils import utils
+from app.utils.utils import build_message, open_smtp_connection
+
+logger = logging.getLogger(__name__)
+
+EMAIL_BATCH_SIZE = int(os.getenv("EMAIL_BATCH_SIZE", "100"))
+EMAIL_POLL_INTERVAL = float(os.getenv("EMAIL_POLL_INTERVAL", "5"))
+EMAIL_MAX_ATTEMPTS = int(os.getenv("EMAIL_MAX_ATTEMPTS", "8"))
+# Retry n waits EMAIL_RETRY_BASE_SECONDS * 2**(n-1), capped, with +-20% jitter
+EMAIL_RETRY_BASE_SECONDS = float(os.getenv("EMAIL_RETRY_BASE_SECONDS", "30"))
+EMAIL_RETRY_MAX_SECONDS = float(os.getenv("EMAIL_RETRY_MAX_SECONDS", "3600"))
+# An idle connection is checked with NOOP before reuse; servers drop idle clients
+SMTP_IDLE_SECONDS = float(os.getenv("SMTP_IDLE_SECONDS", "30"))
+# Many providers cap the messages per connection
+SMTP_MESSAGES_PER_CONNECTION = int(os.getenv("SMTP_MESSAGES_PER_CONNECTION", "100"))
+
+PENDING = "pending"
+SENT = "sent"
+DEAD = "dead"
+
+
+def enqueue_email(db: Session, to_email: str, subject: str, body: str, kind: Optional[str] = None) -> EmailOutbox:
+    """
+    Add a message to the outbox. Does not commit: it is sent once the caller's
+    transaction commits, and never if it rolls back.
+    """
+    message = EmailOutbox(
+        to_email=to_email,
+        subject=subject,
+        body=body,
+        kind=kind,
+        status=PENDING,
+        attempts=0,
+        next_attempt_at=datetime.utcnow(),
+    )
+    db.add(message)
+    return message
+
+
+def enqueue_emails(db: Session, messages: List[Dict[str, str]], kind: Optional[str] = None) -> int:
+    """
+    Bulk version of `enqueue_email` for dicts with to_email, subject and body: one
+    multi-row INSERT instead of an ORM object per message. Does not commit.
+    """
+    if not messages:
+        return 0
+    now = datetime.utcnow()
+    db.execute(insert(EmailOutbox), [
+        {**message, "kind": kind, "status": PENDING, "attempts": 0, "next_attempt_at": now}
+        for message in messages
+    ])
+    return len(messages)
+
+
+class SMTPMailer:
+    """
+    One SMTP connection, opened on first use and reused for every message after it.
+    """
+
+    def __init__(self, connect=open_smtp_connection):
+        self._connect = connect
+        self._server: Optional[smtplib.SMTP] = None
+        self._last_used = 0.0
+        self._sent_on_connection = 0
+        self.connections_opened = 0
+
+    def connection(self) -> smtplib.SMTP:
+        if self._server is not None:
+            if self._sent_on_connection >= SMTP_MESSAGES_PER_CONNECTION:
+                self.close()
+            elif time.monotonic() - self._last_used > SMTP_IDLE_SECONDS:
+                try:
+                    if self._server.noop()[0] != 250:
+                        self.close()
+                except OSError:
+                    self.reset()
+        if self._server is None:
+            self._server = self._connect()
+            self._sent_on_connection = 0
+            self.connections_opened += 1
+        self._last_used = time.monotonic()
+        return self._server
+
+    def send(self, message: EmailOutbox) -> None:
+        server = self.connection()
+        msg = build_message(message.to_email, message.subject, message.body)
+        try:
+            server.sendmail(msg["From"], [message.to_email], msg.as_string())
+        except smtplib.SMTPServerDisconnected:
+            # The connection is unusable; the next message opens a new one
+            self.reset()
+            raise
+        except smtplib.SMTPException:
+            # Refusals leave the transaction half-open; RSET makes the connection reusable
+            try:
+                server.rset()
+            except OSError:
+                self.reset()
+            raise
+        except OSError:
+            # Socket errors (SMTPException is an OSError too, so this comes last)
+            self.reset()
+            raise
+        finally:
+            self._sent_on_connection += 1
+            self._last_used = time.monotonic()
+
+    def reset(self) -> None:
+        # Drop a broken connection without talking to the server
+        if self._server is not None:
+            try:
+                self._server.close()
+            finally:
+                self._server = None
+
+    def close(self) -> None:
+        if self._server is not None:
+            try:
+                self._server.quit()
+            except OSError:
+                pass
+            self.reset()
+
+
+def is_permanent_failure(exc: Exception) -> bool:
+    """
+    5xx replies will fail again on retry (unknown mailbox, rejected content).
+    """
+    if isinstance(exc, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, _ in exc.recipients.values())
+    if isinstance(exc, smtplib.SMTPResponseException):
+        return exc.smtp_code >= 500
+    return False
+
+
+def retry_delay(attempts: int) -> timedelta:
+    seconds = min(EMAIL_RETRY_MAX_SECONDS, EMAIL_RETRY_BASE_SECONDS * 2 ** (attempts - 1))
+    return timedelta(seconds=seconds * random.uniform(0.8, 1.2))
+
+
+def claim_batch(db: Session, batch_size: int, now: datetime) -> List[EmailOutbox]:
+    return db.execute(
+        select(EmailOutbox)
+        .where(EmailOutbox.status == PENDING, EmailOutbox.next_attempt_at <= now)
+        .order_by(EmailOutbox.id)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    ).scalars().all()
+
+
+def drain_batch(db: Session, mailer: SMTPMailer, batch_size: int = EMAIL_BATCH_SIZE) -> Dict[str, int]:
+    """
+    Send one batch of due messages and commit their new state. Returns the counts of
+    claimed, sent, retried, dead and deferred (left untouched) messages.
+    """
+    now = datetime.utcnow()
+    messages = claim_batch(db, batch_size, now)
+    counts = {"claimed": len(messages), "sent": 0, "retried": 0, "dead": 0, "deferred": 0}
+
+    for index, message in enumerate(messages):
+        try:
+            mailer.connection()
+        except Exception as e:
+            # Server unreachable: no point trying the others now
+            logger.warning("Could not connect to the SMTP server: %s", e)
+            counts["deferred"] = len(messages) - index
+            break
+
+        message.attempts += 1
+        try:
+            mailer.send(message)
+        except Exception as e:
+            message.last_error = f"{type(e).__name__}: {e}"[:2000]
+            if is_permanent_failure(e) or message.attempts >= EMAIL_MAX_ATTEMPTS:
+                message.status = DEAD
+                counts["dead"] += 1
+                logger.error("Email %s dead-lettered after %s attempts: %s", message.id, message.attempts, message.last_error)
+            else:
+                message.next_attempt_at = datetime.utcnow() + retry_delay(message.attempts)
+                counts["retried"] += 1
+                logger.warning("Email %s failed (attempt %s), retrying: %s", message.id, message.attempts, message.last_error)
+            continue
+
+        message.status = SENT
+        message.sent_at = datetime.utcnow()
+        message.last_error = None
+        counts["sent"] += 1
+
+    db.commit()
+    return counts
+
+
+def outbox_stats(db: Session) -> Dict[str, object]:
+    """
+    Message counts by status and the age of the oldest due pending message.
+    """
+    counts = dict(db.execute(select(EmailOutbox.status, func.count()).group_by(EmailOutbox.status)).all())
+    oldest = db.execute(
+        select(func.min(EmailOutbox.next_attempt_at)).where(
+            EmailOutbox.status == PENDING, EmailOutbox.next_attempt_at <= datetime.utcnow()
+        )
+    ).scalar()
+    return {
+        "pending": counts.get(PENDING, 0),
+        "sent": counts.get(SENT, 0),
+        "dead": counts.get(DEAD, 0),
+        "oldest_due_seconds": round((datetime.utcnow() - oldest).total_seconds(), 1) if oldest else None,
+    }
+
+
+def run_worker(batch_size: int = EMAIL_BATCH_SIZE, interval: float = EMAIL_POLL_INTERVAL, once: bool = False) -> None:
+    """
+    Drain the outbox until stopped with SIGINT/SIGTERM. A full batch is followed by
+    the next one immediately; otherwise the worker sleeps `interval` seconds.
+    Fails at startup if no sender address is configured.
+    """
+    from app.database import SessionLocal
+
+    if not utils.SMTP_SENDER:
+        # Every message would be sent without a From address
+        raise RuntimeError("No sender address configured: set SMTP_SENDER or SMTP_USERNAME")
+
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    mailer = SMTPMailer()
+    try:
+        while not stopping:
+            with SessionLocal() as db:
+                counts = drain_batch(db, mailer, batch_size)
+            if counts["claimed"]:
+                logger.info("Email outbox batch: %s", counts)
+            if once:
+                break
+            if counts["claimed"] < batch_size or counts["deferred"]:
+                # Sleep in short steps so a stop signal is handled promptly
+                deadline = time.monotonic() + interval
+                while not stopping and time.monotonic() < deadline:
+                    time.sleep(min(0.5, interval))
+    finally:
+        mailer.close()
+
+
+if __name__ == "__main__":
+    from app.utils.logging_setup import configure_logging
+
+    parser = argparse.ArgumentParser(description="Send the queued emails in the outbox.")
+    parser.add_argument("--batch-size", type=int, default=EMAIL_BATCH_SIZE)
+    parser.add_argument("--interval", type=float, default=EMAIL_POLL_INTERVAL, help="Seconds between polls when idle")
+    parser.add_argument("--once", action="store_true", help="Send one batch and exit")
+    args = parser.parse_args()
+
+    configure_logging()
+    run_worker(args.batch_size, args.interval, args.once)
@@ -0,0 +1,246 @@
+# endpoint_benchmark.py
+#
+# In-process benchmark of the hot endpoints against the configured database:
+# /token, /dashboard/parent, /dashboard/teacher, /announcements, /classes/all and
+# /announcements/create. For each endpoint it reports latency percentiles, SQL
+# statements per request and peak Python memory per request as JSON, so runs can be
+# compared across commits.
+#
+# Requests go through FastAPI's TestClient, so latencies include a small constant
+# client overhead but no network. /announcements/create writes real rows: point
+# DATABASE_URL at a throwaway database.
+#
+# Usage:
+#   python -m app.utils.endpoint_benchmark --generate --schools 5 --output before.json
+#   python -m app.utils.endpoint_benchmark --label after --output after.json
+
+import argparse
+import gc
+import json
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import event, func, select
+from sqlalchemy.orm import Session
+from app.database import Base, async_engine, engine
+from app.models import Announcement, ParentStudent, User, teacher_class
+from app.utils.announcement_cache import ANNOUNCEMENT_CACHE_BACKEND
+from app.utils.datagen import BENCHMARK_PASSWORD, add_scale_arguments, generate_dataset, scale_options
+
+
+class QueryCounter:
+    """
+    Counts statements sent by the sync and async engines.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.engines = [engine, async_engine.sync_engine]
+
+    def _count(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+
+    def __enter__(self):
+        for target in self.engines:
+            event.listen(target, "before_cursor_execute", self._count)
+        return self
+
+    def __exit__(self, *exc):
+        for target in self.engines:
+            event.remove(target, "before_cursor_execute", self._count)
+
+
+def summarize(timings: List[float]) -> Dict[str, float]:
+    timings = sorted(timings)
+
+    def percentile(fraction):
+        return timings[min(len(timings) - 1, int(round(fraction * (len(timings) - 1))))]
+
+    return {
+        "mean_ms": round(statistics.fmean(timings), 3),
+        "p50_ms": round(percentile(0.50), 3),
+        "p90_ms": round(percentile(0.90), 3),
+        "p95_ms": round(percentile(0.95), 3),
+        "p99_ms": round(percentile(0.99), 3),
+        "max_ms": round(timings[-1], 3),
+    }
+
+
+def pick_users(db: Session) -> Dict[str, Any]:
+    """
+    The lowest-id teacher with classes and parent with children, and the teacher's classes.
+    """
+    teacher = db.execute(
+        select(User.id, User.username)
+        .join(teacher_class, teacher_class.c.teacher_id == User.id)
+        .where(User.role == "teacher")
+        .order_by(User.id)
+        .limit(1)
+    ).first()
+    parent = db.execute(
+        select(User.id, User.username)
+        .join(ParentStudent, ParentStudent.parent_id == User.id)
+        .where(User.role == "parent")
+        .order_by(User.id)
+        .limit(1)
+    ).first()
+    if teacher is None or parent is None:
+        raise SystemExit("No teacher with classes or parent with children found. Run with --generate.")
+    class_ids = db.execute(
+        select(teacher_class.c.class_id).where(teacher_class.c.teacher_id == teacher.id).order_by(teacher_class.c.class_id)
+    ).scalars().all()
+    return {"teacher": teacher.username, "parent": parent.username, "class_ids": class_ids}
+
+
+def measure(
+    send: Callable[[], Any],
+    requests: int,
+    warmup: int,
+    memory_samples: int
+) -> Dict[str, Any]:
+    for _ in range(warmup):
+        send()
+
+    timings = []
+    queries = []
+    statuses: Dict[str, int] = {}
+    with QueryCounter() as counter:
+        for _ in range(requests):
+            counter.count = 0
+            start = time.perf_counter()
+            response = send()
+            timings.append((time.perf_counter() - start) * 1000)
+            queries.append(counter.count)
+            statuses[str(response.status_code)] = statuses.get(str(response.status_code), 0) + 1
+
+    # Memory is measured separately: tracemalloc slows every allocation down
+    peaks = []
+    tracemalloc.start()
+    try:
+        for _ in range(memory_samples):
+            gc.collect()
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+            send()
+            peaks.append(tracemalloc.get_traced_memory()[1] - baseline)
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "requests": requests,
+        "status_codes": statuses,
+        **summarize(timings),
+        "queries_per_request": round(statistics.fmean(queries), 2),
+        "max_queries": max(queries),
+        "peak_memory_kb": round(max(peaks) / 1024, 1) if peaks else None,
+    }
+
+
+def run_benchmark(
+    requests: int,
+    token_requests: int,
+    warmup: int,
+    memory_samples: int,
+    endpoints: Optional[List[str]] = None
+) -> Dict[str, Any]:
+    # Imported here: importing the app creates the tables and pulls in every router
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    with Session(bind=engine) as db:
+        users = pick_users(db)
+        announcements = db.execute(select(func.count(Announcement.id))).scalar()
+
+    results = {}
+    with TestClient(app) as client:
+        def login(username):
+            return client.post("/token", data={"username": username, "password": BENCHMARK_PASSWORD})
+
+        tokens = {}
+        for role in ("teacher", "parent"):
+            response = login(users[role])
+            if response.status_code != 200:
+                raise SystemExit(f"Could not log in as {users[role]}: {response.status_code} {response.text}")
+            tokens[role] = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+        class_ids = users["class_ids"]
+        created = iter(range(1, 10**9))
+        cases = {
+            "token": (lambda: login(users["parent"]), token_requests),
+            "dashboard_parent": (lambda: client.get("/dashboard/parent", headers=tokens["parent"]), requests),
+            "dashboard_teacher": (lambda: client.get("/dashboard/teacher", headers=tokens["teacher"]), requests),
+            "announcements": (
+                lambda: client.get("/announcements", params={"class_ids": class_ids}, headers=tokens["teacher"]),
+                requests,
+            ),
+            "classes_all": (lambda: client.get("/classes/all", headers=tokens["teacher"]), requests),
+            "create_announcement": (
+                lambda: client.post("/announcements/create", headers=tokens["teacher"], json={
+                    "title": f"Benchmark announcement {next(created)}",
+                    "content_en": "Created by the endpoint benchmark.",
+                    "target_audience": "parents",
+                    "class_id": class_ids[0],
+                }),
+                requests,
+            ),
+        }
+        for name, (send, count) in cases.items():
+            if endpoints and name not in endpoints:
+                continue
+            results[name] = measure(send, count, 1 if name == "token" else warmup, memory_samples)
+            print(
+                f"{name:20s} p50={results[name]['p50_ms']:8.2f} ms  p95={results[name]['p95_ms']:8.2f} ms  "
+                f"queries={results[name]['queries_per_request']:6.2f}  peak={results[name]['peak_memory_kb']} KB",
+                file=sys.stderr,
+            )
+
+    return {
+        "users": {"teacher": users["teacher"], "parent": users["parent"], "teacher_classes": len(class_ids)},
+        "announcements": announcements,
+        "results": results,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the hot endpoints in-process.")
+    parser.add_argument("--requests", type=int, default=200, help="Timed requests per endpoint")
+    parser.add_argument("--token-requests", type=int, default=20, help="Timed /token requests (bcrypt-bound)")
+    parser.add_argument("--warmup", type=int, default=10, help="Untimed requests per endpoint")
+    parser.add_argument("--memory-samples", type=int, default=5, help="Requests per endpoint traced for peak memory")
+    parser.add_argument("--endpoint", action="append", dest="endpoints", help="Only run this endpoint (repeatable)")
+    parser.add_argument("--label", default=None, help="Label stored with the results, e.g. a commit id")
+    parser.add_argument("--output", default=None, help="Write the JSON results to this file instead of stdout")
+    parser.add_argument("--generate", action="store_true", help="Generate a synthetic district first (committed)")
+    add_scale_arguments(parser)
+    args = parser.parse_args()
+
+    dataset = None
+    if args.generate:
+        Base.metadata.create_all(bind=engine)
+        started = time.monotonic()
+        with Session(bind=engine) as session:
+            dataset = generate_dataset(session, prefix=f"bench{args.seed}", **scale_options(args))
+            session.commit()
+        print(f"Generated {dataset} in {time.monotonic() - started:.1f}s.", file=sys.stderr)
+
+    report = {
+        "label": args.label,
+        "started_at": datetime.utcnow().isoformat(),
+        "database": engine.dialect.name,
+        "python": platform.python_version(),
+        # Repeated feed reads are cache hits when ANNOUNCEMENT_CACHE_BACKEND is memory or redis
+        "announcement_cache": ANNOUNCEMENT_CACHE_BACKEND,
+        "dataset": dataset,
+        **run_benchmark(args.requests, args.token_requests, args.warmup, args.memory_samples, args.endpoints),
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
@@ -0,0 +1,152 @@
+# app/utils/inbox_utils.py
+
+from sqlalchemy.orm import Session
+from sqlalchemy import select, delete, exists, and_, literal, tuple_, union_all
+from app.models import Announcement, ParentStudent, Student, UserInbox, announcement_recipients
+from app.utils.db_utils import insert_ignore
+from app.utils.announcement_cache import mark_users_changed
+from typing import List, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+INBOX_COLUMNS = ["user_id", "announcement_id", "created_at"]
+
+
+def _has_explicit_recipients():
+    """
+    Correlated EXISTS: the announcement was addressed to specific users.
+    """
+    return exists().where(announcement_recipients.c.announcement_id == Announcement.id)
+
+
+def audience_select(condition):
+    """
+    Select (user_id, announcement_id, created_at) for every member of the audience
+    of the announcements matching `condition`.
+
+    - Announcements with explicit recipients go to those recipients only.
+    - Announcements without recipients go to all parents of the class.
+    """
+    explicit = (
+        select(
+            announcement_recipients.c.user_id,
+            Announcement.id,
+            Announcement.created_at
+        )
+        .select_from(Announcement)
+        .join(announcement_recipients, announcement_recipients.c.announcement_id == Announcement.id)
+        .where(condition)
+    )
+    class_wide = (
+        select(
+            ParentStudent.parent_id,
+            Announcement.id,
+            Announcement.created_at
+        )
+        .select_from(Announcement)
+        .join(Student, Student.class_id == Announcement.class_id)
+        .join(ParentStudent, ParentStudent.student_id == Student.id)
+        .where(condition, ~_has_explicit_recipients())
+        .distinct()
+    )
+    return union_all(explicit, class_wide)
+
+
+def fan_out_announcements(db: Session, announcement_ids: List[int]) -> int:
+    """
+    Write inbox rows for the audience of the given announcements.
+    Must run after the announcements (and their recipients) are flushed.
+    Does not commit; returns the number of inserted rows.
+    """
+    if not announcement_ids:
+        return 0
+    stmt = insert_ignore(db, UserInbox.__table__).from_select(
+        INBOX_COLUMNS,
+        audience_select(Announcement.id.in_(announcement_ids))
+    )
+    result = db.execute(stmt)
+    logger.debug("Fanned out %d announcements into %s inbox rows", len(announcement_ids), result.rowcount)
+    return result.rowcount
+
+
+def add_parent_to_class_inbox(db: Session, parent_id: int, class_id: int) -> None:
+    """
+    Deliver a class's existing class-wide announcements to a parent who just
+    gained a child in that class. Does not commit.
+    """
+    stmt = insert_ignore(db, UserInbox.__table__).from_select(
+        INBOX_COLUMNS,
+        select(
+            literal(parent_id),
+            Announcement.id,
+            Announcement.created_at
+        ).where(Announcement.class_id == class_id, ~_has_explicit_recipients())
+    )
+    db.execute(stmt)
+    mark_users_changed(db, [parent_id])
+
+
+def add_parents_to_class_inboxes(db: Session, pairs: List[Tuple[int, int]], chunk_size: int = 500) -> None:
+    """
+    Bulk form of `add_parent_to_class_inbox` for (parent_id, class_id) pairs.
+    The parents must already be linked to a student of the class. Does not commit.
+    """
+    pairs = sorted(set(pairs))
+    mark_users_changed(db, {parent_id for parent_id, _ in pairs})
+    for start in range(0, len(pairs), chunk_size):
+        chunk = pairs[start:start + chunk_size]
+        stmt = insert_ignore(db, UserInbox.__table__).from_select(
+            INBOX_COLUMNS,
+            select(ParentStudent.parent_id, Announcement.id, Announcement.created_at)
+            .select_from(ParentStudent)
+            .join(Student, Student.id == ParentStudent.student_id)
+            .join(Announcement, Announcement.class_id == Student.class_id)
+            .where(tuple_(ParentStudent.parent_id, Student.class_id).in_(chunk), ~_has_explicit_recipients())
+            .distinct()
+        )
+        db.execute(stmt)
+
+
+def remove_parent_from_class_inbox(db: Session, parent_id: int, class_id: int) -> None:
+    """
+    Withdraw a class's class-wide announcements from a parent who no longer has
+    a child in that class. Explicitly addressed announcements are kept.
+    Call after the ParentStudent/Student change has been flushed. Does not commit.
+    """
+    still_linked = db.execute(
+        select(ParentStudent.student_id)
+        .join(Student, Student.id == ParentStudent.student_id)
+        .where(ParentStudent.parent_id == parent_id, Student.class_id == class_id)
+        .limit(1)
+    ).first()
+    if still_linked:
+        return
+
+    class_wide_ids = (
+        select(Announcement.id)
+        .where(Announcement.class_id == class_id, ~_has_explicit_recipients())
+    )
+    db.execute(
+        delete(UserInbox)
+        .where(
+            and_(
+                UserInbox.user_id == parent_id,
+                UserInbox.announcement_id.in_(class_wide_ids)
+            )
+        )
+        .execution_options(synchronize_session=False)
+    )
+    mark_users_changed(db, [parent_id])
+
+
+def clear_user_inbox(db: Session, user_id: int) -> None:
+    """
+    Remove every inbox row of a user (e.g. before the user is deleted). Does not commit.
+    """
+    db.execute(
+        delete(UserInbox)
+        .where(UserInbox.user_id == user_id)
+        .execution_options(synchronize_session=False)
+    )
+    mark_users_changed(db, [user_id])
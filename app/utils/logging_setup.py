@@ -0,0 +1,262 @@
+# app/utils/logging_setup.py
+#
+# Non-blocking logging. Every logger feeds one QueueHandler on the root logger; a
+# QueueListener thread does the formatting and the writing to stderr, so a request
+# never waits on the terminal or a log collector. Records are JSON lines (LOG_FORMAT=json,
+# the default) or plain text, and carry the request's correlation id and route.
+#
+# - Correlation ids: CorrelationIdMiddleware takes X-Request-ID from the request (or
+#   makes one), keeps it in a ContextVar for the duration of the request and echoes it
+#   on the response.
+# - Sampling: LOG_SAMPLING="app.routers.announcements=0.1,app.utils=0.5" keeps that
+#   fraction of the records below WARNING from a logger and its children. Warnings and
+#   errors are always kept.
+# - Levels: LOG_LEVEL for the root, LOG_LEVELS="app.routers.dashboards=DEBUG" per logger.
+#
+# The message is merged with its %-style arguments on the calling thread (the arguments
+# may change after the call) but only for records that pass the level and sampling
+# checks, so payload dumps passed as arguments cost nothing when they are not logged.
+
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional, Tuple
+import atexit
+import copy
+import logging
+import os
+import queue
+import random
+import re
+import sys
+import time
+import uuid
+
+import orjson
+
+from app.utils.request_metrics import current_route
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# "json" or "text"
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+# Records waiting for the listener; when full, new records are dropped and counted
+# (klasstra_log_records_dropped_total on /metrics)
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+REQUEST_ID_HEADER = b"x-request-id"
+# Incoming ids are only trusted if they look like an id, so they can't inject log lines
+_VALID_REQUEST_ID = re.compile(r"^[A-Za-z0-9._:-]{1,128}$")
+
+# Attributes every LogRecord has; anything else was passed with `extra=`
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {
+    "message", "asctime", "request_id", "route",
+}
+
+current_request_id: ContextVar[Optional[str]] = ContextVar("current_request_id", default=None)
+
+
+def _parse_pairs(value: str) -> Dict[str, str]:
+    pairs = {}
+    for item in value.split(","):
+        name, sep, setting = item.strip().partition("=")
+        if sep and name.strip():
+            pairs[name.strip()] = setting.strip()
+    return pairs
+
+
+class CorrelationIdFilter(logging.Filter):
+    """
+    Stamp records with the current request id and route. Runs on the calling thread,
+    where the request's ContextVars are visible.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = current_request_id.get()
+        record.route = current_route()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keep `rate` of the records below WARNING from the configured loggers; the longest
+    matching logger name wins.
+    """
+
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        self.rates = rates
+        self._resolved: Dict[str, Optional[float]] = {}
+
+    def rate_for(self, name: str) -> Optional[float]:
+        if name not in self._resolved:
+            rate = None
+            candidate = name
+            while candidate:
+                if candidate in self.rates:
+                    rate = self.rates[candidate]
+                    break
+                candidate = candidate.rpartition(".")[0]
+            self._resolved[name] = rate
+        return self._resolved[name]
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or not self.rates:
+            return True
+        rate = self.rate_for(record.name)
+        return rate is None or random.random() < rate
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """
+    QueueHandler that never blocks the caller and leaves formatting to the listener.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+        self._exception_formatter = logging.Formatter()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Unlike the base class, keep the traceback out of the message so the JSON
+        # formatter can put it in its own field
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = self._exception_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "request_id": getattr(record, "request_id", None),
+            "route": getattr(record, "route", None),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and key not in entry:
+                entry[key] = value
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        if record.stack_info:
+            entry["stack"] = record.stack_info
+        return orjson.dumps(entry, default=str).decode()
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        if not hasattr(record, "request_id"):
+            record.request_id = None
+        return super().format(record)
+
+
+_queue_handler: Optional[NonBlockingQueueHandler] = None
+_listener: Optional[QueueListener] = None
+
+
+def configure_logging() -> Tuple[NonBlockingQueueHandler, QueueListener]:
+    """
+    Route every logger through the queue and start the listener thread. Safe to call
+    more than once; later calls return the running pipeline.
+    """
+    global _queue_handler, _listener
+    if _listener is not None:
+        return _queue_handler, _listener
+
+    log_queue: queue.Queue = queue.Queue(LOG_QUEUE_SIZE)
+    handler = NonBlockingQueueHandler(log_queue)
+    rates = {name: float(rate) for name, rate in _parse_pairs(os.getenv("LOG_SAMPLING", "")).items()}
+    handler.addFilter(SamplingFilter(rates))
+    handler.addFilter(CorrelationIdFilter())
+
+    # stderr, like logging's default: CLIs built on the app keep stdout for their output
+    output = logging.StreamHandler(sys.stderr)
+    output.setFormatter(JsonFormatter() if LOG_FORMAT == "json" else TextFormatter())
+    listener = QueueListener(log_queue, output, respect_handler_level=True)
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(LOG_LEVEL)
+    for name, level in _parse_pairs(os.getenv("LOG_LEVELS", "")).items():
+        logging.getLogger(name).setLevel(level.upper())
+
+    # Uvicorn configures its own synchronous handlers before importing the app
+    for name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+        uvicorn_logger = logging.getLogger(name)
+        uvicorn_logger.handlers.clear()
+        uvicorn_logger.propagate = True
+
+    listener.start()
+    atexit.register(shutdown_logging)
+    _queue_handler, _listener = handler, listener
+    return handler, listener
+
+
+def shutdown_logging() -> None:
+    """
+    Write out the queued records and stop the listener thread.
+    """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def dropped_records() -> int:
+    """
+    Records dropped by this process because the queue was full.
+    """
+    return _queue_handler.dropped if _queue_handler is not None else 0
+
+
+class CorrelationIdMiddleware:
+    """
+    Pure ASGI middleware that gives every HTTP request a correlation id.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope["headers"]:
+            if name == REQUEST_ID_HEADER:
+                candidate = value.decode("latin-1")
+                if _VALID_REQUEST_ID.match(candidate):
+                    request_id = candidate
+                break
+        if request_id is None:
+            request_id = uuid.uuid4().hex
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                headers = [(name, value) for name, value in message.get("headers", []) if name.lower() != REQUEST_ID_HEADER]
+                headers.append((REQUEST_ID_HEADER, request_id.encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        token = current_request_id.set(request_id)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            current_request_id.reset(token)
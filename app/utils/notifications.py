@@ -0,0 +1,351 @@
+# app/utils/notifications.py
+#
+# Immediate delivery of new announcements, following each recipient's
+# UserProfile.preferred_contact_method:
+#
+# - "sms" with a phone number: a short text through the configured SmsProvider
+#   (SMS_PROVIDER, "stub" logs the messages). This is the only immediate channel;
+# - everyone else gets nothing here. Users who chose email, chose nothing, or chose SMS
+#   without a phone number get the announcement in the daily digest email
+#   (app.utils.digest, see `wants_digest`), one message a day rather than one per
+#   announcement; "app" users read it in the app.
+# The inbox row and the live stream event are written by create_announcement itself.
+#
+# create_announcement only hands the committed announcement ids to `notification_router`
+# (a non-blocking put). A dispatcher thread resolves the SMS recipients with one query
+# over user_inbox, users and user_profiles, grouped by channel, and feeds each channel's
+# queue. Every channel collects deliveries for up to its batching window (or batch size),
+# then sends the batch on its own thread pool, throttled by its own rate limit:
+#
+#   NOTIFY_<CHANNEL>_WORKERS, NOTIFY_<CHANNEL>_RATE (messages/second, 0 = unlimited),
+#   NOTIFY_<CHANNEL>_BATCH_SIZE, NOTIFY_<CHANNEL>_WINDOW_MS   with CHANNEL in SMS
+#
+# Delivery is best-effort and in-process: announcements still queued when the process
+# stops are not notified (their inbox rows are unaffected). NOTIFICATIONS_ENABLED=0 turns
+# the router off.
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import groupby
+from typing import Any, Callable, Dict, Iterable, List, Optional
+import logging
+import os
+import queue
+import threading
+import time
+
+from sqlalchemy import and_, literal, select
+from sqlalchemy.orm import Session
+from app.models import Announcement, User, UserInbox, UserProfile
+from app.utils.digest import has_phone_number, localized_content
+
+logger = logging.getLogger(__name__)
+
+NOTIFICATIONS_ENABLED = os.getenv("NOTIFICATIONS_ENABLED", "1") != "0"
+# Announcement ids waiting for the dispatcher; beyond this, notifications are dropped
+NOTIFY_QUEUE_SIZE = int(os.getenv("NOTIFY_QUEUE_SIZE", "10000"))
+# "stub" or "module:callable" returning an SmsProvider
+SMS_PROVIDER = os.getenv("SMS_PROVIDER", "stub")
+SMS_MAX_LENGTH = 160
+
+SMS = "sms"
+
+CHANNEL_DEFAULTS = {
+    SMS: {"workers": 4, "rate": 20.0, "batch_size": 50, "window_ms": 1000},
+}
+
+
+def channel_settings(name: str) -> Dict[str, float]:
+    prefix = f"NOTIFY_{name.upper()}_"
+    return {
+        key: type(default)(os.getenv(prefix + key.upper(), str(default)))
+        for key, default in CHANNEL_DEFAULTS[name].items()
+    }
+
+
+class RateLimiter:
+    """
+    Token bucket shared by a channel's worker threads; `rate` 0 means unlimited.
+    """
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.rate = rate
+        self.capacity = burst or max(rate, 1)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, count: int = 1) -> None:
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                # A request larger than the bucket waits for a full bucket, then overdraws it
+                needed = min(count, self.capacity)
+                if self._tokens >= needed:
+                    self._tokens -= count
+                    return
+                wait = (needed - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class SmsProvider:
+    """
+    Interface of SMS gateways: send a batch of {"to", "text"} messages.
+    """
+
+    def send_batch(self, messages: List[Dict[str, str]]) -> None:
+        raise NotImplementedError
+
+
+class StubSmsProvider(SmsProvider):
+    """
+    Local stand-in that logs the messages and keeps the most recent ones for inspection.
+    """
+
+    def __init__(self, keep: int = 1000):
+        self.sent: deque = deque(maxlen=keep)
+
+    def send_batch(self, messages: List[Dict[str, str]]) -> None:
+        for message in messages:
+            logger.info("SMS to %s: %s", message["to"], message["text"])
+            self.sent.append(message)
+
+
+def load_sms_provider(spec: str = SMS_PROVIDER) -> SmsProvider:
+    if spec == "stub":
+        return StubSmsProvider()
+    module_name, _, attribute = spec.partition(":")
+    module = __import__(module_name, fromlist=[attribute])
+    return getattr(module, attribute)()
+
+
+class Channel:
+    """
+    Queue, batching window, thread pool and rate limit of one delivery channel.
+    `send` receives a list of deliveries and raises to fail the whole batch.
+    """
+
+    def __init__(self, name: str, send: Callable[[List[Dict[str, Any]]], None],
+                 workers: int, rate: float, batch_size: int, window_ms: int):
+        self.name = name
+        self.send = send
+        self.batch_size = batch_size
+        self.window = window_ms / 1000
+        self.limiter = RateLimiter(rate)
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"notify-{name}")
+        self.queue: queue.Queue = queue.Queue()
+        self.stats = {"queued": 0, "delivered": 0, "failed": 0, "batches": 0}
+        self._stats_lock = threading.Lock()
+        self._collector = threading.Thread(target=self._collect, name=f"notify-{name}-collector", daemon=True)
+        self._collector.start()
+
+    def put_many(self, deliveries: List[Dict[str, Any]]) -> None:
+        with self._stats_lock:
+            self.stats["queued"] += len(deliveries)
+        for delivery in deliveries:
+            self.queue.put(delivery)
+
+    def _collect(self) -> None:
+        # Wait for the first delivery, then gather more until the window closes or the batch is full
+        while True:
+            first = self.queue.get()
+            if first is None:
+                return
+            batch = [first]
+            deadline = time.monotonic() + self.window
+            stopping = False
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self.queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            self.executor.submit(self._send_batch, batch)
+            if stopping:
+                return
+
+    def _send_batch(self, batch: List[Dict[str, Any]]) -> None:
+        self.limiter.acquire(len(batch))
+        try:
+            self.send(batch)
+        except Exception:
+            logger.exception("Failed to deliver %d %s notifications", len(batch), self.name)
+            outcome = "failed"
+        else:
+            outcome = "delivered"
+        with self._stats_lock:
+            self.stats[outcome] += len(batch)
+            self.stats["batches"] += 1
+
+    def shutdown(self, timeout: float) -> None:
+        self.queue.put(None)
+        self._collector.join(timeout)
+        self.executor.shutdown(wait=True, cancel_futures=False)
+
+
+def wants_sms():
+    """
+    SQL condition on user_profiles: the user is texted about new announcements.
+    """
+    return and_(UserProfile.preferred_contact_method == "sms", has_phone_number())
+
+
+def fetch_deliveries(db: Session, announcement_ids: List[int]) -> List[Any]:
+    """
+    Recipients of the announcements that are notified right away, with their channel,
+    one row per (recipient, announcement), ordered by channel.
+    """
+    channel = literal(SMS).label("channel")
+    return db.execute(
+        select(
+            channel,
+            UserInbox.announcement_id,
+            User.id.label("user_id"),
+            User.language,
+            UserProfile.phone_number,
+            Announcement.title,
+            Announcement.content_en,
+            Announcement.content_de,
+            Announcement.content_fr,
+            Announcement.original_language,
+        )
+        .select_from(UserInbox)
+        .join(User, User.id == UserInbox.user_id)
+        .join(Announcement, Announcement.id == UserInbox.announcement_id)
+        .join(UserProfile, UserProfile.user_id == User.id)
+        .where(UserInbox.announcement_id.in_(announcement_ids), wants_sms())
+        .order_by(UserInbox.announcement_id, User.id)
+    ).all()
+
+
+def sms_sender(provider: SmsProvider):
+    def send(batch: List[Dict[str, Any]]) -> None:
+        provider.send_batch([
+            {"to": delivery["phone_number"], "text": f"{delivery['title']}: {delivery['text']}"[:SMS_MAX_LENGTH]}
+            for delivery in batch
+        ])
+    return send
+
+
+class NotificationRouter:
+    def __init__(self, session_factory: Optional[Callable[[], Session]] = None,
+                 sms_provider: Optional[SmsProvider] = None):
+        self._session_factory = session_factory
+        self._sms_provider = sms_provider
+        self._queue: queue.Queue = queue.Queue(NOTIFY_QUEUE_SIZE)
+        self._channels: Dict[str, Channel] = {}
+        self._dispatcher: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.dropped = 0
+
+    def _start(self) -> None:
+        if self._session_factory is None:
+            # Imported here: app.database imports the instrumentation modules
+            from app.database import SessionLocal
+            self._session_factory = SessionLocal
+        if self._sms_provider is None:
+            self._sms_provider = load_sms_provider()
+        senders = {
+            SMS: sms_sender(self._sms_provider),
+        }
+        self._channels = {name: Channel(name, send, **channel_settings(name)) for name, send in senders.items()}
+        self._dispatcher = threading.Thread(target=self._dispatch, name="notify-dispatcher", daemon=True)
+        self._dispatcher.start()
+
+    def submit(self, announcement_ids: Iterable[int]) -> None:
+        """
+        Notify the audience of committed announcements. Never blocks.
+        """
+        announcement_ids = list(announcement_ids)
+        if not NOTIFICATIONS_ENABLED or not announcement_ids:
+            return
+        with self._lock:
+            if self._dispatcher is None:
+                self._start()
+        try:
+            self._queue.put_nowait(announcement_ids)
+        except queue.Full:
+            self.dropped += len(announcement_ids)
+            logger.warning("Notification queue full; %d announcements will not be notified", len(announcement_ids))
+
+    def _dispatch(self) -> None:
+        while True:
+            announcement_ids = self._queue.get()
+            if announcement_ids is None:
+                return
+            # Take whatever else is waiting, so a burst of posts shares one query
+            while len(announcement_ids) < 500:
+                try:
+                    more = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if more is None:
+                    self._queue.put(None)
+                    break
+                announcement_ids.extend(more)
+            try:
+                self.route(announcement_ids)
+            except Exception:
+                logger.exception("Could not route notifications for announcements %s", announcement_ids)
+
+    def route(self, announcement_ids: List[int]) -> Dict[str, int]:
+        """
+        Resolve the audience and queue each recipient on their channel.
+        """
+        with self._session_factory() as db:
+            rows = fetch_deliveries(db, announcement_ids)
+        counts = {}
+        for channel, group in groupby(rows, key=lambda row: row.channel):
+            deliveries = []
+            for row in group:
+                language = row.language or "en"
+                text, _ = localized_content(row, language)
+                deliveries.append({
+                    "announcement_id": row.announcement_id,
+                    "user_id": row.user_id,
+                    "phone_number": row.phone_number,
+                    "title": row.title,
+                    "text": text,
+                })
+            self._channels[channel].put_many(deliveries)
+            counts[channel] = len(deliveries)
+        logger.debug("Routed notifications for announcements %s: %s", announcement_ids, counts)
+        return counts
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": NOTIFICATIONS_ENABLED,
+            "pending_announcements": self._queue.qsize(),
+            "dropped_announcements": self.dropped,
+            "channels": {
+                name: {**channel.stats, "waiting": channel.queue.qsize()} for name, channel in self._channels.items()
+            },
+        }
+
+    def shutdown(self, timeout: float = 10.0) -> None:
+        """
+        Route what is queued, flush every channel and stop the threads.
+        """
+        with self._lock:
+            if self._dispatcher is None:
+                return
+            self._queue.put(None)
+            self._dispatcher.join(timeout)
+            for channel in self._channels.values():
+                channel.shutdown(timeout)
+            self._dispatcher = None
+            self._channels = {}
+
+
+# Process-wide router used by the announcement endpoints
+notification_router = NotificationRouter()
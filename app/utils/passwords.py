@@ -0,0 +1,115 @@
+# app/utils/passwords.py
+#
+# bcrypt hashing runs in a dedicated, size-limited process pool so that bursts of
+# logins cannot pin the request threadpool on CPU-bound work. This module is
+# imported by the pool's worker processes, so it must not import the app.
+
+from concurrent.futures import Future, ProcessPoolExecutor
+from fastapi import HTTPException, status
+from passlib.hash import bcrypt
+from typing import Optional, Tuple
+import asyncio
+import multiprocessing
+import os
+import threading
+
+# bcrypt cost factor for new hashes; pick it with `python -m app.utils.bcrypt_benchmark`
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+# Worker processes dedicated to hashing
+BCRYPT_WORKERS = int(os.getenv("BCRYPT_WORKERS", "2"))
+# Hash/verify jobs allowed to wait or run at once before callers get a 503
+BCRYPT_MAX_PENDING = int(os.getenv("BCRYPT_MAX_PENDING", "32"))
+
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_lock = threading.Lock()
+_pending = 0
+_pending_lock = threading.Lock()
+
+
+# Functions executed in the worker processes
+def _hash(password: str, rounds: int) -> str:
+    return bcrypt.using(rounds=rounds).hash(password)
+
+
+def _verify_and_update(password: str, hashed_password: str, rounds: int) -> Tuple[bool, Optional[str]]:
+    """
+    Verify a password and, if the hash uses a different cost factor than
+    configured, return a fresh hash to store in its place.
+    """
+    if not bcrypt.verify(password, hashed_password):
+        return False, None
+    if hash_rounds(hashed_password) != rounds:
+        return True, _hash(password, rounds)
+    return True, None
+
+
+def hash_rounds(hashed_password: str) -> Optional[int]:
+    # bcrypt hashes look like $2b$12$<salt+checksum>
+    try:
+        return int(hashed_password.split("$")[2])
+    except (IndexError, ValueError):
+        return None
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # spawn: do not fork the server process with its threads and event loop
+            _executor = ProcessPoolExecutor(
+                max_workers=BCRYPT_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _executor
+
+
+def _release(_future: Future) -> None:
+    global _pending
+    with _pending_lock:
+        _pending -= 1
+
+
+def _submit(fn, *args) -> Future:
+    """
+    Queue a job on the hashing pool, or reject it with 503 when the queue is full.
+    """
+    global _pending
+    with _pending_lock:
+        if _pending >= BCRYPT_MAX_PENDING:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Too many login attempts in progress. Please retry shortly.",
+                headers={"Retry-After": "1"},
+            )
+        _pending += 1
+    try:
+        future = _get_executor().submit(fn, *args)
+    except Exception:
+        with _pending_lock:
+            _pending -= 1
+        raise
+    future.add_done_callback(_release)
+    return future
+
+
+# The routes await the pool from the event loop, so no request thread waits on bcrypt
+async def hash_password_async(password: str) -> str:
+    return await asyncio.wrap_future(_submit(_hash, password, BCRYPT_ROUNDS))
+
+
+async def verify_and_update_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """
+    Returns (is_valid, new_hash). `new_hash` is set when the stored hash should
+    be replaced because BCRYPT_ROUNDS changed.
+    """
+    return await asyncio.wrap_future(
+        _submit(_verify_and_update, plain_password, hashed_password, BCRYPT_ROUNDS)
+    )
+
+
+def shutdown_password_pool() -> None:
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
@@ -0,0 +1,120 @@
+# app/utils/pool_stats.py
+
+from collections import deque
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from typing import Any, Dict, Type
+import threading
+import time
+
+# Number of recent checkout waits kept for percentiles
+CHECKOUT_SAMPLE_SIZE = 1000
+
+
+class PoolStats:
+    """
+    Counters for one connection pool: checkout latency, churn and current usage.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.pool = None
+        self._lock = threading.Lock()
+        self._waits = deque(maxlen=CHECKOUT_SAMPLE_SIZE)
+        self.checkouts = 0
+        self.checkins = 0
+        self.connects = 0
+        self.closes = 0
+        self.invalidations = 0
+        self.checkout_errors = 0
+        self.wait_count = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def record_wait(self, seconds: float, failed: bool = False) -> None:
+        with self._lock:
+            self._waits.append(seconds)
+            self.wait_count += 1
+            self.wait_total += seconds
+            self.wait_max = max(self.wait_max, seconds)
+            if failed:
+                self.checkout_errors += 1
+
+    def _count(self, attribute: str) -> None:
+        with self._lock:
+            setattr(self, attribute, getattr(self, attribute) + 1)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            waits = sorted(self._waits)
+            data = {
+                "checkouts": self.checkouts,
+                "checkins": self.checkins,
+                "connects": self.connects,
+                "closes": self.closes,
+                "invalidations": self.invalidations,
+                "checkout_errors": self.checkout_errors,
+                "checkout_wait_ms": {
+                    "avg": round(self.wait_total / self.wait_count * 1000, 3) if self.wait_count else 0.0,
+                    "p50": round(_percentile(waits, 0.50) * 1000, 3),
+                    "p95": round(_percentile(waits, 0.95) * 1000, 3),
+                    "p99": round(_percentile(waits, 0.99) * 1000, 3),
+                    "max": round(self.wait_max * 1000, 3),
+                },
+            }
+
+        pool = self.pool
+        data["pool"] = {
+            "class": type(pool).__name__ if pool is not None else None,
+            "size": _call(pool, "size"),
+            "checked_out": _call(pool, "checkedout"),
+            "checked_in": _call(pool, "checkedin"),
+            "overflow": _call(pool, "overflow"),
+        }
+        return data
+
+
+def _percentile(sorted_values, fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def _call(pool, method: str):
+    if pool is None or not hasattr(pool, method):
+        return None
+    return getattr(pool, method)()
+
+
+def timed_pool_class(base: Type, stats: PoolStats) -> Type:
+    """
+    Subclass a pool class so every checkout records how long it waited.
+    """
+    class TimedPool(base):
+        def connect(self):
+            stats.pool = self
+            start = time.perf_counter()
+            try:
+                connection = super().connect()
+            except Exception:
+                stats.record_wait(time.perf_counter() - start, failed=True)
+                raise
+            stats.record_wait(time.perf_counter() - start)
+            return connection
+
+    TimedPool.__name__ = f"Timed{base.__name__}"
+    return TimedPool
+
+
+def instrument_engine(engine: Engine, stats: PoolStats) -> None:
+    """
+    Hook pool events of a (sync) engine to count checkouts and connection churn.
+    """
+    stats.pool = engine.pool
+
+    event.listen(engine, "checkout", lambda *args: stats._count("checkouts"))
+    event.listen(engine, "checkin", lambda *args: stats._count("checkins"))
+    event.listen(engine, "connect", lambda *args: stats._count("connects"))
+    event.listen(engine, "close", lambda *args: stats._count("closes"))
+    event.listen(engine, "invalidate", lambda *args: stats._count("invalidations"))
@@ -1,39 +1,116 @@
 # populate_recipients.py
+#
+# Assign all parents of the class as recipients to announcements that have no explicit recipients.
+# Works in announcement-id chunks, one short transaction each, and records the last finished
+# chunk in a checkpoint file so an interrupted run resumes where it stopped.
+#
+# Usage: python -m app.utils.populate_recipients [--chunk-size 5000] [--dry-run] [--reset]
 
+import argparse
+import json
+import os
+import time
+from sqlalchemy import and_, exists, func, select
 from sqlalchemy.orm import Session
-from app.models import Announcement, User, ParentStudent, Student, announcement_recipients, Base
+from app.models import Announcement, ParentStudent, Student, announcement_recipients
 from app.database import engine
-from sqlalchemy import select
-
-# Create a new session
-session = Session(bind=engine)
-
-def assign_parents_to_announcements():
-    # Fetch all announcements
-    announcements = session.query(Announcement).all()
-    
-    for announcement in announcements:
-        # Check if the announcement has specific recipients
-        if not announcement.recipients:
-            # If no recipients, it's intended for all parents of the class
-            # Fetch all parents of the class
-            class_id = announcement.class_id
-            parent_ids = session.query(ParentStudent.parent_id).join(Student).filter(Student.class_id == class_id).all()
-            parent_ids = [pid for (pid,) in parent_ids]
-            
-            # Assign all parents to the announcement
-            for parent_id in parent_ids:
-                parent = session.query(User).get(parent_id)
-                if parent and parent not in announcement.recipients:
-                    announcement.recipients.append(parent)
-        else:
-            # If there are specific recipients, ensure only those see the announcement
-            # No action needed as recipients are already assigned
-            pass
-    
-    # Commit the changes
-    session.commit()
-    print("Parents have been assigned to announcements based on class associations.")
+from app.utils.db_utils import insert_ignore
+
+DEFAULT_CHECKPOINT = "populate_recipients.checkpoint.json"
+
+
+def class_parents_select(start: int, end: int):
+    """
+    (announcement_id, user_id) pairs for the class parents of announcements in [start, end]
+    that have no recipients yet.
+    """
+    has_recipients = exists().where(announcement_recipients.c.announcement_id == Announcement.id)
+    return (
+        select(Announcement.id, ParentStudent.parent_id)
+        .select_from(Announcement)
+        .join(Student, Student.class_id == Announcement.class_id)
+        .join(ParentStudent, ParentStudent.student_id == Student.id)
+        .where(and_(Announcement.id.between(start, end), ~has_recipients))
+        .distinct()
+    )
+
+
+def load_checkpoint(path: str) -> int:
+    if not os.path.exists(path):
+        return 0
+    with open(path) as f:
+        return json.load(f)["last_id"]
+
+
+def save_checkpoint(path: str, last_id: int) -> None:
+    # Write-then-rename so a crash never leaves a truncated checkpoint
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"last_id": last_id}, f)
+    os.replace(tmp_path, path)
+
+
+def assign_parents_to_announcements(
+    chunk_size: int = 5000,
+    checkpoint: str = DEFAULT_CHECKPOINT,
+    dry_run: bool = False,
+    pause: float = 0.0
+):
+    with Session(bind=engine) as session:
+        max_id = session.execute(select(func.max(Announcement.id))).scalar() or 0
+
+    last_id = 0 if dry_run else load_checkpoint(checkpoint)
+    if last_id:
+        print(f"Resuming after announcement {last_id}.")
+
+    written = 0
+    started = time.monotonic()
+    for start in range(last_id + 1, max_id + 1, chunk_size):
+        end = min(start + chunk_size - 1, max_id)
+        with Session(bind=engine) as session:
+            pairs = class_parents_select(start, end)
+            if dry_run:
+                rows = session.execute(select(func.count()).select_from(pairs.subquery())).scalar()
+            else:
+                stmt = insert_ignore(session, announcement_recipients).from_select(
+                    ["announcement_id", "user_id"], pairs
+                )
+                rows = session.execute(stmt).rowcount
+                session.commit()
+        if not dry_run:
+            save_checkpoint(checkpoint, end)
+
+        written += rows
+        elapsed = time.monotonic() - started
+        done = end - last_id
+        print(
+            f"Announcements {start}-{end} of {max_id}: {rows} recipient rows "
+            f"{'to write' if dry_run else 'written'} ({written} total, "
+            f"{done / elapsed if elapsed else 0:.0f} announcements/s)."
+        )
+        if pause:
+            time.sleep(pause)
+
+    if dry_run:
+        print(f"Dry run complete: {written} recipient rows would be written.")
+    else:
+        print("Parents have been assigned to announcements based on class associations.")
+
 
 if __name__ == "__main__":
-    assign_parents_to_announcements()
+    parser = argparse.ArgumentParser(description="Assign class parents to announcements without recipients.")
+    parser.add_argument("--chunk-size", type=int, default=5000, help="Announcements per transaction")
+    parser.add_argument("--checkpoint", default=DEFAULT_CHECKPOINT, help="File recording the last finished chunk")
+    parser.add_argument("--dry-run", action="store_true", help="Count the rows that would be written, write nothing")
+    parser.add_argument("--reset", action="store_true", help="Ignore the checkpoint and start from the beginning")
+    parser.add_argument("--pause", type=float, default=0.0, help="Seconds to sleep between chunks")
+    args = parser.parse_args()
+
+    if args.reset and os.path.exists(args.checkpoint):
+        os.remove(args.checkpoint)
+    assign_parents_to_announcements(
+        chunk_size=args.chunk_size,
+        checkpoint=args.checkpoint,
+        dry_run=args.dry_run,
+        pause=args.pause,
+    )
@@ -0,0 +1,236 @@
+# app/utils/query_budget.py
+#
+# Opt-in N+1 detection for development and test runs.
+#
+# With QUERY_DETECTOR=warn or raise, every statement is normalized to its shape
+# (literals, bound parameters and IN lists collapsed) and counted per request. When
+# one shape runs more than QUERY_REPEAT_LIMIT times in a request, that is almost
+# always a loop issuing one query per row: it is logged (warn) or raised as
+# NPlusOneError (raise). Endpoints can also declare a statement budget with
+# @query_budget(n), and tests can wrap calls in `assert_max_queries(n)`.
+#
+# QUERY_DETECTOR_RAISELOAD=1 additionally makes every ORM query load relationships
+# with raiseload("*"), the option form of lazy="raise": any lazy load that was not
+# asked for eagerly fails immediately.
+#
+# With QUERY_DETECTOR=off (the default) nothing is hooked and the decorator is a
+# plain call-through.
+
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, raiseload
+from typing import Iterator, List, Optional
+import functools
+import inspect
+import logging
+import os
+import re
+
+logger = logging.getLogger(__name__)
+
+# "off", "warn" or "raise"
+QUERY_DETECTOR = os.getenv("QUERY_DETECTOR", "off")
+# Runs of the same statement shape allowed per request before it is reported
+QUERY_REPEAT_LIMIT = int(os.getenv("QUERY_REPEAT_LIMIT", "5"))
+QUERY_DETECTOR_RAISELOAD = os.getenv("QUERY_DETECTOR_RAISELOAD", "0") == "1"
+
+_STRING_LITERALS = re.compile(r"'(?:[^']|'')*'")
+_NUMBERS = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PARAMETERS = re.compile(r"%\(\w+\)s|%s|\$\d+|(?<!:):\w+|\?")
+_IN_LISTS = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+
+class NPlusOneError(RuntimeError):
+    pass
+
+
+def normalize_statement(statement: str) -> str:
+    """
+    The shape of a statement: the same query with different values gives the same shape.
+    """
+    shape = _STRING_LITERALS.sub("?", statement)
+    shape = _PARAMETERS.sub("?", shape)
+    shape = _NUMBERS.sub("?", shape)
+    shape = _IN_LISTS.sub("(?)", shape)
+    return _WHITESPACE.sub(" ", shape).strip()
+
+
+class QueryTracker:
+    """
+    Statement shapes seen in one scope (a request, an endpoint call, a test block).
+    Statements also count towards the enclosing tracker.
+    """
+
+    def __init__(self, label: str, mode: Optional[str] = None, repeat_limit: Optional[int] = None,
+                 parent: Optional["QueryTracker"] = None):
+        # The defaults are read per tracker, so the settings can be changed at runtime
+        self.label = label
+        self.mode = mode or QUERY_DETECTOR
+        self.repeat_limit = QUERY_REPEAT_LIMIT if repeat_limit is None else repeat_limit
+        self.parent = parent
+        self.shapes: Counter = Counter()
+        self.total = 0
+
+    def record(self, shape: str) -> None:
+        tracker = self
+        while tracker is not None:
+            tracker.total += 1
+            tracker.shapes[shape] += 1
+            if tracker.shapes[shape] == tracker.repeat_limit + 1:
+                tracker.report(
+                    f"N+1 suspected in {tracker.label}: the same statement ran more than "
+                    f"{tracker.repeat_limit} times: {shape[:500]}"
+                )
+            tracker = tracker.parent
+
+    def report(self, message: str) -> None:
+        if self.mode == "raise":
+            raise NPlusOneError(message)
+        if self.mode == "warn":
+            logger.warning(message)
+
+    def repeated(self) -> List[str]:
+        return [shape for shape, count in self.shapes.most_common() if count > self.repeat_limit]
+
+    def summary(self, limit: int = 5) -> str:
+        lines = [f"{self.total} statements in {self.label}"]
+        for shape, count in self.shapes.most_common(limit):
+            lines.append(f"  {count}x {shape[:300]}")
+        return "\n".join(lines)
+
+
+_current_tracker: ContextVar[Optional[QueryTracker]] = ContextVar("current_query_tracker", default=None)
+
+
+@contextmanager
+def track_queries(label: str, mode: Optional[str] = None) -> Iterator[QueryTracker]:
+    """
+    Track the statements issued in this context (and in threads and tasks started from it).
+    """
+    tracker = QueryTracker(label, mode=mode, parent=_current_tracker.get())
+    token = _current_tracker.set(tracker)
+    try:
+        yield tracker
+    finally:
+        _current_tracker.reset(token)
+
+
+def instrument_query_shapes(engine: Engine) -> None:
+    """
+    Hook a (sync) engine so its statements are recorded by the current tracker.
+    """
+    if QUERY_DETECTOR == "off":
+        return
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _record(conn, cursor, statement, parameters, context, executemany):
+        tracker = _current_tracker.get()
+        if tracker is not None:
+            tracker.record(normalize_statement(statement))
+
+
+class QueryDetectorMiddleware:
+    """
+    Pure ASGI middleware that gives every HTTP request its own tracker.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        with track_queries(f"{scope['method']} {scope['path']}"):
+            await self.app(scope, receive, send)
+
+
+def _check_budget(tracker: QueryTracker, max_statements: int) -> None:
+    if tracker.total > max_statements:
+        tracker.report(f"Query budget of {max_statements} exceeded: {tracker.summary()}")
+
+
+def query_budget(max_statements: int):
+    """
+    Declare how many statements an endpoint may issue (dependencies not included).
+    Checked only when QUERY_DETECTOR is not "off"; works on sync and async endpoints.
+    """
+    def decorator(fn):
+        label = f"{fn.__module__}.{fn.__name__}"
+
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                if QUERY_DETECTOR == "off":
+                    return await fn(*args, **kwargs)
+                with track_queries(label) as tracker:
+                    result = await fn(*args, **kwargs)
+                _check_budget(tracker, max_statements)
+                return result
+            async_wrapper.query_budget = max_statements
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if QUERY_DETECTOR == "off":
+                return fn(*args, **kwargs)
+            with track_queries(label) as tracker:
+                result = fn(*args, **kwargs)
+            _check_budget(tracker, max_statements)
+            return result
+        wrapper.query_budget = max_statements
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def assert_max_queries(max_statements: int, max_repeats: int = QUERY_REPEAT_LIMIT) -> Iterator[QueryTracker]:
+    """
+    Test helper: fail with AssertionError if the block issues more than `max_statements`
+    statements, or any shape more than `max_repeats` times. Counts on both engines
+    regardless of context, so it also sees requests made through TestClient, which runs
+    the app in another thread.
+    """
+    # Imported here: app.database imports this module
+    from app.database import async_engine, engine
+
+    tracker = QueryTracker("assert_max_queries", mode="collect", repeat_limit=max_repeats)
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        tracker.record(normalize_statement(statement))
+
+    engines = [engine, async_engine.sync_engine]
+    for target in engines:
+        event.listen(target, "before_cursor_execute", record)
+    try:
+        yield tracker
+    finally:
+        for target in engines:
+            event.remove(target, "before_cursor_execute", record)
+
+    if tracker.total > max_statements:
+        raise AssertionError(f"Expected at most {max_statements} statements, got {tracker.summary()}")
+    if tracker.repeated():
+        raise AssertionError(f"Statements repeated more than {max_repeats} times: {tracker.summary()}")
+
+
+def _add_raiseload(orm_execute_state) -> None:
+    # Explicit eager-load options on a query still win over the wildcard
+    if orm_execute_state.is_select and not orm_execute_state.is_column_load and not orm_execute_state.is_relationship_load:
+        orm_execute_state.statement = orm_execute_state.statement.options(raiseload("*"))
+
+
+def enable_raiseload() -> None:
+    """
+    Make lazy relationship loads raise for every Session (test runs).
+    """
+    if not event.contains(Session, "do_orm_execute", _add_raiseload):
+        event.listen(Session, "do_orm_execute", _add_raiseload)
+
+
+if QUERY_DETECTOR_RAISELOAD:
+    enable_raiseload()
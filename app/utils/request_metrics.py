@@ -0,0 +1,255 @@
+# app/utils/request_metrics.py
+#
+# Per-route request metrics in Prometheus text format, served on /metrics.
+#
+# MetricsMiddleware (pure ASGI) times each HTTP request and labels it with the route
+# template, e.g. /classes/{class_id}, never the raw path. The engine hooks installed by
+# `instrument_queries` add the statements, DB time and rows of the request that is
+# running in the current context. Everything is in-process counters behind one lock,
+# so the cost per request is a few dictionary updates.
+#
+# Rows are the driver's rowcount: Postgres reports it for SELECTs, SQLite only for
+# INSERT/UPDATE/DELETE.
+
+from bisect import bisect_left
+from contextvars import ContextVar
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from typing import Dict, List, Optional, Tuple
+import os
+import threading
+import time
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") != "0"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+# Label for requests that matched no route (404s, static files), to bound cardinality
+UNMATCHED_ROUTE = "<unmatched>"
+# Label for statements issued outside a request (startup, CLIs, background tasks)
+NO_ROUTE = "<none>"
+
+
+class RequestStats:
+    __slots__ = ("statements", "db_seconds", "rows", "scope")
+
+    def __init__(self, scope: Optional[dict] = None):
+        self.statements = 0
+        self.db_seconds = 0.0
+        self.rows = 0
+        self.scope = scope
+
+
+current_request: ContextVar[Optional[RequestStats]] = ContextVar("current_request", default=None)
+
+
+def route_label(scope: dict) -> str:
+    # The router stores the matched route in the (shared) scope
+    return getattr(scope.get("route"), "path", None) or UNMATCHED_ROUTE
+
+
+def current_route() -> Optional[str]:
+    """
+    "METHOD /route/template" of the request running in this context, if any.
+    """
+    stats = current_request.get()
+    if stats is None or stats.scope is None:
+        return None
+    return f"{stats.scope['method']} {route_label(stats.scope)}"
+
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "total", "count")
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        index = bisect_left(self.buckets, value)
+        if index < len(self.counts):
+            self.counts[index] += 1
+        self.total += value
+        self.count += 1
+
+    def cumulative(self) -> List[int]:
+        running = 0
+        result = []
+        for count in self.counts:
+            running += count
+            result.append(running)
+        return result
+
+
+class RouteMetrics:
+    __slots__ = ("latency", "db_latency", "statements", "statuses", "rows")
+
+    def __init__(self):
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.db_latency = Histogram(LATENCY_BUCKETS)
+        self.statements = Histogram(STATEMENT_BUCKETS)
+        self.statuses: Dict[int, int] = {}
+        self.rows = 0
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._routes: Dict[Tuple[str, str], RouteMetrics] = {}
+        self._background = RequestStats()
+        self.started = time.time()
+
+    def record_request(self, method: str, route: str, status: int, seconds: float, stats: RequestStats) -> None:
+        with self._lock:
+            metrics = self._routes.get((method, route))
+            if metrics is None:
+                metrics = self._routes[(method, route)] = RouteMetrics()
+            metrics.latency.observe(seconds)
+            metrics.db_latency.observe(stats.db_seconds)
+            metrics.statements.observe(stats.statements)
+            metrics.statuses[status] = metrics.statuses.get(status, 0) + 1
+            metrics.rows += stats.rows
+
+    def record_background_statement(self, seconds: float, rows: int) -> None:
+        with self._lock:
+            self._background.statements += 1
+            self._background.db_seconds += seconds
+            self._background.rows += rows
+
+    def render(self) -> str:
+        """
+        All metrics in the Prometheus text exposition format (version 0.0.4).
+        """
+        # Imported here: app.utils.logging_setup imports this module
+        from app.utils.logging_setup import dropped_records
+
+        with self._lock:
+            routes = sorted(self._routes.items())
+            lines = []
+
+            def histogram(name: str, help_text: str, pick) -> None:
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} histogram")
+                for (method, route), metrics in routes:
+                    hist = pick(metrics)
+                    labels = f'method="{method}",route="{_escape(route)}"'
+                    for bound, count in zip(hist.buckets, hist.cumulative()):
+                        lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {count}')
+                    lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {hist.count}')
+                    lines.append(f"{name}_sum{{{labels}}} {hist.total:.6f}")
+                    lines.append(f"{name}_count{{{labels}}} {hist.count}")
+
+            histogram("klasstra_http_request_duration_seconds", "Request latency by route.", lambda m: m.latency)
+            histogram("klasstra_http_request_db_seconds", "Time spent in SQL statements per request.", lambda m: m.db_latency)
+            histogram("klasstra_http_request_db_statements", "SQL statements per request.", lambda m: m.statements)
+
+            lines.append("# HELP klasstra_http_responses_total Responses by route and status code.")
+            lines.append("# TYPE klasstra_http_responses_total counter")
+            for (method, route), metrics in routes:
+                for status, count in sorted(metrics.statuses.items()):
+                    lines.append(
+                        f'klasstra_http_responses_total{{method="{method}",route="{_escape(route)}",status="{status}"}} {count}'
+                    )
+
+            lines.append("# HELP klasstra_db_rows_total Rows reported by the driver, by route.")
+            lines.append("# TYPE klasstra_db_rows_total counter")
+            for (method, route), metrics in routes:
+                lines.append(f'klasstra_db_rows_total{{method="{method}",route="{_escape(route)}"}} {metrics.rows}')
+            lines.append(f'klasstra_db_rows_total{{method="",route="{NO_ROUTE}"}} {self._background.rows}')
+
+            lines.append("# HELP klasstra_db_statements_outside_requests_total SQL statements issued outside a request.")
+            lines.append("# TYPE klasstra_db_statements_outside_requests_total counter")
+            lines.append(f"klasstra_db_statements_outside_requests_total {self._background.statements}")
+            lines.append("# HELP klasstra_db_seconds_outside_requests_total Time spent in SQL statements outside a request.")
+            lines.append("# TYPE klasstra_db_seconds_outside_requests_total counter")
+            lines.append(f"klasstra_db_seconds_outside_requests_total {self._background.db_seconds:.6f}")
+
+            lines.append("# HELP klasstra_log_records_dropped_total Log records dropped because the logging queue was full.")
+            lines.append("# TYPE klasstra_log_records_dropped_total counter")
+            lines.append(f"klasstra_log_records_dropped_total {dropped_records()}")
+
+            lines.append("# HELP klasstra_process_start_time_seconds Start time of this worker, Unix seconds.")
+            lines.append("# TYPE klasstra_process_start_time_seconds gauge")
+            lines.append(f"klasstra_process_start_time_seconds {self.started:.3f}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+metrics_registry = MetricsRegistry()
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware (no BaseHTTPMiddleware), so streaming responses pass
+    through untouched. Latency runs until the last body chunk has been sent.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not METRICS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats(scope)
+        token = current_request.set(stats)
+        status_code = 500
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            current_request.reset(token)
+            metrics_registry.record_request(
+                scope["method"],
+                route_label(scope),
+                status_code,
+                time.perf_counter() - start,
+                stats,
+            )
+
+
+def instrument_queries(engine: Engine) -> None:
+    """
+    Hook a (sync) engine so its statements count towards the current request.
+    """
+    if not METRICS_ENABLED:
+        return
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _start(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("metrics_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _finish(conn, cursor, statement, parameters, context, executemany):
+        seconds = time.perf_counter() - conn.info["metrics_start"].pop()
+        rows = max(cursor.rowcount, 0) if cursor is not None else 0
+        stats = current_request.get()
+        if stats is None:
+            metrics_registry.record_background_statement(seconds, rows)
+            return
+        stats.statements += 1
+        stats.db_seconds += seconds
+        stats.rows += rows
+
+    @event.listens_for(engine, "handle_error")
+    def _failed(exception_context):
+        # after_cursor_execute does not run for failed statements
+        connection = exception_context.connection
+        # The statement got as far as the cursor if it has an execution context
+        # (ExceptionContext.cursor is declared but never set by SQLAlchemy 2.0)
+        if exception_context.execution_context is not None and connection is not None and connection.info.get("metrics_start"):
+            connection.info["metrics_start"].pop()
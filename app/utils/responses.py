@@ -0,0 +1,27 @@
+# app/utils/responses.py
+#
+# Response helpers for hot endpoints. FastAPI's default path validates the returned
+# object against `response_model`, converts it with jsonable_encoder and then runs
+# json.dumps; typed_response checks the payload with a prebuilt TypeAdapter and
+# renders it with orjson in one call.
+
+from fastapi.responses import ORJSONResponse
+from pydantic import TypeAdapter
+from typing import Any
+import os
+
+# Check payloads against their response model before sending them ("0" to skip)
+RESPONSE_VALIDATION = os.getenv("RESPONSE_VALIDATION", "1") != "0"
+
+
+def typed_response(adapter: TypeAdapter, content: Any, status_code: int = 200) -> ORJSONResponse:
+    """
+    Send `content` (JSON-native dicts and lists, as produced by the serializers and
+    the announcement cache) after validating it with `adapter`.
+
+    The validated model is only used as a check: rendering the original content with
+    orjson is several times cheaper than `adapter.dump_json` on the model.
+    """
+    if RESPONSE_VALIDATION:
+        adapter.validate_python(content)
+    return ORJSONResponse(content, status_code=status_code)
@@ -0,0 +1,486 @@
+# roster_import.py
+#
+# Bulk roster import: schools, classes, students and parent links from a CSV or NDJSON file.
+# Rows are validated while streaming, loaded in batches into temporary staging tables and
+# merged into the real tables with a handful of set-based statements, in one transaction.
+#
+# One row per (student, parent) pair; a student with two parents appears on two rows.
+# Rows without a student_ref but with a teacher_email assign a teacher to the class.
+# Students are matched on school and `student_ref` (the school's own identifier, stored
+# as students.external_id next to students.school_id), schools on name, classes on
+# (school, name), parents and teachers on email. Parents and teachers must already
+# have an account; unknown emails are reported per row.
+#
+# Usage: python -m app.utils.roster_import roster.csv [--format ndjson] [--dry-run]
+
+import argparse
+import csv
+import io
+import json
+import os
+import re
+import sys
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import (
+    Column,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    and_,
+    delete,
+    exists,
+    func,
+    insert,
+    or_,
+    select,
+    update,
+)
+from sqlalchemy.orm import Session
+from app.models import (
+    Announcement,
+    Class,
+    ParentStudent,
+    School,
+    Student,
+    User,
+    UserInbox,
+    announcement_recipients,
+    teacher_class,
+)
+from app.utils.db_utils import insert_ignore
+from app.utils.inbox_utils import INBOX_COLUMNS
+from app.utils.announcement_cache import mark_users_changed
+from app.utils.catalog import mark_catalog_changed
+
+# Rows written to the staging table per executemany
+ROSTER_BATCH_SIZE = int(os.getenv("ROSTER_BATCH_SIZE", "1000"))
+# Row errors included in the report (all of them are counted)
+ROSTER_MAX_ERRORS = int(os.getenv("ROSTER_MAX_ERRORS", "1000"))
+
+ROSTER_FIELDS = [
+    "student_ref",
+    "first_name",
+    "last_name",
+    "school_name",
+    "school_address",
+    "class_name",
+    "parent_email",
+    "relationship_type",
+    "teacher_email",
+]
+REQUIRED_FIELDS = ["student_ref", "first_name", "last_name", "school_name", "class_name"]
+TEACHER_REQUIRED_FIELDS = ["teacher_email", "school_name", "class_name"]
+HEADER_FIELDS = ["school_name", "class_name"]
+MAX_FIELD_LENGTH = 255
+EMAIL_PATTERN = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
+PARENT_ROLES = ["parent", "class_representative"]
+
+# Staging tables live in their own metadata so create_all never creates them
+staging_metadata = MetaData()
+
+roster_rows = Table(
+    "roster_rows",
+    staging_metadata,
+    Column("line", Integer, primary_key=True),
+    *[Column(field, String) for field in ROSTER_FIELDS],
+    prefixes=["TEMPORARY"],
+)
+
+# One row per student (the last roster row of its school wins), with the class resolved
+roster_students = Table(
+    "roster_students",
+    staging_metadata,
+    Column("school_id", Integer, primary_key=True),
+    Column("student_ref", String, primary_key=True),
+    Column("first_name", String),
+    Column("last_name", String),
+    Column("class_id", Integer),
+    prefixes=["TEMPORARY"],
+)
+
+# Existing students changing class
+roster_moves = Table(
+    "roster_moves",
+    staging_metadata,
+    Column("student_id", Integer, primary_key=True),
+    Column("old_class_id", Integer),
+    Column("new_class_id", Integer),
+    prefixes=["TEMPORARY"],
+)
+
+# Parent links that do not exist yet
+roster_links = Table(
+    "roster_links",
+    staging_metadata,
+    Column("parent_id", Integer, primary_key=True),
+    Column("student_id", Integer, primary_key=True),
+    Column("relationship_type", String),
+    prefixes=["TEMPORARY"],
+)
+
+
+def detect_format(filename: Optional[str]) -> str:
+    if filename and filename.lower().endswith((".ndjson", ".jsonl")):
+        return "ndjson"
+    return "csv"
+
+
+def iter_roster(stream: BinaryIO, fmt: str) -> Iterator[Tuple[int, Optional[Dict[str, Any]], Optional[str]]]:
+    """
+    Yield (line number, record, parse error) for each row of a binary stream.
+    """
+    text_stream = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    if fmt == "csv":
+        reader = csv.DictReader(text_stream)
+        missing = [field for field in HEADER_FIELDS if field not in (reader.fieldnames or [])]
+        if missing:
+            yield 1, None, f"Missing columns: {', '.join(missing)}"
+            return
+        for record in reader:
+            yield reader.line_num, record, None
+    elif fmt == "ndjson":
+        for line_number, line in enumerate(text_stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                yield line_number, None, f"Invalid JSON: {e.msg}"
+                continue
+            if not isinstance(record, dict):
+                yield line_number, None, "Expected a JSON object"
+                continue
+            yield line_number, record, None
+    else:
+        raise ValueError(f"Unsupported roster format '{fmt}'")
+
+
+def validate_record(record: Dict[str, Any]) -> Tuple[Optional[Dict[str, Optional[str]]], List[str]]:
+    """
+    Normalize one roster record. Returns (clean record, []) or (None, errors).
+    """
+    clean = {}
+    errors = []
+    for field in ROSTER_FIELDS:
+        value = record.get(field)
+        value = str(value).strip() if value is not None else ""
+        if len(value) > MAX_FIELD_LENGTH:
+            errors.append(f"{field} is longer than {MAX_FIELD_LENGTH} characters")
+        clean[field] = value or None
+
+    if is_teacher_row(clean):
+        required = TEACHER_REQUIRED_FIELDS
+        clean["parent_email"] = clean["relationship_type"] = None
+    else:
+        required = REQUIRED_FIELDS
+        clean["teacher_email"] = None
+    errors += [f"{field} is required" for field in required if not clean[field]]
+    for field in ("parent_email", "teacher_email"):
+        if clean[field]:
+            clean[field] = clean[field].lower()
+            if not EMAIL_PATTERN.match(clean[field]):
+                errors.append(f"{field} is not a valid email address")
+    return (None, errors) if errors else (clean, [])
+
+
+def is_teacher_row(record: Dict[str, Optional[str]]) -> bool:
+    return not record["student_ref"] and bool(record["teacher_email"])
+
+
+class RosterReport:
+    def __init__(self):
+        self.rows = 0
+        self.error_count = 0
+        self.errors: List[Dict[str, Any]] = []
+        self.counts: Dict[str, int] = {}
+
+    def add_error(self, line: int, messages: List[str]) -> None:
+        self.error_count += 1
+        if len(self.errors) < ROSTER_MAX_ERRORS:
+            self.errors.append({"line": line, "errors": messages})
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "rows": self.rows,
+            **self.counts,
+            "error_count": self.error_count,
+            "errors": sorted(self.errors, key=lambda error: error["line"]),
+        }
+
+
+def stage_roster(db: Session, stream: BinaryIO, fmt: str, report: RosterReport) -> None:
+    """
+    Validate rows while streaming and load the valid ones into roster_rows in batches.
+    """
+    batch = []
+    for line, record, parse_error in iter_roster(stream, fmt):
+        report.rows += 1
+        if parse_error:
+            report.add_error(line, [parse_error])
+            continue
+        clean, errors = validate_record(record)
+        if errors:
+            report.add_error(line, errors)
+            continue
+        batch.append({"line": line, **clean})
+        if len(batch) >= ROSTER_BATCH_SIZE:
+            db.execute(insert(roster_rows), batch)
+            batch = []
+    if batch:
+        db.execute(insert(roster_rows), batch)
+
+
+def merge_roster(db: Session, report: RosterReport) -> None:
+    """
+    Merge the staged rows into schools, classes, students, parent_student and teacher_class.
+    """
+    r = roster_rows
+
+    # Schools, by unique name
+    school_rows = select(r.c.school_name, func.max(r.c.school_address)).group_by(r.c.school_name)
+    report.counts["schools_created"] = db.execute(
+        insert_ignore(db, School.__table__).from_select(["name", "address"], school_rows)
+    ).rowcount
+
+    # Classes, by (school, name)
+    class_exists = exists().where(and_(Class.school_id == School.id, Class.name == r.c.class_name))
+    class_rows = (
+        select(r.c.class_name, School.id)
+        .select_from(r)
+        .join(School, School.name == r.c.school_name)
+        .where(~class_exists)
+        .distinct()
+    )
+    report.counts["classes_created"] = db.execute(
+        insert(Class).from_select(["name", "school_id"], class_rows)
+    ).rowcount
+    if report.counts["schools_created"] or report.counts["classes_created"]:
+        mark_catalog_changed(db)
+
+    # One row per student, taken from its last roster row within its school
+    r2 = r.alias("r2")
+    last_line = (
+        select(func.max(r2.c.line))
+        .where(r2.c.school_name == r.c.school_name, r2.c.student_ref == r.c.student_ref)
+        .scalar_subquery()
+    )
+    db.execute(
+        insert(roster_students).from_select(
+            ["school_id", "student_ref", "first_name", "last_name", "class_id"],
+            select(School.id, r.c.student_ref, r.c.first_name, r.c.last_name, func.min(Class.id))
+            .select_from(r)
+            .join(School, School.name == r.c.school_name)
+            .join(Class, and_(Class.school_id == School.id, Class.name == r.c.class_name))
+            .where(r.c.student_ref.isnot(None), r.c.line == last_line)
+            .group_by(School.id, r.c.student_ref, r.c.first_name, r.c.last_name)
+        )
+    )
+
+    s = roster_students
+    same_student = and_(s.c.school_id == Student.school_id, s.c.student_ref == Student.external_id)
+    # Students changing class: their parents' inboxes follow the move
+    db.execute(
+        insert(roster_moves).from_select(
+            ["student_id", "old_class_id", "new_class_id"],
+            select(Student.id, Student.class_id, s.c.class_id)
+            .join(s, same_student)
+            .where(Student.class_id != s.c.class_id)
+        )
+    )
+
+    def staged(column):
+        return select(column).where(same_student).scalar_subquery()
+
+    changed = exists().where(
+        and_(
+            same_student,
+            or_(
+                s.c.first_name != Student.first_name,
+                s.c.last_name != Student.last_name,
+                s.c.class_id != Student.class_id,
+            )
+        )
+    )
+    report.counts["students_updated"] = db.execute(
+        update(Student)
+        .where(changed)
+        .values(first_name=staged(s.c.first_name), last_name=staged(s.c.last_name), class_id=staged(s.c.class_id))
+        .execution_options(synchronize_session=False)
+    ).rowcount
+
+    report.counts["students_created"] = db.execute(
+        insert(Student).from_select(
+            ["school_id", "external_id", "first_name", "last_name", "class_id"],
+            select(s.c.school_id, s.c.student_ref, s.c.first_name, s.c.last_name, s.c.class_id)
+            .where(~exists().where(same_student))
+        )
+    ).rowcount
+
+    # Parent links that are new
+    link_exists = exists().where(and_(ParentStudent.parent_id == User.id, ParentStudent.student_id == Student.id))
+    db.execute(
+        insert(roster_links).from_select(
+            ["parent_id", "student_id", "relationship_type"],
+            select(User.id, Student.id, func.max(r.c.relationship_type))
+            .select_from(r)
+            .join(User, and_(func.lower(User.email) == r.c.parent_email, User.role.in_(PARENT_ROLES)))
+            .join(School, School.name == r.c.school_name)
+            .join(Student, and_(Student.school_id == School.id, Student.external_id == r.c.student_ref))
+            .where(~link_exists)
+            .group_by(User.id, Student.id)
+        )
+    )
+    l = roster_links
+    report.counts["links_created"] = db.execute(
+        insert(ParentStudent).from_select(
+            ["parent_id", "student_id", "relationship_type"],
+            select(l.c.parent_id, l.c.student_id, l.c.relationship_type)
+        )
+    ).rowcount
+
+    # New links receive the class-wide announcements of the child's class
+    has_recipients = exists().where(announcement_recipients.c.announcement_id == Announcement.id)
+    db.execute(
+        insert_ignore(db, UserInbox.__table__).from_select(
+            INBOX_COLUMNS,
+            select(l.c.parent_id, Announcement.id, Announcement.created_at)
+            .select_from(l)
+            .join(Student, Student.id == l.c.student_id)
+            .join(Announcement, Announcement.class_id == Student.class_id)
+            .where(~has_recipients)
+            .distinct()
+        )
+    )
+    mark_users_changed(db, db.execute(select(l.c.parent_id).distinct()).scalars().all())
+
+    # Parents of moved students receive the new class's class-wide announcements...
+    m = roster_moves
+    db.execute(
+        insert_ignore(db, UserInbox.__table__).from_select(
+            INBOX_COLUMNS,
+            select(ParentStudent.parent_id, Announcement.id, Announcement.created_at)
+            .select_from(m)
+            .join(ParentStudent, ParentStudent.student_id == m.c.student_id)
+            .join(Announcement, Announcement.class_id == m.c.new_class_id)
+            .where(~has_recipients)
+            .distinct()
+        )
+    )
+    # ...and lose the old class's, unless another of their children is still in it
+    moved_parent = (
+        select(ParentStudent.parent_id)
+        .join(m, m.c.student_id == ParentStudent.student_id)
+        .where(ParentStudent.parent_id == UserInbox.user_id, m.c.old_class_id == Announcement.class_id)
+        .correlate(UserInbox, Announcement)
+    )
+    still_in_class = (
+        select(ParentStudent.parent_id)
+        .join(Student, Student.id == ParentStudent.student_id)
+        .where(ParentStudent.parent_id == UserInbox.user_id, Student.class_id == Announcement.class_id)
+        .correlate(UserInbox, Announcement)
+    )
+    left_class_wide = (
+        select(Announcement.id)
+        .where(
+            Announcement.id == UserInbox.announcement_id,
+            ~has_recipients,
+            moved_parent.exists(),
+            ~still_in_class.exists(),
+        )
+    )
+    db.execute(
+        delete(UserInbox)
+        .where(left_class_wide.exists())
+        .execution_options(synchronize_session=False)
+    )
+    mark_users_changed(db, db.execute(
+        select(ParentStudent.parent_id).join(m, m.c.student_id == ParentStudent.student_id).distinct()
+    ).scalars().all())
+
+    # Teacher assignments that are new
+    teacher_link_exists = exists().where(
+        and_(teacher_class.c.teacher_id == User.id, teacher_class.c.class_id == Class.id)
+    )
+    report.counts["teacher_links_created"] = db.execute(
+        insert(teacher_class).from_select(
+            ["teacher_id", "class_id"],
+            select(User.id, Class.id)
+            .select_from(r)
+            .join(User, and_(func.lower(User.email) == r.c.teacher_email, User.role == "teacher"))
+            .join(School, School.name == r.c.school_name)
+            .join(Class, and_(Class.school_id == School.id, Class.name == r.c.class_name))
+            .where(~teacher_link_exists)
+            .distinct()
+        )
+    ).rowcount
+
+    # Rows whose parent or teacher could not be linked
+    unknown_parents = db.execute(
+        select(r.c.line, r.c.parent_email)
+        .where(
+            r.c.parent_email.isnot(None),
+            ~exists().where(and_(func.lower(User.email) == r.c.parent_email, User.role.in_(PARENT_ROLES)))
+        )
+    ).all()
+    for line, email in unknown_parents:
+        report.add_error(line, [f"No parent account with email {email}; student imported without this link"])
+
+    unknown_teachers = db.execute(
+        select(r.c.line, r.c.teacher_email)
+        .where(
+            r.c.teacher_email.isnot(None),
+            ~exists().where(and_(func.lower(User.email) == r.c.teacher_email, User.role == "teacher"))
+        )
+    ).all()
+    for line, email in unknown_teachers:
+        report.add_error(line, [f"No teacher account with email {email}"])
+
+
+def import_roster(db: Session, stream: BinaryIO, fmt: str = "csv", dry_run: bool = False) -> Dict[str, Any]:
+    """
+    Import a roster in one transaction and return the report.
+    With `dry_run` everything is validated and merged, then rolled back.
+    """
+    report = RosterReport()
+    try:
+        connection = db.connection()
+        for table in staging_metadata.sorted_tables:
+            table.drop(connection, checkfirst=True)
+            table.create(connection)
+        stage_roster(db, stream, fmt, report)
+        merge_roster(db, report)
+        if dry_run:
+            db.rollback()
+        else:
+            db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        # Temporary tables outlive the transaction on pooled connections
+        connection = db.connection()
+        for table in reversed(staging_metadata.sorted_tables):
+            table.drop(connection, checkfirst=True)
+        db.commit()
+
+    result = report.as_dict()
+    result["dry_run"] = dry_run
+    return result
+
+
+if __name__ == "__main__":
+    from app.database import engine
+
+    parser = argparse.ArgumentParser(description="Import a school roster (CSV or NDJSON).")
+    parser.add_argument("path", help="Roster file")
+    parser.add_argument("--format", choices=["csv", "ndjson"], help="Defaults to the file extension")
+    parser.add_argument("--dry-run", action="store_true", help="Validate and report without writing")
+    args = parser.parse_args()
+
+    with open(args.path, "rb") as f, Session(bind=engine) as session:
+        result = import_roster(session, f, fmt=args.format or detect_format(args.path), dry_run=args.dry_run)
+    json.dump(result, sys.stdout, indent=2)
+    print()
+    sys.exit(1 if result["error_count"] else 0)
@@ -0,0 +1,399 @@
+# roster_sync.py
+#
+# Incremental roster sync: a school re-sends its full roster and only the records that
+# differ from the previous sync of the same source are applied.
+#
+# Every roster row is split into records (a student, a parent link, a teacher assignment),
+# each identified by a key and fingerprinted by a hash of its values. The hashes of the
+# last sync are kept in roster_fingerprints; comparing them gives the changeset of added,
+# changed and removed records, which is applied to students, parent_student and
+# teacher_class in one transaction. Unchanged records are not touched.
+# Student refs are only unique within a school, so student and parent keys carry the
+# school name.
+#
+# Same file format as roster_import.
+# Usage: python -m app.utils.roster_sync roster.csv --source north-elementary [--dry-run]
+
+import argparse
+import hashlib
+import json
+import sys
+from collections import defaultdict
+from typing import Any, BinaryIO, Dict, List, Set, Tuple
+
+from sqlalchemy import and_, delete, func, insert, select, tuple_, update
+from sqlalchemy.orm import Session
+from app.models import Class, ParentStudent, RosterFingerprint, School, Student, User, teacher_class
+from app.utils.db_utils import insert_ignore
+from app.utils.catalog import mark_catalog_changed
+from app.utils.inbox_utils import (
+    add_parent_to_class_inbox,
+    add_parents_to_class_inboxes,
+    remove_parent_from_class_inbox,
+)
+from app.utils.roster_import import (
+    PARENT_ROLES,
+    RosterReport,
+    detect_format,
+    is_teacher_row,
+    iter_roster,
+    validate_record,
+)
+
+# Keys per IN (...) lookup
+LOOKUP_CHUNK_SIZE = 500
+
+
+def record_key(*parts: str) -> str:
+    return json.dumps(parts)
+
+
+def fingerprint(values: Dict[str, Any]) -> str:
+    return hashlib.sha256(json.dumps(values, sort_keys=True).encode()).hexdigest()
+
+
+def collect_records(stream: BinaryIO, fmt: str, report: RosterReport) -> Tuple[Dict[str, Dict[str, Any]], Dict[str, int]]:
+    """
+    Split the roster into records keyed by record_key. Returns (records, line of each record).
+    For students appearing on several rows the last row wins.
+    """
+    records = {}
+    lines = {}
+    for line, raw, parse_error in iter_roster(stream, fmt):
+        report.rows += 1
+        if parse_error:
+            report.add_error(line, [parse_error])
+            continue
+        row, errors = validate_record(raw)
+        if errors:
+            report.add_error(line, errors)
+            continue
+
+        if is_teacher_row(row):
+            key = record_key("teacher", row["school_name"], row["class_name"], row["teacher_email"])
+            records[key] = {}
+            lines[key] = line
+            continue
+
+        key = record_key("student", row["school_name"], row["student_ref"])
+        records[key] = {
+            "first_name": row["first_name"],
+            "last_name": row["last_name"],
+            "school_name": row["school_name"],
+            "school_address": row["school_address"],
+            "class_name": row["class_name"],
+        }
+        lines[key] = line
+        if row["parent_email"]:
+            key = record_key("parent", row["school_name"], row["student_ref"], row["parent_email"])
+            records[key] = {"relationship_type": row["relationship_type"]}
+            lines[key] = line
+    return records, lines
+
+
+def _chunks(values: List[Any]):
+    for start in range(0, len(values), LOOKUP_CHUNK_SIZE):
+        yield values[start:start + LOOKUP_CHUNK_SIZE]
+
+
+def _students_by_ref(db: Session, refs: Set[Tuple[str, str]]) -> Dict[Tuple[str, str], Tuple[int, str, str, int]]:
+    """
+    Map (school_name, student_ref) pairs to (id, first_name, last_name, class_id).
+    """
+    found = {}
+    for chunk in _chunks(sorted(refs)):
+        for row in db.execute(
+            select(School.name, Student.external_id, Student.id, Student.first_name, Student.last_name, Student.class_id)
+            .join(School, School.id == Student.school_id)
+            .where(tuple_(School.name, Student.external_id).in_(chunk))
+        ):
+            found[(row[0], row[1])] = tuple(row[2:])
+    return found
+
+
+def _users_by_email(db: Session, emails: Set[str], roles: List[str]) -> Dict[str, int]:
+    found = {}
+    for chunk in _chunks(sorted(emails)):
+        for email, user_id in db.execute(
+            select(func.lower(User.email), User.id)
+            .where(func.lower(User.email).in_(chunk), User.role.in_(roles))
+        ):
+            found[email] = user_id
+    return found
+
+
+def _resolve_classes(db: Session, classes: Dict[Tuple[str, str], Any]) -> Dict[Tuple[str, str], int]:
+    """
+    Map (school_name, class_name) to class ids, creating missing schools and classes.
+    `classes` maps each pair to the school address to use for a new school.
+    """
+    if not classes:
+        return {}
+    school_names = sorted({school for school, _ in classes})
+
+    def lookup():
+        return {
+            (school, name): class_id
+            for school, name, class_id in db.execute(
+                select(School.name, Class.name, func.min(Class.id))
+                .join(Class, Class.school_id == School.id)
+                .where(School.name.in_(school_names))
+                .group_by(School.name, Class.name)
+            )
+        }
+
+    found = lookup()
+    missing = [pair for pair in classes if pair not in found]
+    if missing:
+        db.execute(
+            insert_ignore(db, School.__table__),
+            [{"name": school, "address": classes[(school, name)]} for school, name in missing]
+        )
+        school_ids = dict(db.execute(select(School.name, School.id).where(School.name.in_(school_names))).all())
+        db.execute(insert(Class), [{"name": name, "school_id": school_ids[school]} for school, name in set(missing)])
+        mark_catalog_changed(db)
+        found = lookup()
+    return found
+
+
+def apply_changeset(
+    db: Session,
+    records: Dict[str, Dict[str, Any]],
+    upserts: List[str],
+    removals: List[str],
+    lines: Dict[str, int],
+    report: RosterReport
+) -> Set[str]:
+    """
+    Apply added/changed records (`upserts`) and removed records (`removals`).
+    Returns the upserted keys that were applied; the others are reported as errors.
+    """
+    counts = report.counts
+    applied = set()
+    keyed = defaultdict(list)
+    for key in upserts:
+        keyed[json.loads(key)[0]].append(key)
+    removed = defaultdict(list)
+    for key in removals:
+        removed[json.loads(key)[0]].append(json.loads(key)[1:])
+
+    refs = {tuple(parts[:2]) for parts in removed["student"] + removed["parent"]}
+    refs |= {tuple(json.loads(key)[1:3]) for key in keyed["student"] + keyed["parent"]}
+    students = _students_by_ref(db, refs)
+    parent_emails = {parts[2] for parts in removed["parent"]} | {json.loads(key)[3] for key in keyed["parent"]}
+    parents = _users_by_email(db, parent_emails, PARENT_ROLES)
+    teacher_emails = {parts[2] for parts in removed["teacher"]} | {json.loads(key)[3] for key in keyed["teacher"]}
+    teachers = _users_by_email(db, teacher_emails, ["teacher"])
+
+    # Removed parent links
+    for school, student_ref, email in removed["parent"]:
+        ref = (school, student_ref)
+        if ref in students and email in parents:
+            student_id, _, _, class_id = students[ref]
+            deleted = db.execute(
+                delete(ParentStudent)
+                .where(ParentStudent.parent_id == parents[email], ParentStudent.student_id == student_id)
+            ).rowcount
+            if deleted:
+                remove_parent_from_class_inbox(db, parents[email], class_id)
+                counts["parent_links_removed"] += 1
+
+    # Removed students, with their remaining parent links
+    for school, student_ref in removed["student"]:
+        ref = (school, student_ref)
+        if ref not in students:
+            continue
+        student_id, _, _, class_id = students.pop(ref)
+        parent_ids = db.execute(select(ParentStudent.parent_id).where(ParentStudent.student_id == student_id)).scalars().all()
+        db.execute(delete(ParentStudent).where(ParentStudent.student_id == student_id))
+        db.execute(delete(Student).where(Student.id == student_id))
+        for parent_id in parent_ids:
+            remove_parent_from_class_inbox(db, parent_id, class_id)
+        counts["students_removed"] += 1
+
+    # Added or changed students
+    class_ids = _resolve_classes(db, {
+        (records[key]["school_name"], records[key]["class_name"]): records[key]["school_address"]
+        for key in keyed["student"]
+    } | {
+        tuple(json.loads(key)[1:3]): None for key in keyed["teacher"]
+    })
+    school_ids = {}
+    if keyed["student"]:
+        school_ids = dict(db.execute(
+            select(School.name, School.id).where(School.name.in_(sorted({school for school, _ in class_ids})))
+        ).all())
+    new_students, changed_students, moved = [], [], []
+    for key in keyed["student"]:
+        ref = tuple(json.loads(key)[1:3])
+        values = records[key]
+        class_id = class_ids[(values["school_name"], values["class_name"])]
+        if ref not in students:
+            new_students.append({
+                "school_id": school_ids[values["school_name"]],
+                "external_id": ref[1],
+                "first_name": values["first_name"],
+                "last_name": values["last_name"],
+                "class_id": class_id,
+            })
+        else:
+            student_id, first_name, last_name, old_class_id = students[ref]
+            if (first_name, last_name, old_class_id) != (values["first_name"], values["last_name"], class_id):
+                changed_students.append({
+                    "id": student_id,
+                    "first_name": values["first_name"],
+                    "last_name": values["last_name"],
+                    "class_id": class_id,
+                })
+                if old_class_id != class_id:
+                    moved.append((student_id, old_class_id, class_id))
+                students[ref] = (student_id, values["first_name"], values["last_name"], class_id)
+        applied.add(key)
+    if new_students:
+        db.execute(insert(Student), new_students)
+        school_names = {school_id: school for school, school_id in school_ids.items()}
+        students.update(_students_by_ref(db, {
+            (school_names[row["school_id"]], row["external_id"]) for row in new_students
+        }))
+    if changed_students:
+        db.execute(update(Student), changed_students)
+    counts["students_added"] += len(new_students)
+    counts["students_updated"] += len(changed_students)
+
+    # Parents follow students that changed class
+    for student_id, old_class_id, new_class_id in moved:
+        for parent_id in db.execute(select(ParentStudent.parent_id).where(ParentStudent.student_id == student_id)).scalars():
+            add_parent_to_class_inbox(db, parent_id, new_class_id)
+            remove_parent_from_class_inbox(db, parent_id, old_class_id)
+
+    # Added or changed parent links
+    wanted = {}
+    for key in keyed["parent"]:
+        _, school, student_ref, email = json.loads(key)
+        ref = (school, student_ref)
+        if ref not in students:
+            report.add_error(lines[key], [f"Student {student_ref} was not imported; parent link skipped"])
+        elif email not in parents:
+            report.add_error(lines[key], [f"No parent account with email {email}; student imported without this link"])
+        else:
+            wanted[(parents[email], students[ref][0])] = (key, records[key]["relationship_type"])
+    existing = {}
+    for chunk in _chunks(sorted(wanted)):
+        for parent_id, student_id, relationship_type in db.execute(
+            select(ParentStudent.parent_id, ParentStudent.student_id, ParentStudent.relationship_type)
+            .where(tuple_(ParentStudent.parent_id, ParentStudent.student_id).in_(chunk))
+        ):
+            existing[(parent_id, student_id)] = relationship_type
+    new_links = [
+        {"parent_id": parent_id, "student_id": student_id, "relationship_type": relationship_type}
+        for (parent_id, student_id), (_, relationship_type) in wanted.items()
+        if (parent_id, student_id) not in existing
+    ]
+    changed_links = [
+        {"parent_id": parent_id, "student_id": student_id, "relationship_type": relationship_type}
+        for (parent_id, student_id), (_, relationship_type) in wanted.items()
+        if (parent_id, student_id) in existing and existing[(parent_id, student_id)] != relationship_type
+    ]
+    if new_links:
+        db.execute(insert(ParentStudent), new_links)
+        student_classes = {student_id: class_id for student_id, _, _, class_id in students.values()}
+        add_parents_to_class_inboxes(db, [(link["parent_id"], student_classes[link["student_id"]]) for link in new_links])
+    if changed_links:
+        db.execute(update(ParentStudent), changed_links)
+    counts["parent_links_added"] += len(new_links)
+    counts["parent_links_updated"] += len(changed_links)
+    applied.update(key for key, _ in wanted.values())
+
+    # Teacher assignments
+    for school, class_name, email in removed["teacher"]:
+        class_id = db.execute(
+            select(Class.id).join(School, School.id == Class.school_id)
+            .where(School.name == school, Class.name == class_name)
+        ).scalars().first()
+        if class_id is not None and email in teachers:
+            counts["teacher_links_removed"] += db.execute(
+                delete(teacher_class)
+                .where(and_(teacher_class.c.teacher_id == teachers[email], teacher_class.c.class_id == class_id))
+            ).rowcount
+    new_teacher_links = set()
+    for key in keyed["teacher"]:
+        _, school, class_name, email = json.loads(key)
+        if email not in teachers:
+            report.add_error(lines[key], [f"No teacher account with email {email}"])
+            continue
+        new_teacher_links.add((teachers[email], class_ids[(school, class_name)]))
+        applied.add(key)
+    if new_teacher_links:
+        counts["teacher_links_added"] += db.execute(
+            insert_ignore(db, teacher_class),
+            [{"teacher_id": teacher_id, "class_id": class_id} for teacher_id, class_id in new_teacher_links]
+        ).rowcount
+
+    return applied
+
+
+def sync_roster(db: Session, stream: BinaryIO, source: str, fmt: str = "csv", dry_run: bool = False) -> Dict[str, Any]:
+    """
+    Apply the difference between this roster and the previous sync of `source`,
+    in one transaction, and return the report. With `dry_run` nothing is written.
+    """
+    report = RosterReport()
+    report.counts = defaultdict(int)
+    records, lines = collect_records(stream, fmt, report)
+
+    stored = dict(db.execute(
+        select(RosterFingerprint.record_key, RosterFingerprint.fingerprint)
+        .where(RosterFingerprint.source == source)
+    ).all())
+    fingerprints = {key: fingerprint(values) for key, values in records.items()}
+    upserts = [key for key, value in fingerprints.items() if stored.get(key) != value]
+    removals = [key for key in stored if key not in fingerprints]
+
+    try:
+        applied = apply_changeset(db, records, upserts, removals, lines, report)
+
+        # Remember what was applied; failed records are retried on the next sync
+        done = removals + sorted(applied)
+        for chunk in _chunks(done):
+            db.execute(
+                delete(RosterFingerprint)
+                .where(RosterFingerprint.source == source, RosterFingerprint.record_key.in_(chunk))
+            )
+        if applied:
+            db.execute(insert(RosterFingerprint), [
+                {"source": source, "record_key": key, "fingerprint": fingerprints[key]}
+                for key in sorted(applied)
+            ])
+
+        if dry_run:
+            db.rollback()
+        else:
+            db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    result = report.as_dict()
+    result.update(
+        source=source,
+        unchanged=len(fingerprints) - len(upserts),
+        dry_run=dry_run,
+    )
+    return result
+
+
+if __name__ == "__main__":
+    from app.database import engine
+
+    parser = argparse.ArgumentParser(description="Sync a school roster, applying only what changed.")
+    parser.add_argument("path", help="Roster file")
+    parser.add_argument("--source", required=True, help="Name of the roster feed, e.g. the school")
+    parser.add_argument("--format", choices=["csv", "ndjson"], help="Defaults to the file extension")
+    parser.add_argument("--dry-run", action="store_true", help="Compute and report the changeset without writing")
+    args = parser.parse_args()
+
+    with open(args.path, "rb") as f, Session(bind=engine) as session:
+        result = sync_roster(session, f, args.source, fmt=args.format or detect_format(args.path), dry_run=args.dry_run)
+    json.dump(result, sys.stdout, indent=2)
+    print()
+    sys.exit(1 if result["error_count"] else 0)
@@ -0,0 +1,149 @@
+# serialization_benchmark.py
+#
+# Measure the per-request cost of turning a dashboard payload into a response body:
+# - dict:    response_model=Dict[str, Any] and JSONResponse (the old dashboards)
+# - model:   the typed response_model through FastAPI's default serialization
+# - typed:   typed_response (prebuilt TypeAdapter check, orjson rendering)
+# - orjson:  typed_response with RESPONSE_VALIDATION=0
+# Payloads are synthetic and shaped like build_teacher_dashboard / parent_dashboard output.
+# Usage: python -m app.utils.serialization_benchmark --announcements 50 --samples 2000
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+from pydantic import TypeAdapter
+from app.schemas.dashboards import ParentDashboardResponse, TeacherDashboardResponse
+from app.utils import responses
+
+
+def make_announcements(count: int):
+    created = datetime(2024, 9, 1, 8, 0, 0)
+    return [
+        {
+            "id": 100000 - i,
+            "title": f"Announcement {i}",
+            "content_en": "Please remember to bring your gym clothes on Thursday. " * 4,
+            "content_de": "Bitte denkt daran, am Donnerstag Sportkleidung mitzubringen. " * 4,
+            "content_fr": None,
+            "original_language": "en",
+            "target_audience": "class_specific",
+            "class_id": 1 + i % 8,
+            "class_name": f"Class {1 + i % 8}",
+            "school_name": "Central School",
+            "creator_id": 7,
+            "creator_name": "Jane Doe",
+            "date_submitted": (created - timedelta(minutes=i)).isoformat(),
+            "recipients": list(range(1000 + i, 1000 + i + 25)),
+        }
+        for i in range(count)
+    ]
+
+
+def make_payloads(announcements: int, classes: int):
+    class_summaries = [
+        {"id": i, "class_name": f"Class {i}", "school_name": f"School {i % 5}"} for i in range(1, classes + 1)
+    ]
+    teacher = {
+        "announcements": make_announcements(announcements),
+        "classes": class_summaries[:8],
+        "available_classes": class_summaries[8:],
+        "name": "Jane Doe",
+        "next_cursor": "eyJjcmVhdGVkX2F0IjogIjIwMjQtMDktMDEifQ",
+    }
+    parent = {
+        "announcements": make_announcements(announcements),
+        "students": [
+            {"id": i, "first_name": f"Kid{i}", "last_name": "Doe", "class": {"id": i, "name": f"Class {i}"}}
+            for i in range(1, 4)
+        ],
+        "next_cursor": None,
+    }
+    return {"teacher": (teacher, TeacherDashboardResponse), "parent": (parent, ParentDashboardResponse)}
+
+
+def percentile(sorted_values, fraction: float) -> float:
+    return sorted_values[min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))]
+
+
+async def time_variant(render, samples: int):
+    # Warm up, then time each render; the body is returned to check the variants agree
+    body = await render()
+    timings = []
+    for _ in range(samples):
+        start = time.perf_counter()
+        await render()
+        timings.append((time.perf_counter() - start) * 1_000_000)
+    timings.sort()
+    return body, {
+        "mean_us": statistics.fmean(timings),
+        "p50_us": percentile(timings, 0.5),
+        "p95_us": percentile(timings, 0.95),
+        "bytes": len(body),
+    }
+
+
+async def run(announcements: int, classes: int, samples: int):
+    results = {}
+    for name, (payload, model) in make_payloads(announcements, classes).items():
+        dict_field = create_model_field("Response", Dict[str, Any], mode="serialization")
+        model_field = create_model_field("Response", model, mode="serialization")
+        adapter = TypeAdapter(model)
+
+        async def render_dict():
+            content = await serialize_response(field=dict_field, response_content=payload)
+            return JSONResponse(content).body
+
+        async def render_model():
+            content = await serialize_response(field=model_field, response_content=payload)
+            return JSONResponse(content).body
+
+        async def render_typed():
+            responses.RESPONSE_VALIDATION = True
+            return responses.typed_response(adapter, payload).body
+
+        async def render_orjson():
+            responses.RESPONSE_VALIDATION = False
+            return responses.typed_response(adapter, payload).body
+
+        results[name] = {}
+        bodies = {}
+        variants = (("dict", render_dict), ("model", render_model), ("typed", render_typed), ("orjson", render_orjson))
+        validation = responses.RESPONSE_VALIDATION
+        try:
+            for variant, render in variants:
+                bodies[variant], results[name][variant] = await time_variant(render, samples)
+        finally:
+            responses.RESPONSE_VALIDATION = validation
+
+        if json.loads(bodies["dict"]) != json.loads(bodies["typed"]):
+            print(f"Warning: {name} bodies differ between the dict and typed variants.")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare dashboard response serialization paths.")
+    parser.add_argument("--announcements", type=int, default=50, help="Announcements per dashboard page")
+    parser.add_argument("--classes", type=int, default=40, help="Classes in the catalog")
+    parser.add_argument("--samples", type=int, default=2000, help="Timed serializations per variant")
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args.announcements, args.classes, args.samples))
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        for name, variants in results.items():
+            baseline = variants["dict"]["mean_us"]
+            for variant, result in variants.items():
+                print(
+                    f"{name:8s} {variant:8s} mean={result['mean_us']:8.1f} us  p50={result['p50_us']:8.1f} us  "
+                    f"p95={result['p95_us']:8.1f} us  {result['bytes']:7d} bytes  "
+                    f"x{baseline / result['mean_us']:.1f}"
+                )
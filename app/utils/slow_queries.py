@@ -0,0 +1,188 @@
+# app/utils/slow_queries.py
+#
+# Slow-query log. Statements slower than SLOW_QUERY_MS are written as JSON lines to a
+# rotating file with their normalized SQL, the shapes (not values) of their bound
+# parameters, the route that issued them and their duration. A sampled fraction of
+# slow SELECTs also gets its plan captured:
+# - Postgres: EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON), inside a savepoint. ANALYZE
+#   runs the SELECT a second time, which is why it is sampled.
+# - SQLite: EXPLAIN QUERY PLAN.
+# Admins can list recent entries on /internal/slow-queries.
+
+from collections import deque
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from typing import Any, Dict, List, Optional
+import json
+import logging
+import os
+import random
+import threading
+import time
+
+from app.utils.query_budget import normalize_statement
+from app.utils.request_metrics import current_route
+
+logger = logging.getLogger(__name__)
+
+# Threshold in milliseconds; 0 disables the log
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+# Fraction of slow SELECTs whose plan is captured
+SLOW_QUERY_EXPLAIN_RATE = float(os.getenv("SLOW_QUERY_EXPLAIN_RATE", "0.1"))
+SLOW_QUERY_LOG = os.getenv("SLOW_QUERY_LOG", "logs/slow_queries.log")
+SLOW_QUERY_LOG_BYTES = int(os.getenv("SLOW_QUERY_LOG_BYTES", str(5 * 1024 * 1024)))
+SLOW_QUERY_LOG_BACKUPS = int(os.getenv("SLOW_QUERY_LOG_BACKUPS", "5"))
+
+EXPLAIN_SAVEPOINT = "slow_query_explain"
+
+_file_logger = logging.getLogger("klasstra.slow_queries")
+_file_logger.propagate = False
+_file_logger_lock = threading.Lock()
+
+
+def _get_file_logger() -> logging.Logger:
+    # The file is opened on the first slow query, not at import
+    if not _file_logger.handlers:
+        with _file_logger_lock:
+            if not _file_logger.handlers:
+                directory = os.path.dirname(SLOW_QUERY_LOG)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                handler = RotatingFileHandler(
+                    SLOW_QUERY_LOG, maxBytes=SLOW_QUERY_LOG_BYTES, backupCount=SLOW_QUERY_LOG_BACKUPS, encoding="utf-8"
+                )
+                handler.setFormatter(logging.Formatter("%(message)s"))
+                _file_logger.addHandler(handler)
+                _file_logger.setLevel(logging.INFO)
+    return _file_logger
+
+
+def parameter_shapes(parameters: Any) -> Any:
+    """
+    Types of the bound parameters, so the log never contains user data.
+    """
+    def shape(value):
+        if isinstance(value, (list, tuple)):
+            return f"{type(value).__name__}[{len(value)}]"
+        return type(value).__name__
+
+    if isinstance(parameters, dict):
+        return {name: shape(value) for name, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        # Runs of the same type are collapsed, e.g. an expanded IN list becomes "int*15"
+        runs: List[List[Any]] = []
+        for value in parameters:
+            if runs and runs[-1][0] == shape(value):
+                runs[-1][1] += 1
+            else:
+                runs.append([shape(value), 1])
+        return [name if count == 1 else f"{name}*{count}" for name, count in runs]
+    return shape(parameters)
+
+
+def is_select(statement: str) -> bool:
+    head = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else ""
+    return head in ("SELECT", "WITH")
+
+
+def explain(conn, statement: str, parameters: Any) -> Optional[Any]:
+    """
+    Plan of `statement`, run on a separate cursor of the same DBAPI connection so the
+    original cursor's result is untouched. Returns None if the plan can't be captured.
+    """
+    dialect = conn.dialect.name
+    cursor = conn.connection.cursor()
+    try:
+        if dialect == "postgresql":
+            # ANALYZE runs the statement a second time: whatever that run did (writes in a
+            # data-modifying WITH, FOR UPDATE locks) is rolled back, as is a failing EXPLAIN,
+            # so the request's transaction is left exactly as it was
+            cursor.execute(f"SAVEPOINT {EXPLAIN_SAVEPOINT}")
+            try:
+                cursor.execute("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + statement, parameters)
+                plan = cursor.fetchone()[0]
+            finally:
+                cursor.execute(f"ROLLBACK TO SAVEPOINT {EXPLAIN_SAVEPOINT}")
+                cursor.execute(f"RELEASE SAVEPOINT {EXPLAIN_SAVEPOINT}")
+            return json.loads(plan) if isinstance(plan, str) else plan
+        if dialect == "sqlite":
+            cursor.execute("EXPLAIN QUERY PLAN " + statement, parameters)
+            return [row[-1] for row in cursor.fetchall()]
+        return None
+    except Exception:
+        logger.warning("Could not capture the plan of a slow query", exc_info=True)
+        return None
+    finally:
+        cursor.close()
+
+
+def record_slow_query(conn, statement: str, parameters: Any, executemany: bool, duration_ms: float) -> Dict[str, Any]:
+    entry = {
+        "at": datetime.utcnow().isoformat(timespec="milliseconds") + "Z",
+        "duration_ms": round(duration_ms, 2),
+        "route": current_route(),
+        "statement": normalize_statement(statement),
+        "parameters": parameter_shapes(parameters[0] if executemany and parameters else parameters),
+        "executemany": executemany,
+        "plan": None,
+    }
+    if not executemany and is_select(statement) and random.random() < SLOW_QUERY_EXPLAIN_RATE:
+        entry["plan"] = explain(conn, statement, parameters)
+    _get_file_logger().info(json.dumps(entry, default=str))
+    return entry
+
+
+def instrument_slow_queries(engine: Engine) -> None:
+    """
+    Hook a (sync) engine so statements over SLOW_QUERY_MS are logged.
+    """
+    if SLOW_QUERY_MS <= 0:
+        return
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _start(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("slow_query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _finish(conn, cursor, statement, parameters, context, executemany):
+        duration_ms = (time.perf_counter() - conn.info["slow_query_start"].pop()) * 1000
+        if duration_ms < SLOW_QUERY_MS:
+            return
+        # The EXPLAIN runs on a raw DBAPI cursor, so it does not come back through these hooks
+        try:
+            record_slow_query(conn, statement, parameters, executemany, duration_ms)
+        except Exception:
+            logger.warning("Could not record a slow query", exc_info=True)
+
+    @event.listens_for(engine, "handle_error")
+    def _failed(exception_context):
+        connection = exception_context.connection
+        # The statement got as far as the cursor if it has an execution context
+        # (ExceptionContext.cursor is declared but never set by SQLAlchemy 2.0)
+        if exception_context.execution_context is not None and connection is not None and connection.info.get("slow_query_start"):
+            connection.info["slow_query_start"].pop()
+
+
+def recent_slow_queries(limit: int = 100) -> List[Dict[str, Any]]:
+    """
+    The newest `limit` entries, newest first, across the current file and its backups.
+    """
+    entries: deque = deque(maxlen=limit)
+    paths = [f"{SLOW_QUERY_LOG}.{i}" for i in range(SLOW_QUERY_LOG_BACKUPS, 0, -1)] + [SLOW_QUERY_LOG]
+    for path in paths:
+        if not os.path.exists(path):
+            continue
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    entries.append(line)
+    result = []
+    for line in reversed(entries):
+        try:
+            result.append(json.loads(line))
+        except ValueError:
+            continue
+    return result
@@ -1,23 +1,56 @@
+import logging
+import os
 import smtplib
 from email.mime.text import MIMEText
+from typing import Optional
 
-def send_email(to_email: str, subject: str, body: str):
-    smtp_server = "smtp.gmail.com"
-    smtp_port = 587
-    sender_email = "ivan.berg.udemy@gmail.com"
-    sender_password = "abtkabgujogacvxe"  # Use the provided app password
+logger = logging.getLogger(__name__)
+
+# SMTP settings; credentials come from the environment only
+SMTP_HOST = os.getenv("SMTP_HOST", "smtp.gmail.com")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
+SMTP_USERNAME = os.getenv("SMTP_USERNAME")
+SMTP_PASSWORD = os.getenv("SMTP_PASSWORD")
+SMTP_SENDER = os.getenv("SMTP_SENDER") or SMTP_USERNAME
+# "0" for servers without STARTTLS (e.g. a local test server)
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "1") != "0"
+SMTP_TIMEOUT = float(os.getenv("SMTP_TIMEOUT", "30"))
 
+
+def build_message(to_email: str, subject: str, body: str, sender: Optional[str] = None) -> MIMEText:
     msg = MIMEText(body)
     msg["Subject"] = subject
-    msg["From"] = sender_email
+    msg["From"] = sender or SMTP_SENDER
     msg["To"] = to_email
+    return msg
+
 
+def open_smtp_connection() -> smtplib.SMTP:
+    """
+    Connected and logged-in SMTP client for the configured server.
+    """
+    server = smtplib.SMTP(SMTP_HOST, SMTP_PORT, timeout=SMTP_TIMEOUT)
     try:
-        with smtplib.SMTP(smtp_server, smtp_port) as server:
+        if SMTP_STARTTLS:
             server.starttls()  # Start the TLS encryption
-            server.login(sender_email, sender_password)  # Log in to the SMTP server
-            server.sendmail(sender_email, to_email, msg.as_string())  # Send the email
-        print("Email sent successfully.")
+        if SMTP_USERNAME and SMTP_PASSWORD:
+            server.login(SMTP_USERNAME, SMTP_PASSWORD)
+    except Exception:
+        server.close()
+        raise
+    return server
+
+
+def send_email(to_email: str, subject: str, body: str):
+    """
+    Send one email on a new connection. Requests should enqueue mail with
+    app.utils.email_outbox.enqueue_email instead.
+    """
+    msg = build_message(to_email, subject, body)
+    try:
+        with open_smtp_connection() as server:
+            server.sendmail(msg["From"], to_email, msg.as_string())  # Send the email
+        logger.info("Email sent successfully.")
     except smtplib.SMTPException as e:
-        print(f"Failed to send email: {e}")
-        raise
\ No newline at end of file
+        logger.error("Failed to send email: %s", e)
+        raise
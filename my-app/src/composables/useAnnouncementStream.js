@@ -0,0 +1,110 @@
+// useAnnouncementStream.js
+//
+// Subscribes to /dashboard/stream (Server-Sent Events) so dashboards receive new
+// announcements as they are posted instead of re-fetching the whole dashboard.
+// Uses fetch rather than EventSource because the stream needs the Authorization header.
+//
+// `newestLoadedId` returns the newest announcement id the dashboard already shows; the
+// first connect resumes after it, so nothing posted between the fetch and the subscribe
+// is lost.
+
+import api from '../api';
+
+export function useAnnouncementStream({ onAnnouncement, onResync, newestLoadedId }) {
+  let controller = null;
+  let lastEventId = null;
+  let retryMs = 3000;
+  let stopped = true;
+
+  function handleEvent(rawEvent) {
+    let eventType = 'message';
+    let data = '';
+    let id = null;
+
+    for (const line of rawEvent.split('\n')) {
+      if (line.startsWith(':')) continue; // Heartbeat comment
+      const separator = line.indexOf(':');
+      const field = separator === -1 ? line : line.slice(0, separator);
+      const value = separator === -1 ? '' : line.slice(separator + 1).trimStart();
+
+      if (field === 'event') eventType = value;
+      else if (field === 'data') data += value;
+      else if (field === 'id') id = value;
+      else if (field === 'retry') retryMs = parseInt(value, 10) || retryMs;
+    }
+
+    if (id !== null) lastEventId = id;
+    if (eventType === 'announcement' && data) {
+      onAnnouncement(JSON.parse(data));
+    } else if (eventType === 'resync' && onResync) {
+      onResync();
+    }
+  }
+
+  async function connect() {
+    const token = localStorage.getItem('access_token');
+    if (!token) return;
+
+    controller = new AbortController();
+    const headers = { Authorization: `Bearer ${token}` };
+    if (lastEventId) headers['Last-Event-ID'] = lastEventId;
+
+    const response = await fetch(`${api.defaults.baseURL}dashboard/stream`, {
+      headers,
+      signal: controller.signal,
+    });
+    if (!response.ok) {
+      const error = new Error(`Announcement stream failed with status ${response.status}`);
+      // Retrying will not fix an expired or forbidden token
+      error.fatal = response.status === 401 || response.status === 403;
+      throw error;
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+
+    for (;;) {
+      const { value, done } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+
+      let boundary = buffer.indexOf('\n\n');
+      while (boundary !== -1) {
+        handleEvent(buffer.slice(0, boundary));
+        buffer = buffer.slice(boundary + 2);
+        boundary = buffer.indexOf('\n\n');
+      }
+    }
+  }
+
+  async function start() {
+    stopped = false;
+    if (lastEventId === null && newestLoadedId) {
+      const newestId = newestLoadedId();
+      if (newestId) lastEventId = String(newestId);
+    }
+    while (!stopped) {
+      try {
+        await connect();
+      } catch (error) {
+        if (stopped) return;
+        if (error.fatal) {
+          console.error('useAnnouncementStream.js: Stream rejected, not retrying:', error.message);
+          stopped = true;
+          return;
+        }
+        console.warn('useAnnouncementStream.js: Stream interrupted:', error.message);
+      }
+      // The server closes the stream when the client falls behind; reconnect and resume
+      if (!stopped) await new Promise((resolve) => setTimeout(resolve, retryMs));
+    }
+  }
+
+  function stop() {
+    stopped = true;
+    if (controller) controller.abort();
+  }
+
+  return { start, stop };
+}
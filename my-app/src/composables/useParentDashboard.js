@@ -2,6 +2,7 @@
 
 import { ref } from 'vue';
 import api from '../api';
+import { useAnnouncementStream } from './useAnnouncementStream';
 
 export function useParentDashboard() {
   const announcements = ref([]);
@@ -65,6 +66,22 @@ export function useParentDashboard() {
     }
   }
 
+  // Live updates: prepend announcements pushed by the server
+  const stream = useAnnouncementStream({
+    onAnnouncement(announcement) {
+      if (announcements.value.some((a) => a.id === announcement.id)) return;
+      announcements.value = [
+        {
+          ...announcement,
+          content: announcement.content_en || announcement.content_de || announcement.content_fr || 'No content available.',
+        },
+        ...announcements.value,
+      ];
+    },
+    onResync: () => fetchDashboardData(),
+    newestLoadedId: () => announcements.value.reduce((newest, a) => Math.max(newest, a.id), 0),
+  });
+
   async function addChild({ first_name, last_name, class_id }) {
     const payload = { first_name, last_name, class_id: parseInt(class_id, 10) };
     await api.post('/users/parent/add_child', payload);
@@ -80,6 +97,8 @@ export function useParentDashboard() {
     errorMessage,
     fetchDashboardData,
     fetchClassesForSelection,
-    addChild
+    addChild,
+    startLiveUpdates: stream.start,
+    stopLiveUpdates: stream.stop
   };
 }
@@ -1,6 +1,7 @@
 // useTeacherDashboard.js
 import { ref } from 'vue'
 import api from '../api'
+import { useAnnouncementStream } from './useAnnouncementStream'
 
 export function useTeacherDashboard() {
   const teacherName = ref('')
@@ -44,6 +45,22 @@ export function useTeacherDashboard() {
     }
   }
 
+  // Live updates: prepend announcements pushed by the server
+  const stream = useAnnouncementStream({
+    onAnnouncement(announcement) {
+      if (announcements.value.some(a => a.id === announcement.id)) return
+      announcements.value = [
+        {
+          ...announcement,
+          content: announcement.content_de || announcement.content_en || announcement.content_fr || 'No content available.',
+        },
+        ...announcements.value,
+      ]
+    },
+    onResync: () => fetchAnnouncements(),
+    newestLoadedId: () => announcements.value.reduce((newest, a) => Math.max(newest, a.id), 0),
+  })
+
   return {
     teacherName,
     classes,
@@ -53,5 +70,7 @@ export function useTeacherDashboard() {
     errorMessage,
     fetchDashboardData,
     fetchAnnouncements,
+    startLiveUpdates: stream.start,
+    stopLiveUpdates: stream.stop,
   }
 }
@@ -0,0 +1,83 @@
+# Tests run against a throwaway SQLite database; the settings below must be in place
+# before anything imports app.database.
+
+import os
+import sqlite3
+import tempfile
+
+_DB_DIR = tempfile.mkdtemp(prefix="klasstra-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_DB_DIR, 'klasstra.db')}"
+os.environ.setdefault("SECRET_KEY", "test-secret")
+os.environ.setdefault("ACCESS_TOKEN_EXPIRE_MINUTES", "30")
+os.environ.setdefault("NOTIFICATIONS_ENABLED", "0")
+
+import pytest
+from sqlalchemy import event, insert
+from sqlalchemy.orm import Session
+
+from app.database import Base, async_engine, engine
+from app.models import Class, ParentStudent, School, Student, User, teacher_class
+from app.utils.announcement_search import ensure_search_index
+from app.utils.catalog import catalog
+from app.utils.principal_cache import principal_cache
+import app.models  # noqa: F401 (registers the tables)
+
+
+# SQLite has concat() (NULLs count as '', as on Postgres) only from 3.44
+if sqlite3.sqlite_version_info < (3, 44):
+    def _add_concat(dbapi_connection, connection_record):
+        dbapi_connection.create_function("concat", -1, lambda *parts: "".join(part or "" for part in parts))
+
+    for _engine in (engine, async_engine.sync_engine):
+        event.listen(_engine, "connect", _add_concat)
+
+
+@pytest.fixture(scope="session", autouse=True)
+def schema():
+    Base.metadata.create_all(bind=engine)
+    ensure_search_index(engine)
+    yield
+    engine.dispose()
+
+
+@pytest.fixture
+def db():
+    """
+    A session on the test database; every table and the per-process caches keyed by
+    row ids are emptied afterwards.
+    """
+    session = Session(bind=engine)
+    try:
+        yield session
+    finally:
+        session.rollback()
+        session.close()
+        with engine.begin() as connection:
+            for table in reversed(Base.metadata.sorted_tables):
+                connection.execute(table.delete())
+        principal_cache.clear()
+        catalog.invalidate()
+
+
+@pytest.fixture
+def district(db):
+    """One class with its teacher and two parents, each with one child in the class."""
+    school = School(name="Test School")
+    db.add(school)
+    db.flush()
+    school_class = Class(name="3b", school_id=school.id)
+    teacher = User(username="teacher", email="teacher@example.com", password="x", role="teacher")
+    parents = [
+        User(username=f"parent{n}", email=f"parent{n}@example.com", password="x", role="parent")
+        for n in range(2)
+    ]
+    db.add_all([school_class, teacher, *parents])
+    db.flush()
+    db.execute(insert(teacher_class).values(teacher_id=teacher.id, class_id=school_class.id))
+    for n, parent in enumerate(parents):
+        student = Student(first_name=f"Kid{n}", last_name="Test", class_id=school_class.id)
+        db.add(student)
+        db.flush()
+        db.add(ParentStudent(parent_id=parent.id, student_id=student.id))
+    db.commit()
+    return {"school_id": school.id, "class_id": school_class.id, "teacher": teacher, "parents": parents}
@@ -0,0 +1,154 @@
+import fakeredis
+import pytest
+from sqlalchemy import text
+
+from app.utils import announcement_cache as cache_module
+from app.utils.announcement_cache import (
+    AnnouncementCache,
+    MemoryBackend,
+    RedisBackend,
+    class_dependency,
+    mark_classes_changed,
+    mark_users_changed,
+    user_dependency,
+)
+
+
+@pytest.fixture(params=["memory", "redis"])
+def backend(request):
+    if request.param == "memory":
+        return MemoryBackend(maxsize=100, ttl=60)
+    return RedisBackend("redis://unused", ttl=60, client=fakeredis.FakeRedis())
+
+
+@pytest.fixture
+def cache(backend, monkeypatch):
+    # The commit hooks invalidate the module-level cache
+    cache = AnnouncementCache(backend)
+    monkeypatch.setattr(cache_module, "announcement_cache", cache)
+    return cache
+
+
+class Loader:
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return {"page": self.calls}
+
+
+def read(cache, loader, class_id=1, user_id=None, **params):
+    dependencies = [class_dependency(class_id)]
+    if user_id is not None:
+        dependencies.append(user_dependency(user_id))
+    return cache.get_or_load({"class_ids": [class_id], **params}, dependencies, loader)
+
+
+def test_repeated_reads_are_served_from_the_cache(cache):
+    loader = Loader()
+    assert read(cache, loader) == {"page": 1}
+    assert read(cache, loader) == {"page": 1}
+    assert loader.calls == 1
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_different_params_are_cached_apart(cache):
+    loader = Loader()
+    read(cache, loader, limit=10)
+    read(cache, loader, limit=20)
+    assert loader.calls == 2
+
+
+def test_bumping_a_dependency_makes_old_entries_unreachable(cache):
+    loader = Loader()
+    read(cache, loader, class_id=1, user_id=7)
+    read(cache, loader, class_id=2)
+
+    cache.invalidate([user_dependency(7)])
+
+    assert read(cache, loader, class_id=1, user_id=7) == {"page": 3}
+    # Pages that do not depend on the bumped version are still cached
+    assert read(cache, loader, class_id=2) == {"page": 2}
+    assert loader.calls == 3
+
+
+def test_commit_bumps_the_marked_versions(cache, db):
+    loader = Loader()
+    read(cache, loader, class_id=1)
+
+    db.execute(text("SELECT 1"))
+    mark_classes_changed(db, [1])
+    # Not visible before the commit: a reader could still cache the old rows
+    assert read(cache, loader, class_id=1) == {"page": 1}
+
+    db.commit()
+    assert read(cache, loader, class_id=1) == {"page": 2}
+
+
+def test_rollback_discards_the_marked_versions(cache, db):
+    loader = Loader()
+    read(cache, loader, class_id=1, user_id=7)
+
+    db.execute(text("SELECT 1"))
+    mark_classes_changed(db, [1])
+    mark_users_changed(db, [7])
+    db.rollback()
+
+    # The next transaction commits without re-marking: nothing is bumped
+    db.execute(text("SELECT 1"))
+    db.commit()
+    assert read(cache, loader, class_id=1, user_id=7) == {"page": 1}
+    assert loader.calls == 1
+
+
+def test_backend_failures_fall_through_to_the_loader(cache, monkeypatch):
+    def broken(*args, **kwargs):
+        raise ConnectionError("cache down")
+
+    monkeypatch.setattr(cache.backend, "get_versions", broken)
+    monkeypatch.setattr(cache.backend, "bump", broken)
+    loader = Loader()
+
+    assert read(cache, loader) == {"page": 1}
+    assert read(cache, loader) == {"page": 2}
+    cache.invalidate([class_dependency(1)])
+    assert cache.errors == 3
+
+
+def test_memory_entries_expire_after_the_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache_module.time, "monotonic", lambda: now[0])
+    cache = AnnouncementCache(MemoryBackend(maxsize=100, ttl=60))
+    loader = Loader()
+
+    read(cache, loader)
+    now[0] += 59
+    read(cache, loader)
+    now[0] += 2
+    read(cache, loader)
+    assert loader.calls == 2
+
+
+def test_memory_eviction_keeps_the_versions():
+    backend = MemoryBackend(maxsize=1, ttl=60)
+    cache = AnnouncementCache(backend)
+    loader = Loader()
+
+    read(cache, loader, class_id=1)
+    cache.invalidate([class_dependency(1)])
+    read(cache, loader, class_id=2)  # evicts the only entry
+
+    assert backend.size() == 1
+    assert backend.get_versions([class_dependency(1)]) == [1]
+
+
+def test_redis_entries_carry_the_ttl():
+    client = fakeredis.FakeRedis()
+    cache = AnnouncementCache(RedisBackend("redis://unused", ttl=45, client=client))
+
+    read(cache, Loader())
+
+    entries = [key for key in client.keys(cache_module.KEY_PREFIX + "*") if b":v:" not in key]
+    assert len(entries) == 1
+    assert 0 < client.ttl(entries[0]) <= 45
@@ -0,0 +1,106 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import insert
+import pytest
+
+from app.models import Announcement, announcement_recipients
+from app.routers import announcements
+from app.routers.auth import create_access_token
+from app.utils.inbox_utils import fan_out_announcements
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.include_router(announcements.router)
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def posted(db, district):
+    def post(title, recipients=None, **contents):
+        announcement = Announcement(
+            title=title,
+            original_language="en",
+            target_audience="parents",
+            class_id=district["class_id"],
+            creator_id=district["teacher"].id,
+            **contents,
+        )
+        db.add(announcement)
+        db.flush()
+        if recipients:
+            db.execute(insert(announcement_recipients), [
+                {"announcement_id": announcement.id, "user_id": user.id} for user in recipients
+            ])
+        fan_out_announcements(db, [announcement.id])
+        return announcement.id
+
+    ids = {
+        "gym": post("Gym day", content_en="Bring your gym clothes.", content_de="Bringt Sportsachen mit."),
+        "trip": post("School trip", content_en="The trip to the zoo is on Friday.", content_de="Ausflug in den Zoo."),
+        "private": post(
+            "Gym shoes", recipients=[district["parents"][1]], content_en="Your gym shoes were left behind."
+        ),
+    }
+    db.commit()
+    return ids
+
+
+def auth_headers(user):
+    token = create_access_token({"sub": str(user.id), "role": user.role})
+    return {"Authorization": f"Bearer {token}"}
+
+
+def search(client, user, **params):
+    return client.get("/announcements/search", params=params, headers=auth_headers(user))
+
+
+def result_ids(response):
+    assert response.status_code == 200, response.text
+    return [result["id"] for result in response.json()["results"]]
+
+
+@pytest.mark.parametrize("q", [" ", "   ", "\t\n"])
+def test_blank_search_terms_are_rejected(client, district, q):
+    response = search(client, district["teacher"], q=q)
+
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Search terms are required"
+
+
+def test_search_matches_titles_and_contents(client, district, posted):
+    teacher = district["teacher"]
+
+    assert sorted(result_ids(search(client, teacher, q="gym"))) == sorted([posted["gym"], posted["private"]])
+    assert result_ids(search(client, teacher, q="zoo friday")) == [posted["trip"]]
+    assert result_ids(search(client, teacher, q="homework")) == []
+
+
+def test_search_terms_are_not_query_syntax(client, district, posted):
+    assert result_ids(search(client, district["teacher"], q='zoo" OR "gym')) == []
+
+
+def test_language_restricts_the_matched_columns(client, district, posted):
+    teacher = district["teacher"]
+
+    assert result_ids(search(client, teacher, q="sportsachen", language="de")) == [posted["gym"]]
+    assert result_ids(search(client, teacher, q="sportsachen", language="en")) == []
+
+
+def test_parents_only_find_what_was_delivered_to_them(client, district, posted):
+    first, second = district["parents"]
+
+    assert result_ids(search(client, first, q="gym")) == [posted["gym"]]
+    assert sorted(result_ids(search(client, second, q="gym"))) == sorted([posted["gym"], posted["private"]])
+
+
+def test_results_are_paged(client, district, posted):
+    teacher = district["teacher"]
+
+    first = search(client, teacher, q="gym", limit=1).json()
+    second = search(client, teacher, q="gym", limit=1, offset=first["next_offset"]).json()
+
+    assert first["next_offset"] == 1 and second["next_offset"] is None
+    assert {first["results"][0]["id"], second["results"][0]["id"]} == {posted["gym"], posted["private"]}
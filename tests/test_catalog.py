@@ -0,0 +1,93 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+import pytest
+
+from app.models import School, User
+from app.routers import classes
+from app.routers.auth import create_access_token
+from app.utils.catalog import catalog, mark_catalog_changed
+from app.utils.query_budget import assert_max_queries
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.include_router(classes.router)
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def admin(db):
+    user = User(username="admin", email="admin@example.com", password="x", role="admin")
+    db.add(user)
+    db.commit()
+    token = create_access_token({"sub": str(user.id), "role": user.role})
+    return {"Authorization": f"Bearer {token}"}
+
+
+def list_classes(client, headers, etag=None):
+    if etag is not None:
+        headers = {**headers, "If-None-Match": etag}
+    return client.get("/classes/unrestricted", headers=headers)
+
+
+def test_unchanged_catalog_answers_304(client, district, admin):
+    first = list_classes(client, admin)
+    etag = first.headers["ETag"]
+
+    assert first.status_code == 200
+    assert [c["class_name"] for c in first.json()] == ["3b"]
+    for tag in (etag, f"W/{etag}", f'"other", {etag}', "*"):
+        cached = list_classes(client, admin, tag)
+        assert cached.status_code == 304
+        assert cached.content == b""
+        assert cached.headers["ETag"] == etag
+    assert list_classes(client, admin, '"other"').status_code == 200
+
+
+def test_fresh_snapshot_is_served_without_queries(db, district):
+    catalog.get(db)
+
+    with assert_max_queries(0):
+        snapshot = catalog.get(db)
+    assert [c["class_name"] for c in snapshot.classes] == ["3b"]
+
+
+def test_class_created_through_the_api_changes_the_etag(client, district, admin):
+    etag = list_classes(client, admin).headers["ETag"]
+
+    created = client.post(
+        "/classes/create", json={"name": "4a", "school_id": district["school_id"]}, headers=admin
+    )
+    assert created.status_code == 200, created.text
+
+    fresh = list_classes(client, admin, etag)
+    assert fresh.status_code == 200
+    assert fresh.headers["ETag"] != etag
+    assert sorted(c["class_name"] for c in fresh.json()) == ["3b", "4a"]
+
+
+def test_commit_bumps_the_version(db):
+    version = catalog.version
+
+    db.add(School(name="New School"))
+    mark_catalog_changed(db)
+    assert catalog.version == version
+    db.commit()
+
+    assert catalog.version == version + 1
+
+
+def test_rollback_discards_the_change(db):
+    version = catalog.version
+
+    db.add(School(name="New School"))
+    mark_catalog_changed(db)
+    db.rollback()
+    # The next transaction commits without marking: nothing is bumped
+    db.execute(text("SELECT 1"))
+    db.commit()
+
+    assert catalog.version == version
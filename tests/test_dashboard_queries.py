@@ -0,0 +1,80 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import insert
+import pytest
+
+from app.models import Announcement, announcement_recipients
+from app.routers import announcements, dashboards
+from app.routers.auth import create_access_token
+from app.utils.announcement_cache import announcement_cache
+from app.utils.inbox_utils import fan_out_announcements
+from app.utils.query_budget import assert_max_queries
+
+PAGE = 100
+
+
+@pytest.fixture
+def client(monkeypatch):
+    # Every request must reach the database for the counts to mean anything
+    monkeypatch.setattr(announcement_cache, "backend", None)
+    app = FastAPI()
+    app.include_router(announcements.router)
+    app.include_router(dashboards.router)
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+def add_announcements(db, district, count):
+    created = [
+        Announcement(
+            title=f"Notice {n}",
+            content_en="Bring your gym clothes.",
+            original_language="en",
+            target_audience="parents",
+            class_id=district["class_id"],
+            creator_id=district["teacher"].id,
+        )
+        for n in range(count)
+    ]
+    db.add_all(created)
+    db.flush()
+    # Explicit recipients, so every row has recipient ids to serialize (the teacher
+    # dashboard lists announcements addressed to the teacher)
+    db.execute(insert(announcement_recipients), [
+        {"announcement_id": announcement.id, "user_id": user.id}
+        for announcement in created
+        for user in [district["teacher"], *district["parents"]]
+    ])
+    fan_out_announcements(db, [announcement.id for announcement in created])
+    db.commit()
+
+
+def auth_headers(user):
+    token = create_access_token({"sub": str(user.id), "role": user.role})
+    return {"Authorization": f"Bearer {token}"}
+
+
+def count_statements(client, path, headers, expected_rows):
+    response = client.get(path, headers=headers)
+    assert response.status_code == 200, response.text
+    body = response.json()
+    rows = body if isinstance(body, list) else body["announcements"]
+    assert len(rows) == expected_rows
+    with assert_max_queries(50) as tracker:
+        client.get(path, headers=headers)
+    return tracker.total
+
+
+def test_dashboard_statement_counts_do_not_grow_with_the_page(client, db, district):
+    endpoints = [
+        (f"/dashboard/parent?limit={PAGE}", auth_headers(district["parents"][0])),
+        (f"/dashboard/teacher?limit={PAGE}", auth_headers(district["teacher"])),
+        (f"/announcements?class_ids={district['class_id']}&limit={PAGE}", auth_headers(district["teacher"])),
+    ]
+
+    add_announcements(db, district, 10)
+    small = [count_statements(client, path, headers, 10) for path, headers in endpoints]
+    add_announcements(db, district, 10)
+    large = [count_statements(client, path, headers, 20) for path, headers in endpoints]
+
+    assert small == large
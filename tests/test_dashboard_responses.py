@@ -0,0 +1,90 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from pydantic import ValidationError
+from sqlalchemy import insert
+import pytest
+
+from app.models import Announcement, announcement_recipients
+from app.routers import dashboards
+from app.routers.auth import create_access_token
+from app.utils import responses
+from app.utils.announcement_cache import announcement_cache
+from app.utils.inbox_utils import fan_out_announcements
+from app.utils.responses import typed_response
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(announcement_cache, "backend", None)
+    app = FastAPI()
+    app.include_router(dashboards.router)
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def announcement_id(db, district):
+    announcement = Announcement(
+        title="Gym day",
+        content_en="Bring your gym clothes.",
+        original_language="en",
+        target_audience="parents",
+        class_id=district["class_id"],
+        creator_id=district["teacher"].id,
+    )
+    db.add(announcement)
+    db.flush()
+    db.execute(insert(announcement_recipients), [
+        {"announcement_id": announcement.id, "user_id": user.id}
+        for user in [district["teacher"], *district["parents"]]
+    ])
+    fan_out_announcements(db, [announcement.id])
+    db.commit()
+    return announcement.id
+
+
+def auth_headers(user):
+    token = create_access_token({"sub": str(user.id), "role": user.role})
+    return {"Authorization": f"Bearer {token}"}
+
+
+def test_parent_dashboard_payload_matches_its_model(client, district, announcement_id):
+    response = client.get("/dashboard/parent", headers=auth_headers(district["parents"][0]))
+
+    assert response.status_code == 200, response.text
+    body = response.json()
+    dashboards.PARENT_DASHBOARD_ADAPTER.validate_python(body)
+    assert [a["id"] for a in body["announcements"]] == [announcement_id]
+    assert body["announcements"][0]["class_name"] == "3b"
+    # The student's class is sent under its alias
+    assert body["students"][0]["class"] == {"id": district["class_id"], "name": "3b"}
+
+
+def test_teacher_dashboard_payload_matches_its_model(client, district, announcement_id):
+    response = client.get("/dashboard/teacher", headers=auth_headers(district["teacher"]))
+
+    assert response.status_code == 200, response.text
+    body = response.json()
+    dashboards.TEACHER_DASHBOARD_ADAPTER.validate_python(body)
+    assert [c["class_name"] for c in body["classes"]] == ["3b"]
+    assert [a["id"] for a in body["announcements"]] == [announcement_id]
+
+
+def test_invalid_dashboard_payload_is_not_sent(client, district, monkeypatch):
+    def broken_students(db, parent_id):
+        return [{"id": 1, "first_name": "Kid", "last_name": "Test"}]  # no class
+
+    monkeypatch.setattr(dashboards, "load_parent_students", broken_students)
+
+    with pytest.raises(ValidationError):
+        client.get("/dashboard/parent", headers=auth_headers(district["parents"][0]))
+
+
+def test_validation_can_be_switched_off(monkeypatch):
+    payload = {"announcements": [], "students": [{"id": 1}]}
+
+    with pytest.raises(ValidationError):
+        typed_response(dashboards.PARENT_DASHBOARD_ADAPTER, payload)
+
+    monkeypatch.setattr(responses, "RESPONSE_VALIDATION", False)
+    assert typed_response(dashboards.PARENT_DASHBOARD_ADAPTER, payload).body == b'{"announcements":[],"students":[{"id":1}]}'
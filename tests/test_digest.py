@@ -0,0 +1,156 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from sqlalchemy import select
+import pytest
+
+from app.models import Announcement, DigestWatermark, EmailOutbox, UserProfile
+from app.utils import digest
+from app.utils.digest import fetch_digest_users, localized_content, run_digest_batch, run_digests
+from app.utils.inbox_utils import fan_out_announcements
+
+NOW = datetime(2026, 3, 2, 7, 0)
+
+
+def post(db, district, title, age, **contents):
+    announcement = Announcement(
+        title=title,
+        content_en=contents.pop("content_en", f"{title} text"),
+        original_language="en",
+        target_audience="parents",
+        class_id=district["class_id"],
+        creator_id=district["teacher"].id,
+        created_at=NOW - age,
+        **contents,
+    )
+    db.add(announcement)
+    db.flush()
+    fan_out_announcements(db, [announcement.id])
+    db.commit()
+    return announcement.id
+
+
+def queued(db):
+    db.expire_all()
+    return db.execute(
+        select(EmailOutbox.to_email, EmailOutbox.subject).where(EmailOutbox.kind == "digest").order_by(EmailOutbox.id)
+    ).all()
+
+
+def watermarks(db):
+    db.expire_all()
+    return dict(db.execute(select(DigestWatermark.user_id, DigestWatermark.last_announcement_id)).all())
+
+
+def test_parents_get_one_digest_with_their_new_announcements(db, district):
+    post(db, district, "Gym day", timedelta(hours=3))
+    second = post(db, district, "School trip", timedelta(hours=2))
+
+    totals = run_digests(db, now=NOW)
+
+    assert totals == {"users": 3, "digests": 2, "announcements": 4}
+    assert queued(db) == [
+        ("parent0@example.com", "Your Klasstra digest: 2 new announcement(s)"),
+        ("parent1@example.com", "Your Klasstra digest: 2 new announcement(s)"),
+    ]
+    assert set(watermarks(db).values()) == {second}
+
+
+def test_rerun_queues_nothing(db, district):
+    post(db, district, "Gym day", timedelta(hours=3))
+    run_digests(db, now=NOW)
+
+    # The same day: skipped by the minimum interval
+    assert run_digests(db, now=NOW + timedelta(hours=1))["digests"] == 0
+    # The next day: everything is behind the watermarks
+    assert run_digests(db, now=NOW + timedelta(days=1))["digests"] == 0
+    assert len(queued(db)) == 2
+
+
+def test_watermark_advances_only_on_commit(db, district):
+    post(db, district, "Gym day", timedelta(hours=3))
+    users = fetch_digest_users(db, 0, 100)
+
+    run_digest_batch(db, users, NOW)
+    db.rollback()
+    assert watermarks(db) == {} and queued(db) == []
+
+    run_digest_batch(db, users, NOW)
+    db.commit()
+    assert len(watermarks(db)) == 2 and len(queued(db)) == 2
+
+
+def test_dry_run_writes_nothing(db, district):
+    post(db, district, "Gym day", timedelta(hours=3))
+
+    totals = run_digests(db, dry_run=True, now=NOW)
+
+    assert totals["digests"] == 2
+    assert watermarks(db) == {} and queued(db) == []
+
+
+def test_unsettled_rows_are_held_back(db, district):
+    settled = post(db, district, "Gym day", timedelta(hours=3))
+    fresh = post(db, district, "Late notice", timedelta(seconds=digest.DIGEST_SETTLE_SECONDS // 2))
+
+    assert run_digests(db, now=NOW)["announcements"] == 2
+    assert set(watermarks(db).values()) == {settled}
+
+    # The held-back row goes out with the next digest
+    totals = run_digests(db, now=NOW + timedelta(days=1))
+    assert totals["announcements"] == 2
+    assert set(watermarks(db).values()) == {fresh}
+
+
+def test_first_digest_only_looks_back_a_day(db, district):
+    post(db, district, "Old news", timedelta(hours=digest.DIGEST_FIRST_LOOKBACK_HOURS + 2))
+
+    assert run_digests(db, now=NOW)["digests"] == 0
+
+
+@pytest.mark.parametrize("preference, phone, gets_digest", [
+    (None, None, True),
+    ("email", None, True),
+    ("sms", None, True),
+    ("sms", "+491701234567", False),
+    ("app", None, False),
+])
+def test_contact_preference(db, district, preference, phone, gets_digest):
+    parent = district["parents"][0]
+    db.add(UserProfile(user_id=parent.id, preferred_contact_method=preference, phone_number=phone))
+    db.commit()
+
+    assert (parent.id in {user.id for user in fetch_digest_users(db, 0, 100)}) == gets_digest
+
+
+def test_users_without_a_profile_get_the_digest(db, district):
+    # register_user creates no profile
+    assert {user.id for user in fetch_digest_users(db, 0, 100)} == {
+        district["teacher"].id, *(parent.id for parent in district["parents"])
+    }
+
+
+def test_localized_content_falls_back_to_the_original_language():
+    row = SimpleNamespace(original_language="de", content_en=None, content_de="Turnbeutel!", content_fr="Sac de sport !")
+
+    assert localized_content(row, "fr") == ("Sac de sport !", False)
+    assert localized_content(row, "en") == ("Turnbeutel!", True)
+    assert localized_content(SimpleNamespace(original_language="xx", content_en=None, content_de=None,
+                                             content_fr="Sac"), "en") == ("Sac", True)
+    assert localized_content(SimpleNamespace(original_language="en", content_en=None, content_de=None,
+                                             content_fr=None), "de") == ("", False)
+
+
+def test_digest_is_rendered_in_the_users_language(db, district):
+    parent = district["parents"][0]
+    parent.language = "de"
+    db.add(UserProfile(user_id=parent.id, first_name="Eva"))
+    db.commit()
+    post(db, district, "Gym day", timedelta(hours=3), content_de="Bringt Sportsachen mit.")
+
+    run_digests(db, now=NOW)
+
+    db.expire_all()
+    body = db.execute(select(EmailOutbox.body).where(EmailOutbox.to_email == parent.email)).scalar_one()
+    assert body.startswith("Hallo Eva,")
+    assert "Bringt Sportsachen mit." in body
@@ -0,0 +1,203 @@
+from datetime import datetime, timedelta
+import socket
+
+from aiosmtpd.controller import Controller
+import pytest
+
+from app.models import EmailOutbox
+from app.utils import email_outbox, utils
+from app.utils.email_outbox import DEAD, PENDING, SENT, SMTPMailer, drain_batch, enqueue_email, run_worker
+
+
+class RecordingHandler:
+    """
+    Accepts everything except mailboxes starting with "unknown" (550 at RCPT) and
+    "busy" (451 after DATA).
+    """
+
+    def __init__(self):
+        self.messages = []
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        if address.startswith("unknown"):
+            return "550 5.1.1 No such user"
+        envelope.rcpt_tos.append(address)
+        return "250 OK"
+
+    async def handle_DATA(self, server, session, envelope):
+        if any(address.startswith("busy") for address in envelope.rcpt_tos):
+            return "451 4.3.0 Mailbox busy, try again later"
+        self.messages.append(envelope)
+        return "250 Message accepted"
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def smtp_settings(monkeypatch):
+    port = free_port()
+    monkeypatch.setattr(utils, "SMTP_HOST", "127.0.0.1")
+    monkeypatch.setattr(utils, "SMTP_PORT", port)
+    monkeypatch.setattr(utils, "SMTP_STARTTLS", False)
+    monkeypatch.setattr(utils, "SMTP_USERNAME", None)
+    monkeypatch.setattr(utils, "SMTP_PASSWORD", None)
+    monkeypatch.setattr(utils, "SMTP_SENDER", "klasstra@example.com")
+    monkeypatch.setattr(utils, "SMTP_TIMEOUT", 5)
+    return port
+
+
+@pytest.fixture
+def smtp_server(smtp_settings):
+    handler = RecordingHandler()
+    controller = Controller(handler, hostname="127.0.0.1", port=smtp_settings)
+    controller.start()
+    yield handler
+    controller.stop()
+
+
+@pytest.fixture
+def mailer():
+    mailer = SMTPMailer()
+    yield mailer
+    mailer.close()
+
+
+def queue(db, *addresses, **columns):
+    messages = [enqueue_email(db, address, f"Hello {address}", "Body", kind="test") for address in addresses]
+    for message in messages:
+        for name, value in columns.items():
+            setattr(message, name, value)
+    db.commit()
+    return [message.id for message in messages]
+
+
+def load(db, message_id):
+    db.expire_all()
+    return db.get(EmailOutbox, message_id)
+
+
+def test_due_messages_are_sent_over_one_connection(db, smtp_server, mailer):
+    ids = queue(db, "a@example.com", "b@example.com", "c@example.com")
+
+    counts = drain_batch(db, mailer)
+
+    assert counts == {"claimed": 3, "sent": 3, "retried": 0, "dead": 0, "deferred": 0}
+    assert [envelope.rcpt_tos for envelope in smtp_server.messages] == [
+        ["a@example.com"], ["b@example.com"], ["c@example.com"]
+    ]
+    for message_id in ids:
+        message = load(db, message_id)
+        assert message.status == SENT
+        assert message.attempts == 1
+        assert message.sent_at is not None
+
+    # The connection stays open for the next batch
+    queue(db, "d@example.com")
+    assert drain_batch(db, mailer)["sent"] == 1
+    assert mailer.connections_opened == 1
+
+
+def test_messages_not_yet_due_are_left_alone(db, smtp_server, mailer):
+    queue(db, "later@example.com", next_attempt_at=datetime.utcnow() + timedelta(minutes=5))
+
+    assert drain_batch(db, mailer)["claimed"] == 0
+    assert smtp_server.messages == []
+
+
+def test_rolled_back_messages_are_never_sent(db, smtp_server, mailer):
+    enqueue_email(db, "a@example.com", "Hello", "Body")
+    db.rollback()
+
+    assert drain_batch(db, mailer)["claimed"] == 0
+
+
+def test_temporary_failure_is_retried_later(db, smtp_server, mailer):
+    busy_id, ok_id = queue(db, "busy@example.com", "ok@example.com")
+    before = datetime.utcnow()
+
+    counts = drain_batch(db, mailer)
+
+    assert counts["retried"] == 1 and counts["sent"] == 1
+    busy = load(db, busy_id)
+    assert busy.status == PENDING
+    assert busy.attempts == 1
+    assert "451" in busy.last_error
+    # First retry: EMAIL_RETRY_BASE_SECONDS with +-20% jitter
+    delay = (busy.next_attempt_at - before).total_seconds()
+    assert email_outbox.EMAIL_RETRY_BASE_SECONDS * 0.8 - 1 <= delay <= email_outbox.EMAIL_RETRY_BASE_SECONDS * 1.2 + 1
+    # The refusal did not cost the connection
+    assert load(db, ok_id).status == SENT
+    assert mailer.connections_opened == 1
+
+    # Not due again until next_attempt_at
+    assert drain_batch(db, mailer)["claimed"] == 0
+
+
+def test_permanent_failure_is_dead_lettered(db, smtp_server, mailer):
+    unknown_id, ok_id = queue(db, "unknown@example.com", "ok@example.com")
+
+    counts = drain_batch(db, mailer)
+
+    assert counts["dead"] == 1 and counts["sent"] == 1
+    unknown = load(db, unknown_id)
+    assert unknown.status == DEAD
+    assert unknown.attempts == 1
+    assert "550" in unknown.last_error
+    assert load(db, ok_id).status == SENT
+    assert mailer.connections_opened == 1
+
+
+def test_message_is_dead_after_max_attempts(db, smtp_server, mailer, monkeypatch):
+    monkeypatch.setattr(email_outbox, "EMAIL_MAX_ATTEMPTS", 3)
+    (message_id,) = queue(db, "busy@example.com", attempts=2)
+
+    counts = drain_batch(db, mailer)
+
+    assert counts["dead"] == 1
+    message = load(db, message_id)
+    assert message.status == DEAD
+    assert message.attempts == 3
+
+
+def test_unreachable_server_leaves_the_batch_untouched(db, smtp_settings, mailer):
+    # Nothing listens on the configured port
+    due = datetime.utcnow() - timedelta(seconds=1)
+    ids = queue(db, "a@example.com", "b@example.com", next_attempt_at=due)
+
+    counts = drain_batch(db, mailer)
+
+    assert counts == {"claimed": 2, "sent": 0, "retried": 0, "dead": 0, "deferred": 2}
+    for message_id in ids:
+        message = load(db, message_id)
+        assert message.status == PENDING
+        assert message.attempts == 0
+        assert message.next_attempt_at == due
+        assert message.last_error is None
+
+
+def test_server_coming_back_delivers_the_deferred_messages(db, smtp_settings, mailer):
+    queue(db, "a@example.com")
+    assert drain_batch(db, mailer)["deferred"] == 1
+
+    handler = RecordingHandler()
+    controller = Controller(handler, hostname="127.0.0.1", port=smtp_settings)
+    controller.start()
+    try:
+        assert drain_batch(db, mailer)["sent"] == 1
+    finally:
+        mailer.close()
+        controller.stop()
+    assert len(handler.messages) == 1
+
+
+def test_worker_without_a_sender_fails_at_startup(db, smtp_server, monkeypatch):
+    monkeypatch.setattr(utils, "SMTP_SENDER", None)
+    queue(db, "a@example.com")
+
+    with pytest.raises(RuntimeError, match="SMTP_SENDER"):
+        run_worker(once=True)
+    assert smtp_server.messages == []
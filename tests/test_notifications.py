@@ -0,0 +1,98 @@
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+import pytest
+
+from app.database import engine
+from app.models import Announcement, UserProfile, announcement_recipients
+from app.utils import notifications
+from app.utils.inbox_utils import fan_out_announcements
+from app.utils.notifications import SMS, SMS_MAX_LENGTH, NotificationRouter, StubSmsProvider
+
+
+@pytest.fixture
+def provider():
+    return StubSmsProvider()
+
+
+@pytest.fixture
+def router(provider, monkeypatch):
+    monkeypatch.setattr(notifications, "NOTIFICATIONS_ENABLED", True)
+    router = NotificationRouter(session_factory=lambda: Session(bind=engine), sms_provider=provider)
+    yield router
+    router.shutdown()
+
+
+@pytest.fixture
+def audience(db, district):
+    texted, no_phone = district["parents"]
+    texted.language = "de"
+    db.add_all([
+        UserProfile(user_id=texted.id, preferred_contact_method="sms", phone_number="+491701234567"),
+        UserProfile(user_id=no_phone.id, preferred_contact_method="sms", phone_number=""),
+        UserProfile(user_id=district["teacher"].id, preferred_contact_method="email"),
+    ])
+    db.commit()
+    return district
+
+
+def post(db, district, title, **contents):
+    announcement = Announcement(
+        title=title,
+        original_language="en",
+        target_audience="parents",
+        class_id=district["class_id"],
+        creator_id=district["teacher"].id,
+        **contents,
+    )
+    db.add(announcement)
+    db.flush()
+    db.execute(insert(announcement_recipients), [
+        {"announcement_id": announcement.id, "user_id": user.id}
+        for user in [district["teacher"], *district["parents"]]
+    ])
+    fan_out_announcements(db, [announcement.id])
+    db.commit()
+    return announcement.id
+
+
+def test_only_sms_recipients_with_a_phone_are_routed(db, audience, router, provider):
+    announcement_ids = [
+        post(db, audience, "Gym day", content_en="Bring your gym clothes.", content_de="Bringt Sportsachen mit."),
+        post(db, audience, "Trip", content_en="The trip is on Friday."),
+    ]
+    router._start()
+
+    assert router.route(announcement_ids) == {SMS: 2}
+
+    router.shutdown()
+    # In the recipient's language, falling back to the original one
+    assert list(provider.sent) == [
+        {"to": "+491701234567", "text": "Gym day: Bringt Sportsachen mit."},
+        {"to": "+491701234567", "text": "Trip: The trip is on Friday."},
+    ]
+
+
+def test_submitted_announcements_are_texted(db, audience, router, provider):
+    announcement_id = post(db, audience, "Notice", content_en="x" * 500)
+
+    router.submit([announcement_id])
+    router.shutdown()
+
+    assert [message["to"] for message in provider.sent] == ["+491701234567"]
+    assert len(provider.sent[0]["text"]) == SMS_MAX_LENGTH
+
+
+def test_nobody_to_text_routes_nothing(db, district, router, provider):
+    announcement_id = post(db, district, "Notice", content_en="Text")
+    router._start()
+
+    assert router.route([announcement_id]) == {}
+    assert router.stats()["channels"][SMS]["queued"] == 0
+
+
+def test_disabled_router_does_not_start(db, district, router, monkeypatch):
+    monkeypatch.setattr(notifications, "NOTIFICATIONS_ENABLED", False)
+
+    router.submit([post(db, district, "Notice", content_en="Text")])
+
+    assert router.stats()["channels"] == {}
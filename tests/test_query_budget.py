@@ -0,0 +1,97 @@
+import asyncio
+
+from sqlalchemy import create_engine, text
+import pytest
+
+from app.utils import query_budget as budget_module
+from app.utils.query_budget import (
+    NPlusOneError,
+    assert_max_queries,
+    instrument_query_shapes,
+    normalize_statement,
+    query_budget,
+)
+
+
+@pytest.fixture
+def raise_mode(monkeypatch):
+    monkeypatch.setattr(budget_module, "QUERY_DETECTOR", "raise")
+    monkeypatch.setattr(budget_module, "QUERY_REPEAT_LIMIT", 3)
+
+
+@pytest.fixture
+def scratch_engine(raise_mode):
+    # A throwaway engine, so the listener does not stay on the test database's engine
+    engine = create_engine("sqlite://")
+    instrument_query_shapes(engine)
+    yield engine
+    engine.dispose()
+
+
+def run(engine, *statements):
+    with engine.connect() as connection:
+        for statement in statements:
+            connection.execute(text(statement))
+
+
+def test_statements_with_different_values_share_a_shape():
+    assert normalize_statement("SELECT * FROM users WHERE id = 1") == normalize_statement(
+        "SELECT * FROM users  WHERE id = 42"
+    )
+    assert normalize_statement("SELECT * FROM users WHERE name = 'a'") == "SELECT * FROM users WHERE name = ?"
+    assert normalize_statement("SELECT * FROM users WHERE id IN (?, ?, ?)") == "SELECT * FROM users WHERE id IN (?)"
+
+
+def test_exceeding_the_budget_raises(scratch_engine):
+    @query_budget(2)
+    def endpoint():
+        run(scratch_engine, "SELECT 1", "SELECT 'a'", "SELECT 2.5")
+
+    with pytest.raises(NPlusOneError, match="Query budget of 2 exceeded"):
+        endpoint()
+
+
+def test_exceeding_the_budget_raises_on_async_endpoints(scratch_engine):
+    @query_budget(1)
+    async def endpoint():
+        run(scratch_engine, "SELECT 1", "SELECT 'a'")
+
+    with pytest.raises(NPlusOneError, match="Query budget of 1 exceeded"):
+        asyncio.run(endpoint())
+
+
+def test_repeated_statement_shape_raises(scratch_engine):
+    @query_budget(100)
+    def endpoint():
+        run(scratch_engine, *[f"SELECT {n}" for n in range(4)])
+
+    with pytest.raises(NPlusOneError, match="the same statement ran more than 3 times"):
+        endpoint()
+
+
+def test_endpoint_within_budget_returns_its_result(scratch_engine):
+    @query_budget(3)
+    def endpoint():
+        run(scratch_engine, "SELECT 1", "SELECT 2", "SELECT 3")
+        return "ok"
+
+    assert endpoint() == "ok"
+    assert endpoint.query_budget == 3
+
+
+def test_off_mode_does_not_check(scratch_engine, monkeypatch):
+    monkeypatch.setattr(budget_module, "QUERY_DETECTOR", "off")
+
+    @query_budget(0)
+    def endpoint():
+        run(scratch_engine, "SELECT 1")
+        return "ok"
+
+    assert endpoint() == "ok"
+
+
+def test_assert_max_queries_fails_the_block(db):
+    with pytest.raises(AssertionError, match="Expected at most 1 statements"):
+        with assert_max_queries(1):
+            db.execute(text("SELECT 1"))
+            db.execute(text("SELECT 2"))
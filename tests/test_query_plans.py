@@ -0,0 +1,56 @@
+from sqlalchemy import text
+import pytest
+
+from app.utils.check_query_plans import capture_selects, full_scans, pick_sample_users, query_shapes
+from app.utils.datagen import generate_dataset
+
+# Every shape check_query_plans runs, so a shape that stops being produced fails too
+SHAPES = [
+    "fetch_announcements(class_ids, recipient_id)",
+    "fetch_announcements(creator_id)",
+    "get_all_classes[teacher]",
+    "build_teacher_dashboard",
+    "fetch_announcements(class_ids, cursor)",
+    "fetch_announcements(inbox_user_id)",
+    "fetch_announcements(recipient_id)",
+    "get_all_classes[parent]",
+    "load_parent_students",
+    "get_all_classes[class_representative]",
+]
+
+
+@pytest.fixture
+def shapes(db):
+    generate_dataset(
+        db,
+        schools=3,
+        classes_per_school=4,
+        students_per_class=10,
+        announcements_per_class=15,
+        password=None,
+    )
+    db.commit()
+    db.execute(text("ANALYZE"))
+    samples = pick_sample_users(db)
+    assert set(samples) == {"teacher", "parent", "class_representative"}
+    return dict(query_shapes(db, samples))
+
+
+def test_every_shape_is_checked(shapes):
+    assert sorted(shapes) == sorted(SHAPES)
+
+
+@pytest.mark.parametrize("name", SHAPES)
+def test_filtered_statements_do_not_scan_tables(db, shapes, name):
+    statements = capture_selects(db, shapes[name])
+    assert statements
+
+    problems = {
+        " ".join(statement.split()): scans
+        for statement, parameters in statements
+        # Unfiltered listings read the whole table by design
+        if " WHERE " in statement.upper()
+        for scans in [full_scans(db, statement, parameters)]
+        if scans
+    }
+    assert problems == {}
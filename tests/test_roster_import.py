@@ -0,0 +1,127 @@
+import io
+
+from sqlalchemy import select
+import pytest
+
+from app.models import Announcement, Class, ParentStudent, School, Student, User, UserInbox
+from app.utils.inbox_utils import fan_out_announcements
+from app.utils.roster_import import import_roster
+
+HEADER = "student_ref,first_name,last_name,school_name,class_name,parent_email,relationship_type\n"
+
+
+@pytest.fixture
+def parents(db):
+    users = {
+        name: User(username=name, email=f"{name}@example.com", password="x", role="parent")
+        for name in ("anna", "ben", "carla")
+    }
+    db.add_all(users.values())
+    db.commit()
+    return {name: user.id for name, user in users.items()}
+
+
+def run_import(db, rows, **options):
+    return import_roster(db, io.BytesIO((HEADER + "".join(row + "\n" for row in rows)).encode()), **options)
+
+
+def students(db):
+    db.expire_all()
+    return {
+        (school, student.external_id): (student.first_name, class_name)
+        for student, school, class_name in db.execute(
+            select(Student, School.name, Class.name)
+            .join(Class, Class.id == Student.class_id)
+            .join(School, School.id == Student.school_id)
+        )
+    }
+
+
+def class_id(db, school_name, class_name):
+    return db.execute(
+        select(Class.id).join(School, School.id == Class.school_id)
+        .where(School.name == school_name, Class.name == class_name)
+    ).scalar_one()
+
+
+def inbox(db, parent_id):
+    db.expire_all()
+    return set(db.execute(select(UserInbox.announcement_id).where(UserInbox.user_id == parent_id)).scalars())
+
+
+def announce(db, target_class_id):
+    teacher = User(username=f"teacher{target_class_id}", email=f"t{target_class_id}@example.com", password="x", role="teacher")
+    db.add(teacher)
+    db.flush()
+    announcement = Announcement(
+        title="Notice",
+        content_en="Text",
+        original_language="en",
+        target_audience="parents",
+        class_id=target_class_id,
+        creator_id=teacher.id,
+    )
+    db.add(announcement)
+    db.flush()
+    fan_out_announcements(db, [announcement.id])
+    db.commit()
+    return announcement.id
+
+
+def test_the_same_ref_in_two_schools_is_two_students(db, parents):
+    report = run_import(db, [
+        "S1,Mia,Muster,North,1a,anna@example.com,mother",
+        "S1,Noah,Beispiel,South,1a,ben@example.com,father",
+    ])
+
+    assert report["error_count"] == 0
+    assert report["students_created"] == 2 and report["links_created"] == 2
+    assert students(db) == {("North", "S1"): ("Mia", "1a"), ("South", "S1"): ("Noah", "1a")}
+
+    # Re-importing one school leaves the other school's student alone
+    report = run_import(db, ["S1,Mia,Muster,North,1b,anna@example.com,mother"])
+
+    assert report["students_created"] == 0 and report["students_updated"] == 1
+    assert students(db) == {("North", "S1"): ("Mia", "1b"), ("South", "S1"): ("Noah", "1a")}
+    links = set(db.execute(select(ParentStudent.parent_id, Student.external_id, Student.school_id)
+                           .join(Student, Student.id == ParentStudent.student_id)))
+    assert len(links) == 2
+
+
+def test_reimport_without_changes_writes_nothing(db, parents):
+    rows = ["S1,Mia,Muster,North,1a,anna@example.com,mother"]
+    run_import(db, rows)
+
+    report = run_import(db, rows)
+
+    assert report["students_created"] == report["students_updated"] == report["links_created"] == 0
+
+
+def test_moved_students_take_their_parents_inboxes_along(db, parents):
+    run_import(db, [
+        "S1,Mia,Muster,North,1a,anna@example.com,mother",
+        "S1,Mia,Muster,North,1a,ben@example.com,father",
+        "S2,Leo,Muster,North,1a,ben@example.com,father",
+        "S3,Ida,Test,North,1a,carla@example.com,mother",
+        "S4,Eva,Test,North,1b,,",
+    ])
+    old_class, new_class = class_id(db, "North", "1a"), class_id(db, "North", "1b")
+    old_notice, new_notice = announce(db, old_class), announce(db, new_class)
+    assert inbox(db, parents["anna"]) == {old_notice}
+
+    report = run_import(db, ["S1,Mia,Muster,North,1b,anna@example.com,mother"])
+
+    assert report["students_updated"] == 1
+    # Anna only had Mia in 1a
+    assert inbox(db, parents["anna"]) == {new_notice}
+    # Ben still has Leo in 1a
+    assert inbox(db, parents["ben"]) == {old_notice, new_notice}
+    # Carla's child did not move
+    assert inbox(db, parents["carla"]) == {old_notice}
+
+
+def test_dry_run_writes_nothing(db, parents):
+    report = run_import(db, ["S1,Mia,Muster,North,1a,anna@example.com,mother"], dry_run=True)
+
+    assert report["dry_run"] is True and report["students_created"] == 1
+    assert students(db) == {}
@@ -0,0 +1,117 @@
+import io
+
+from sqlalchemy import select
+import pytest
+
+from app.models import Announcement, Class, ParentStudent, School, Student, User, UserInbox
+from app.utils.inbox_utils import fan_out_announcements
+from app.utils.roster_sync import sync_roster
+
+HEADER = "student_ref,first_name,last_name,school_name,class_name,parent_email,relationship_type\n"
+
+
+@pytest.fixture
+def parents(db):
+    users = {
+        name: User(username=name, email=f"{name}@example.com", password="x", role="parent")
+        for name in ("anna", "ben")
+    }
+    db.add_all(users.values())
+    db.commit()
+    return {name: user.id for name, user in users.items()}
+
+
+def run_sync(db, source, rows, **options):
+    stream = io.BytesIO((HEADER + "".join(row + "\n" for row in rows)).encode())
+    return sync_roster(db, stream, source, **options)
+
+
+def students(db):
+    db.expire_all()
+    return {
+        (school, student.external_id): (student.first_name, class_name)
+        for student, school, class_name in db.execute(
+            select(Student, School.name, Class.name)
+            .join(Class, Class.id == Student.class_id)
+            .join(School, School.id == Student.school_id)
+        )
+    }
+
+
+def links(db):
+    db.expire_all()
+    return set(db.execute(
+        select(ParentStudent.parent_id, School.name, Student.external_id)
+        .join(Student, Student.id == ParentStudent.student_id)
+        .join(School, School.id == Student.school_id)
+    ))
+
+
+def inbox(db, parent_id):
+    db.expire_all()
+    return set(db.execute(select(UserInbox.announcement_id).where(UserInbox.user_id == parent_id)).scalars())
+
+
+def announce(db, school_name, class_name):
+    target_class_id = db.execute(
+        select(Class.id).join(School, School.id == Class.school_id)
+        .where(School.name == school_name, Class.name == class_name)
+    ).scalar_one()
+    teacher = User(username=f"teacher{target_class_id}", email=f"t{target_class_id}@example.com", password="x", role="teacher")
+    db.add(teacher)
+    db.flush()
+    announcement = Announcement(
+        title="Notice",
+        content_en="Text",
+        original_language="en",
+        target_audience="parents",
+        class_id=target_class_id,
+        creator_id=teacher.id,
+    )
+    db.add(announcement)
+    db.flush()
+    fan_out_announcements(db, [announcement.id])
+    db.commit()
+    return announcement.id
+
+
+def test_round_trip_with_a_move_and_a_removal(db, parents):
+    north = ["S1,Mia,Muster,North,1a,anna@example.com,mother", "S2,Eva,Test,North,1b,,"]
+    south = ["S1,Noah,Beispiel,South,1a,ben@example.com,father"]
+
+    report = run_sync(db, "north", north)
+    assert report["students_added"] == 2 and report["parent_links_added"] == 1
+    report = run_sync(db, "south", south)
+    assert report["students_added"] == 1 and report["parent_links_added"] == 1
+    assert students(db) == {
+        ("North", "S1"): ("Mia", "1a"),
+        ("North", "S2"): ("Eva", "1b"),
+        ("South", "S1"): ("Noah", "1a"),
+    }
+
+    # Unchanged roster: nothing to apply
+    report = run_sync(db, "north", north)
+    assert report["unchanged"] == 3 and report["students_updated"] == 0
+
+    # Mia moves to 1b; her parent's inbox follows
+    old_notice, new_notice = announce(db, "North", "1a"), announce(db, "North", "1b")
+    assert inbox(db, parents["anna"]) == {old_notice}
+    report = run_sync(db, "north", ["S1,Mia,Muster,North,1b,anna@example.com,mother", north[1]])
+    assert report["students_updated"] == 1
+    assert students(db)[("North", "S1")] == ("Mia", "1b")
+    assert inbox(db, parents["anna"]) == {new_notice}
+
+    # Mia leaves North; South's S1 is a different student and stays
+    report = run_sync(db, "north", [north[1]])
+    assert report["students_removed"] == 1 and report["parent_links_removed"] == 1
+    assert students(db) == {("North", "S2"): ("Eva", "1b"), ("South", "S1"): ("Noah", "1a")}
+    assert links(db) == {(parents["ben"], "South", "S1")}
+    assert inbox(db, parents["anna"]) == set()
+
+
+def test_dry_run_writes_nothing(db, parents):
+    report = run_sync(db, "north", ["S1,Mia,Muster,North,1a,anna@example.com,mother"], dry_run=True)
+
+    assert report["dry_run"] is True and report["students_added"] == 1
+    assert students(db) == {}
+    assert run_sync(db, "north", ["S1,Mia,Muster,North,1a,anna@example.com,mother"])["unchanged"] == 0